@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Asyncio HTTP engine shared by the Polititweet scrapers.
+Requests go through a single pooled `requests.Session` (keep-alive
+connections are reused across requests) and run on a thread pool sized to
+the global concurrency, so coroutines can keep many fetches in flight while
+a global token bucket caps the request rate and a semaphore per host bounds
+how many requests hit the same server at once.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_PER_HOST = 8
+DEFAULT_RATE = 20.0
+DEFAULT_TIMEOUT = 10
+
+
+class TokenBucket:  # pylint: disable=too-few-public-methods
+    """
+    Token bucket rate limiter: `rate` tokens are added per second, up to
+    `capacity`, and every request takes one.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Waits until a token is available and takes it.
+        """
+        loop = asyncio.get_running_loop()
+
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    self._tokens = min(
+                        self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncHttpClient:
+    """
+    Pooled HTTP client for coroutines, with a global rate limit, a global
+    concurrency limit and a concurrency limit per host.
+    Use it as an async context manager, so its threads and connections are
+    released at the end.
+    """
+
+    def __init__(
+            self, concurrency=DEFAULT_CONCURRENCY, per_host=DEFAULT_PER_HOST,
+            rate=DEFAULT_RATE, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._concurrency = asyncio.Semaphore(concurrency)
+        self._per_host = per_host
+        self._hosts = {}
+        self._bucket = TokenBucket(rate) if rate else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Closes the pooled connections and the worker threads.
+        """
+        self._executor.shutdown(wait=True)
+        self._session.close()
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self._per_host)
+        return self._hosts[host]
+
+    async def get(self, url):
+        """
+        Fetches a URL once a rate token and a connection slot are available.
+        Args:
+            url (str): The URL to fetch.
+        Returns:
+            Response: The response, with its body already read.
+        """
+        async with self._concurrency, self._host_semaphore(url):
+            if self._bucket:
+                await self._bucket.acquire()
+
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                functools.partial(self._session.get, url, timeout=self.timeout))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of the baseline models of the tweet influence event study.
+Fitting ARIMA + GARCH on a ticker's full minute-return history is the slow
+part of the study, and it does not depend on the tweets. Each fit is stored
+as a Parquet file with the squared standardized residuals, the fitted
+parameters in the file metadata, and a key made of the ticker, the content
+hash of the returns and the model orders. A new fit for a ticker replaces
+its previous entries, and the least recently used entries are evicted once
+the cache grows past its size limit.
+"""
+import hashlib
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+PARAMS_KEY = b'baseline_params'
+CACHE_VERSION = 1
+
+
+def baseline_key(ticker, returns, orders):
+    """
+    Builds the cache key of a baseline model.
+    Args:
+        ticker (str): Security symbol root.
+        returns (Series): Minute log-returns the model is fitted on.
+        orders (dict): Orders of the models, e.g. `{'arima': (1, 0, 0)}`.
+    Returns:
+        str: `<ticker>-<digest>`, also used as the cache file name.
+    """
+    digest = hashlib.sha256(
+        json.dumps({'version': CACHE_VERSION, 'orders': orders}, sort_keys=True).encode('UTF-8'))
+    digest.update(pd.util.hash_pandas_object(returns).to_numpy().tobytes())
+
+    return f'{ticker}-{digest.hexdigest()[:24]}'
+
+
+class BaselineCache:
+    """
+    Stores fitted baselines in a folder, one Parquet file per ticker and
+    data fingerprint.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.parquet')
+
+    def get(self, key):
+        """
+        Loads a cached baseline and marks it as recently used.
+        Args:
+            key (str): Key of the baseline, as returned by `baseline_key`.
+        Returns:
+            tuple: The squared standardized residuals and the parameters,
+            or None if the baseline is not cached.
+        """
+        path = self._path(key)
+        try:
+            table = pq.read_table(path)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        std_resid2 = table.to_pandas().set_index('timestamp')['std_resid2']
+        params = json.loads(table.schema.metadata[PARAMS_KEY])
+
+        return std_resid2.rename_axis(None), params
+
+    def put(self, key, std_resid2, params):
+        """
+        Stores a baseline, replacing the older baselines of the same ticker.
+        Args:
+            key (str): Key of the baseline, as returned by `baseline_key`.
+            std_resid2 (Series): Squared standardized residuals by minute.
+            params (dict): Fitted parameters of the models.
+        """
+        table = pa.table({
+            'timestamp': std_resid2.index.to_numpy(),
+            'std_resid2': std_resid2.to_numpy()
+        })
+        table = table.replace_schema_metadata({PARAMS_KEY: json.dumps(params).encode('UTF-8')})
+
+        tmp_path = f'{self._path(key)}.tmp'
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, self._path(key))
+
+        ticker = key.rsplit('-', 1)[0]
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.parquet') and name.rsplit('-', 1)[0] == ticker \
+                    and name != f'{key}.parquet':
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def evict(self):
+        """
+        Removes the least recently used baselines until the cache fits in
+        `max_bytes`.
+        Returns:
+            list: Keys of the removed baselines.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.parquet'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = []
+
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+            evicted.append(name[:-len('.parquet')])
+
+        return evicted
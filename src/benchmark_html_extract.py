@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the `html_extract` backends on saved Polititweet pages,
+e.g. the fixture pages of the tests:
+python ./src/benchmark_html_extract.py tests/fixtures/polititweet_tweets.html \
+    tests/fixtures/polititweet_figures.html
+Every available backend must extract the same links as `bs4`.
+"""
+import argparse
+import os
+import timeit
+from html_extract import FIGURE_CARD, TWEET_CARD, available_backends, extract_links
+
+
+def benchmark_page(html, card_class, repeat=50):
+    """
+    Times every available backend on a page.
+    Args:
+        html (str): The page.
+        card_class (str): Class attribute of the cards of the page.
+        repeat (int): Number of extractions timed per backend.
+    Returns:
+        dict: Best time of an extraction, in seconds, by backend.
+    """
+    expected = extract_links(html, card_class, backend='bs4')
+    timings = {}
+
+    for backend in available_backends():
+        links = extract_links(html, card_class, backend=backend)
+        if links != expected:
+            raise ValueError(f'Backend {backend} does not extract the same links as bs4.')
+
+        timings[backend] = min(timeit.repeat(
+            lambda backend=backend: extract_links(html, card_class, backend=backend),
+            number=1, repeat=repeat))
+
+    return timings
+
+
+def benchmark_html_extract(pages, repeat=50):
+    """
+    Times every available backend on saved pages and prints the results.
+    Args:
+        pages (list): Paths to saved tweet or figure pages.
+        repeat (int): Number of extractions timed per backend and page.
+    Returns:
+        dict: The timings of every page, by page name.
+    """
+    results = {}
+
+    for path in pages:
+        with open(path, 'r', encoding='UTF-8') as page_file:
+            html = page_file.read()
+
+        card_class = FIGURE_CARD if 'figure-card' in html else TWEET_CARD
+        timings = benchmark_page(html, card_class, repeat)
+        results[os.path.basename(path)] = timings
+
+        print(f'{os.path.basename(path)} ({len(html) / 1024:.0f} KiB):')
+        for backend, seconds in sorted(timings.items(), key=lambda item: item[1]):
+            print(f'  {backend:<10} {seconds * 1000:8.3f} ms'
+                  f'  {timings["bs4"] / seconds:6.1f}x bs4')
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the HTML link extraction backends on saved pages.')
+    parser.add_argument(
+        'pages',
+        type=str,
+        nargs='+',
+        help='Saved Polititweet tweet or figure pages.')
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=50,
+        help='Number of extractions timed per backend and page.')
+    args = parser.parse_args()
+
+    benchmark_html_extract(args.pages, args.repeat)
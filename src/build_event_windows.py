@@ -0,0 +1,449 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Extracts the stock price windows around tweets.
+For every tweet/ticker pair, the bars of the ticker around the tweet time
+(±30 minutes by default) and a later reaction window (30 minutes, one day
+after the tweet by default) are pulled from the partitioned TAQ Parquet
+dataset and tagged with the tweet attributes, which is the layout of
+`final_combined.csv`.
+
+Tweets are sharded by (ticker, year): the partitions a shard's windows
+touch are loaded once, and the bounds of every window of every tweet are
+found with a single `searchsorted` over the sorted bar timestamps, so rows
+are gathered in one vectorized pass per shard.
+
+With `--workers N`, shards are processed in a process pool, largest first.
+With `--checkpoint_dir`, every shard is written atomically to its own
+Parquet checkpoint and recorded in a small completed-shard index
+(`_completed.tsv`), so an interrupted run resumes by reading that index
+only. A shard is keyed by its ticker, year, tweets and windows; changing
+any of them recomputes it.
+"""
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import os
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+
+MARKET_TZ = ZoneInfo('US/Eastern')
+
+EventWindow = namedtuple('EventWindow', ['start', 'end', 'include_end'], defaults=(True,))
+
+DEFAULT_WINDOWS = (
+    EventWindow(pd.Timedelta(minutes=-30), pd.Timedelta(minutes=30), True),
+    EventWindow(pd.Timedelta(days=1), pd.Timedelta(days=1, minutes=30), False)
+)
+TWEET_COLUMNS = ['handle', 'ticker', 'sentiment_label', 'sentiment_score', 'top_topic']
+SECTOR_COLUMNS = [
+    'Technology', 'Healthcare and Pharmaceuticals', 'Defense and Aerospace',
+    'Financials', 'Airlines and Travel', 'Energy', 'Agriculture', 'Automotive'
+]
+COMPLETED_INDEX = '_completed.tsv'
+
+
+def parse_window(start, end):
+    """
+    Builds a closed window from two offsets relative to the tweet time.
+    Args:
+        start (str): Start offset, as a pandas Timedelta string (e.g. `-30min`).
+        end (str): End offset, as a pandas Timedelta string (e.g. `1D`).
+    Returns:
+        EventWindow: The window, including both of its ends.
+    """
+    window = EventWindow(pd.Timedelta(start), pd.Timedelta(end))
+    if window.end < window.start:
+        raise ValueError(f'Window ends before it starts: {start} {end}')
+
+    return window
+
+
+def tweet_times(timestamps):
+    """
+    Parses tweet timestamps into naive New York times, as the TAQ bars are.
+    Args:
+        timestamps (Series): Tweet timestamps, as strings or datetimes.
+    Returns:
+        Series: Naive market times, NaT where the value could not be parsed.
+    """
+    return (
+        pd.to_datetime(timestamps, errors='coerce', utc=True, format='mixed')
+        .dt.tz_convert(MARKET_TZ)
+        .dt.tz_localize(None)
+    )
+
+
+def load_ticker_prices(stock_folder, ticker, years):
+    """
+    Loads the bars of a ticker for some years, sorted by timestamp.
+    Args:
+        stock_folder (str): Folder of the partitioned TAQ Parquet dataset.
+        ticker (str): Security symbol root.
+        years (iterable): Years whose partitions are needed.
+    Returns:
+        DataFrame: The bars with `avg_price` renamed to `price`, or None if
+        the ticker has no data for these years.
+    """
+    frames = []
+    for year in sorted(years):
+        partition_dir = os.path.join(stock_folder, f'SYM_ROOT={ticker}', f'year={year}')
+        if os.path.isdir(partition_dir):
+            frames.append(pd.read_parquet(partition_dir, engine='pyarrow'))
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return None
+
+    prices = pd.concat(frames, ignore_index=True)
+    prices['timestamp'] = pd.to_datetime(prices['timestamp'])
+
+    return (
+        prices
+        .rename(columns={'avg_price': 'price'})
+        .sort_values('timestamp', kind='stable', ignore_index=True)
+    )
+
+
+def window_years(times, windows):
+    """
+    Lists the years covered by the windows of a set of tweets.
+    Args:
+        times (Series): Tweet times.
+        windows (list): The `EventWindow`s to extract.
+    Returns:
+        set: Years of every window start and end.
+    """
+    years = set()
+    for window in windows:
+        years.update((times + window.start).dt.year.dropna().astype(int))
+        years.update((times + window.end).dt.year.dropna().astype(int))
+
+    return years
+
+
+def window_positions(bar_times, times, windows):
+    """
+    Finds the bars inside every window of every tweet.
+    Args:
+        bar_times (ndarray): Sorted bar timestamps (datetime64[ns]).
+        times (ndarray): Tweet times (datetime64[ns]).
+        windows (list): The `EventWindow`s to extract.
+    Returns:
+        tuple: Arrays of tweet positions and bar positions, one entry per
+        extracted row, ordered by tweet then window then timestamp.
+    """
+    starts, ends = [], []
+    for window in windows:
+        side = 'right' if window.include_end else 'left'
+        starts.append(np.searchsorted(bar_times, times + window.start.to_timedelta64(), 'left'))
+        ends.append(np.searchsorted(bar_times, times + window.end.to_timedelta64(), side))
+
+    # (tweet, window) pairs, tweet major, so each tweet's rows stay together.
+    starts = np.stack(starts, axis=1).ravel()
+    counts = np.maximum(np.stack(ends, axis=1).ravel() - starts, 0)
+
+    offsets = np.cumsum(counts) - counts
+    bar_positions = np.arange(counts.sum()) - np.repeat(offsets - starts, counts)
+    tweet_positions = np.repeat(np.arange(len(starts)) // len(windows), counts)
+
+    return tweet_positions, bar_positions
+
+
+def extract_ticker_windows(tweets, prices, windows=DEFAULT_WINDOWS):
+    """
+    Gathers the bars inside the windows of the tweets of one ticker.
+    Args:
+        tweets (DataFrame): Tweets of the ticker, with `id` and `tweet_time`.
+        prices (DataFrame): Bars of the ticker, sorted by timestamp.
+        windows (list): The `EventWindow`s to extract.
+    Returns:
+        DataFrame: One row per bar and window, with the tweet attributes and
+        `minutes_since_tweet`.
+    """
+    times = tweets['tweet_time'].to_numpy(dtype='datetime64[ns]')
+    tweet_positions, bar_positions = window_positions(
+        prices['timestamp'].to_numpy(dtype='datetime64[ns]'), times, windows)
+
+    rows = prices.iloc[bar_positions].reset_index(drop=True)
+    rows['tweet_id'] = tweets['id'].to_numpy()[tweet_positions]
+
+    for column in TWEET_COLUMNS + SECTOR_COLUMNS:
+        if column in tweets:
+            rows[column] = tweets[column].to_numpy()[tweet_positions]
+
+    rows['minutes_since_tweet'] = (
+        (rows['timestamp'].to_numpy() - times[tweet_positions]) / np.timedelta64(1, 'm'))
+
+    return rows
+
+
+def extract_shard(ticker, tweets, stock_folder, windows=DEFAULT_WINDOWS):
+    """
+    Extracts the windows of the tweets of one ticker.
+    Args:
+        ticker (str): Security symbol root.
+        tweets (DataFrame): Tweets of the ticker, with `id` and `tweet_time`.
+        stock_folder (str): Folder of the partitioned TAQ Parquet dataset.
+        windows (list): The `EventWindow`s to extract.
+    Returns:
+        DataFrame: The windows of the tweets, empty if the ticker has no data.
+    """
+    prices = load_ticker_prices(stock_folder, ticker, window_years(tweets['tweet_time'], windows))
+    if prices is None:
+        print(f'No stock data for {ticker}')
+        return pd.DataFrame()
+
+    return extract_ticker_windows(tweets, prices, windows)
+
+
+def shard_key(shard, tweets, windows):
+    """
+    Builds the key of a shard from everything its result depends on.
+    Args:
+        shard (tuple): Ticker and year of the shard.
+        tweets (DataFrame): Tweets of the ticker.
+        windows (list): The `EventWindow`s to extract.
+    Returns:
+        str: `<ticker>-<year>-<digest>`, also used as the checkpoint file name.
+    """
+    digest = hashlib.sha256(repr(list(windows)).encode('UTF-8'))
+    digest.update(pd.util.hash_pandas_object(tweets, index=False).to_numpy().tobytes())
+
+    ticker, year = shard
+    return f'{ticker}-{year}-{digest.hexdigest()[:16]}'
+
+
+def checkpoint_shard(ticker, tweets, stock_folder, windows, checkpoint_path):
+    """
+    Extracts a shard and writes it atomically to its checkpoint file.
+    Args:
+        ticker (str): Security symbol root.
+        tweets (DataFrame): Tweets of the ticker, with `id` and `tweet_time`.
+        stock_folder (str): Folder of the partitioned TAQ Parquet dataset.
+        windows (list): The `EventWindow`s to extract.
+        checkpoint_path (str): Path of the shard's Parquet checkpoint.
+    Returns:
+        int: Number of rows of the shard; empty shards have no file.
+    """
+    rows = extract_shard(ticker, tweets, stock_folder, windows)
+    if rows.empty:
+        return 0
+
+    tmp_path = f'{checkpoint_path}.tmp'
+    rows.to_parquet(tmp_path, index=False)
+    with open(tmp_path, 'rb') as checkpoint_file:
+        os.fsync(checkpoint_file.fileno())
+    os.replace(tmp_path, checkpoint_path)
+
+    return len(rows)
+
+
+def load_completed(checkpoint_dir):
+    """
+    Loads the completed-shard index of a checkpoint folder.
+    Args:
+        checkpoint_dir (str): Folder of the shard checkpoints.
+    Returns:
+        dict: Shard key to its number of rows.
+    """
+    path = os.path.join(checkpoint_dir, COMPLETED_INDEX)
+    if not os.path.isfile(path):
+        return {}
+
+    completed = {}
+    with open(path, 'r', encoding='UTF-8') as index_file:
+        for line in index_file:
+            # A line cut by a crash has no newline, or no row count, and is ignored.
+            key, _, rows = line.rstrip('\n').partition('\t')
+            if line.endswith('\n') and rows.isdigit():
+                completed[key] = int(rows)
+
+    return completed
+
+
+def mark_completed(checkpoint_dir, key, rows):
+    """
+    Appends a finished shard to the completed-shard index, dropping the last
+    line first if it was cut by a crash, so the key starts its own line.
+    Args:
+        checkpoint_dir (str): Folder of the shard checkpoints.
+        key (str): Key of the shard, as returned by `shard_key`.
+        rows (int): Number of rows of the shard.
+    """
+    path = os.path.join(checkpoint_dir, COMPLETED_INDEX)
+    with open(path, 'a+b') as index_file:
+        if index_file.tell():
+            index_file.seek(-1, os.SEEK_END)
+            if index_file.read(1) != b'\n':
+                index_file.seek(0)
+                index_file.truncate(index_file.read().rfind(b'\n') + 1)
+        index_file.write(f'{key}\t{rows}\n'.encode('UTF-8'))
+        index_file.flush()
+        os.fsync(index_file.fileno())
+
+
+def run_shards(shards, stock_folder, windows, workers):
+    """
+    Extracts shards in memory, serially or in a process pool.
+    Args:
+        shards (list): `((ticker, year), tweets)` pairs.
+        stock_folder (str): Folder of the partitioned TAQ Parquet dataset.
+        windows (list): The `EventWindow`s to extract.
+        workers (int): Number of worker processes; 1 runs serially.
+    Returns:
+        list: The windows of every shard, in shard order.
+    """
+    if workers <= 1:
+        return [
+            extract_shard(ticker, tweets, stock_folder, windows)
+            for (ticker, _), tweets in shards
+        ]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(extract_shard, ticker, tweets, stock_folder, windows)
+            for (ticker, _), tweets in shards
+        ]
+        return [future.result() for future in futures]
+
+
+def run_checkpointed_shards(shards, stock_folder, windows, workers, checkpoint_dir):
+    """
+    Extracts the shards missing from the completed-shard index to their
+    checkpoint files, then reads every shard back.
+    Args:
+        shards (list): `((ticker, year), tweets)` pairs.
+        stock_folder (str): Folder of the partitioned TAQ Parquet dataset.
+        windows (list): The `EventWindow`s to extract.
+        workers (int): Number of worker processes; 1 runs serially.
+        checkpoint_dir (str): Folder of the shard checkpoints.
+    Returns:
+        list: The windows of every shard, in shard order.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    completed = load_completed(checkpoint_dir)
+    keys = [shard_key(shard, tweets, windows) for shard, tweets in shards]
+    pending = [
+        (key, ticker, tweets)
+        for key, ((ticker, _), tweets) in zip(keys, shards)
+        if key not in completed
+    ]
+    print(f'{len(shards) - len(pending)} shards already completed, {len(pending)} to go')
+
+    def checkpoint_path(key):
+        return os.path.join(checkpoint_dir, f'{key}.parquet')
+
+    if workers <= 1:
+        for key, ticker, tweets in pending:
+            completed[key] = checkpoint_shard(
+                ticker, tweets, stock_folder, windows, checkpoint_path(key))
+            mark_completed(checkpoint_dir, key, completed[key])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(
+                    checkpoint_shard, ticker, tweets, stock_folder, windows,
+                    checkpoint_path(key)): key
+                # Largest shards first, so a big ticker does not finish last.
+                for key, ticker, tweets in sorted(pending, key=lambda item: -len(item[2]))
+            }
+            for future in as_completed(futures):
+                completed[futures[future]] = future.result()
+                mark_completed(checkpoint_dir, futures[future], completed[futures[future]])
+
+    return [
+        pd.read_parquet(checkpoint_path(key)) if completed[key] else pd.DataFrame()
+        for key in keys
+    ]
+
+
+def build_event_windows(tweets, stock_folder, windows=DEFAULT_WINDOWS, workers=1,
+                        checkpoint_dir=None):
+    """
+    Extracts the stock windows of every tweet/ticker pair.
+    Args:
+        tweets (DataFrame): Tweet/ticker pairs, with `id`, `ticker` and
+            `timestamp` plus the tweet attributes to carry.
+        stock_folder (str): Folder of the partitioned TAQ Parquet dataset.
+        windows (list): The `EventWindow`s to extract.
+        workers (int): Number of worker processes; 1 runs serially.
+        checkpoint_dir (str): Folder of the shard checkpoints, to make the
+            run resumable.
+    Returns:
+        DataFrame: The windows of every tweet, grouped by ticker and year.
+    """
+    tweets = tweets.assign(tweet_time=tweet_times(tweets['timestamp']))
+    tweets = tweets.dropna(subset=['tweet_time', 'ticker'])
+    shards = list(tweets.groupby(['ticker', tweets['tweet_time'].dt.year], sort=True))
+
+    if checkpoint_dir:
+        results = run_checkpointed_shards(shards, stock_folder, windows, workers, checkpoint_dir)
+    else:
+        results = run_shards(shards, stock_folder, windows, workers)
+
+    results = [result for result in results if not result.empty]
+    if not results:
+        return pd.DataFrame()
+
+    return pd.concat(results, ignore_index=True)
+
+
+def write_frame(frame, output_file):
+    """
+    Writes a DataFrame as Parquet or CSV, depending on the file extension.
+    Args:
+        frame (DataFrame): The rows to write.
+        output_file (str): Output path, ending with `.parquet` or `.csv`.
+    """
+    if output_file.endswith('.parquet'):
+        frame.to_parquet(output_file, index=False)
+    else:
+        frame.to_csv(output_file, index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Extract the stock price windows around tweets.')
+    parser.add_argument(
+        'tweets_file',
+        type=str,
+        help='CSV of tweet/ticker pairs (id, ticker, timestamp and tweet attributes).')
+    parser.add_argument(
+        'stock_folder',
+        type=str,
+        help='Folder of the partitioned TAQ Parquet dataset.')
+    parser.add_argument(
+        'output_file',
+        type=str,
+        help='Output file, e.g. final_combined.csv or final_combined.parquet.')
+    parser.add_argument(
+        '--window',
+        type=str,
+        nargs=2,
+        action='append',
+        metavar=('START', 'END'),
+        help='Window offsets from the tweet time (e.g. -30min 30min); repeatable. '
+             'Defaults to -30min..30min and 1D..1D30min.')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of processes extracting tickers in parallel.')
+    parser.add_argument(
+        '--checkpoint_dir',
+        type=str,
+        help='Folder of per-ticker checkpoints, to resume interrupted runs.')
+    args = parser.parse_args()
+
+    write_frame(
+        build_event_windows(
+            pd.read_csv(args.tweets_file),
+            args.stock_folder,
+            [parse_window(*window) for window in args.window] if args.window
+            else DEFAULT_WINDOWS,
+            args.workers,
+            args.checkpoint_dir),
+        args.output_file)
@@ -4,23 +4,44 @@
 Data cleaning module for merging CSV files.
 This module provides a function to merge multiple CSV files
 into a single CSV file.
+With `--format parquet`, the files are merged into a typed Parquet dataset
+instead: a first parallel pass infers the type of every column across all
+the files, then every file is streamed, batch by batch, into its own part of
+the dataset with that unified schema, so memory stays bounded by the batch
+size and readers can load only the columns they need.
 """
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+import csv
 import os
+import shutil
+import tempfile
 from glob import glob
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 
+DEFAULT_WORKERS = 4
+DEFAULT_BLOCK_SIZE = 16 * 1024 * 1024
+# Candidate column types, most specific first; columns fitting none are strings.
+COLUMN_TYPES = {'bool': pa.bool_(), 'int64': pa.int64(), 'float64': pa.float64()}
+BOOL_VALUES = ['true', 'false']
+TYPE_SAMPLE_SIZE = 1000
 
-def merge_csv_files(tweet_input_folder, output_file):
+
+def list_csv_files(tweet_input_folder):
     """
-    Merge all CSV files in the given folder into a single CSV file.
+    Lists the non-empty CSV files of a folder.
     Args:
         tweet_input_folder (str): Path to the folder containing CSV files.
-        output_file (str): Path to the output merged CSV file.
+    Returns:
+        list: Paths to the CSV files.
     """
     csv_files = glob(os.path.join(tweet_input_folder, '*.csv'))
 
-    df_list = []
+    valid_files = []
     for file in csv_files:
         if not os.path.isfile(file):
             print(f"File {file} does not exist.")
@@ -34,6 +55,20 @@ def merge_csv_files(tweet_input_folder, output_file):
             print(f"File {file} is empty.")
             continue
 
+        valid_files.append(file)
+
+    return valid_files
+
+
+def merge_csv_files(tweet_input_folder, output_file):
+    """
+    Merge all CSV files in the given folder into a single CSV file.
+    Args:
+        tweet_input_folder (str): Path to the folder containing CSV files.
+        output_file (str): Path to the output merged CSV file.
+    """
+    df_list = []
+    for file in list_csv_files(tweet_input_folder):
         print(f"Processing file {file}...")
         df_list.append(pd.read_csv(file, low_memory=False))
 
@@ -42,6 +77,186 @@ def merge_csv_files(tweet_input_folder, output_file):
     merged_df.to_csv(os.path.join(output_file), index=False)
 
 
+def csv_header(file):
+    """
+    Reads the column names of a CSV file.
+    Args:
+        file (str): Path to the CSV file.
+    Returns:
+        list: The column names.
+    """
+    with open(file, 'r', encoding='UTF-8', newline='') as csv_file:
+        return next(csv.reader(csv_file))
+
+
+def open_csv_batches(file, column_types, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Opens a streaming reader over a CSV file whose values may contain newlines.
+    Args:
+        file (str): Path to the CSV file.
+        column_types (dict): Type of every column of the file.
+        block_size (int): Bytes of CSV parsed per batch.
+    Returns:
+        CSVStreamingReader: Reader yielding record batches.
+    """
+    return pacsv.open_csv(
+        file,
+        read_options=pacsv.ReadOptions(block_size=block_size),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types=column_types, strings_can_be_null=True))
+
+
+def fits_type(values, type_name):
+    """
+    Tells whether non-null text values can all be converted to a column type.
+    Args:
+        values (Array): The text values.
+        type_name (str): One of `COLUMN_TYPES`.
+    Returns:
+        bool: True if every value converts.
+    """
+    # Most text columns are ruled out by their first values already.
+    for sample in (values.slice(0, TYPE_SAMPLE_SIZE), values):
+        if type_name == 'bool':
+            if not pc.all(pc.is_in(pc.utf8_lower(sample), pa.array(BOOL_VALUES))).as_py():
+                return False
+            continue
+
+        try:
+            pc.cast(sample, COLUMN_TYPES[type_name])
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return False
+
+    return True
+
+
+def infer_column_types(file, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Finds the column types every value of a CSV file fits in, streaming the
+    file as text.
+    Args:
+        file (str): Path to the CSV file.
+        block_size (int): Bytes of CSV parsed per batch.
+    Returns:
+        dict: The candidate type names of every column, or None for the
+        columns without any value.
+    """
+    columns = csv_header(file)
+    candidates = dict.fromkeys(columns)
+
+    for batch in open_csv_batches(file, dict.fromkeys(columns, pa.string()), block_size):
+        for name, column in zip(batch.schema.names, batch.columns):
+            values = pc.drop_null(column)
+            if len(values) == 0:
+                continue
+
+            remaining = COLUMN_TYPES if candidates[name] is None else candidates[name]
+            candidates[name] = [
+                type_name for type_name in remaining if fits_type(values, type_name)]
+
+    return candidates
+
+
+def unify_schema(file_candidates):
+    """
+    Builds the schema shared by all the files: every column of any file, in
+    order of appearance, with the most specific type all its values fit in.
+    Args:
+        file_candidates (iterable): The candidate types of every file, as
+            returned by `infer_column_types`.
+    Returns:
+        Schema: The unified schema.
+    """
+    merged = {}
+    for candidates in file_candidates:
+        for name, types in candidates.items():
+            if merged.get(name) is None:
+                merged[name] = types
+            elif types is not None:
+                merged[name] = [type_name for type_name in merged[name] if type_name in types]
+
+    return pa.schema([
+        (name, COLUMN_TYPES[types[0]] if types else pa.string())
+        for name, types in merged.items()
+    ])
+
+
+def write_parquet_part(file, schema, part_path, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Streams a CSV file into a Parquet file with the unified schema; the
+    columns the file does not have are null.
+    Args:
+        file (str): Path to the CSV file.
+        schema (Schema): The unified schema.
+        part_path (str): Path to the Parquet file.
+        block_size (int): Bytes of CSV parsed per batch.
+    Returns:
+        int: Number of rows written.
+    """
+    columns = csv_header(file)
+    column_types = {name: schema.field(name).type for name in columns}
+    rows = 0
+
+    with pq.ParquetWriter(part_path, schema, compression='snappy') as writer:
+        for batch in open_csv_batches(file, column_types, block_size):
+            writer.write_batch(pa.record_batch([
+                batch.column(field.name) if field.name in column_types
+                else pa.nulls(batch.num_rows, field.type)
+                for field in schema
+            ], schema=schema))
+            rows += batch.num_rows
+
+    return rows
+
+
+def merge_csv_files_to_parquet(
+        tweet_input_folder, output_folder, workers=DEFAULT_WORKERS, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Merge all CSV files in the given folder into a typed Parquet dataset,
+    one part per CSV file. The dataset is written next to the output folder
+    first and replaces it at the end.
+    Args:
+        tweet_input_folder (str): Path to the folder containing CSV files.
+        output_folder (str): Path to the output Parquet dataset folder.
+        workers (int): Number of files read at once.
+        block_size (int): Bytes of CSV parsed per batch.
+    Returns:
+        Schema: The unified schema of the dataset.
+    """
+    csv_files = sorted(list_csv_files(tweet_input_folder))
+    if not csv_files:
+        raise ValueError(f'No CSV files to merge in {tweet_input_folder}.')
+
+    output_folder = os.path.abspath(output_folder)
+    working_folder = tempfile.mkdtemp(
+        prefix='.merge-', dir=os.path.dirname(output_folder))
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            print(f"Inferring the schema of {len(csv_files)} files...")
+            schema = unify_schema(pool.map(
+                lambda file: infer_column_types(file, block_size), csv_files))
+
+            parts = [
+                os.path.join(working_folder, f'part-{i:05d}.parquet')
+                for i in range(len(csv_files))
+            ]
+            rows = sum(pool.map(
+                lambda args: write_parquet_part(*args, block_size),
+                [(file, schema, part) for file, part in zip(csv_files, parts)]))
+
+        if os.path.isdir(output_folder):
+            shutil.rmtree(output_folder)
+        os.replace(working_folder, output_folder)
+    finally:
+        if os.path.isdir(working_folder):
+            shutil.rmtree(working_folder)
+
+    print(f"Merged {rows} rows into {output_folder}.")
+    return schema
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Merge tweets files.')
     parser.add_argument(
@@ -51,7 +266,20 @@ if __name__ == '__main__':
     parser.add_argument(
         'output_file',
         type=str,
-        help='The name of the merged CSV file.')
+        help='The name of the merged CSV file, or Parquet folder with --format parquet.')
+    parser.add_argument(
+        '--format',
+        choices=['csv', 'parquet'],
+        default='csv',
+        help='Format of the merged output.')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=DEFAULT_WORKERS,
+        help='Number of files read at once with --format parquet.')
     args = parser.parse_args()
 
-    merge_csv_files(args.tweet_input_folder, args.output_file)
+    if args.format == 'parquet':
+        merge_csv_files_to_parquet(args.tweet_input_folder, args.output_file, args.workers)
+    else:
+        merge_csv_files(args.tweet_input_folder, args.output_file)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compacts the partitioned TAQ Parquet dataset.
+Every `SYM_ROOT=/year=` partition made of several fragments (e.g. after
+`export_taq_to_parquet --append`) is rewritten as right-sized files sorted by
+timestamp, with bounded row groups, min/max statistics and a page index.
+Readers filtering on `timestamp` (e.g. a 60 minute window around a tweet)
+can then skip every row group and page outside the window instead of
+reading whole fragments.
+"""
+import argparse
+from collections import namedtuple
+import math
+import os
+import shutil
+import tempfile
+import pyarrow.parquet as pq
+
+DEFAULT_ROW_GROUP_SIZE = 16 * 1024
+DEFAULT_FILE_ROWS = 1024 * 1024
+
+FileLayout = namedtuple(
+    'FileLayout',
+    ['compression', 'row_group_size', 'file_rows'],
+    defaults=('snappy', DEFAULT_ROW_GROUP_SIZE, DEFAULT_FILE_ROWS))
+
+
+def parquet_write_options(layout):
+    """
+    Builds the Parquet writer options shared by every file of the dataset.
+    Partition files start with the `timestamp` column and are sorted by it.
+    Args:
+        layout (FileLayout): Compression and row group size of the files.
+    Returns:
+        dict: Keyword arguments for `pyarrow.parquet` writers.
+    """
+    return {
+        'compression': layout.compression,
+        'row_group_size': layout.row_group_size,
+        'write_statistics': True,
+        'write_page_index': True,
+        'sorting_columns': [pq.SortingColumn(0)]
+    }
+
+
+def write_partition_files(table, directory, layout):
+    """
+    Writes the rows of a partition, sorted by timestamp, as files of at most
+    `layout.file_rows` rows.
+    Args:
+        table (Table): Rows of the partition, `timestamp` first.
+        directory (str): Folder of the partition; it must not exist yet.
+        layout (FileLayout): Compression, row group size and file size.
+    """
+    table = table.sort_by('timestamp')
+    options = parquet_write_options(layout)
+    os.makedirs(directory)
+
+    for i, offset in enumerate(range(0, table.num_rows, layout.file_rows)):
+        pq.write_table(
+            table.slice(offset, layout.file_rows),
+            os.path.join(directory, f'part-00000-{i}.parquet'),
+            **options)
+
+
+def list_partitions(output_folder):
+    """
+    Lists the `SYM_ROOT=/year=` partitions of the dataset.
+    Args:
+        output_folder (str): Output folder of the partitioned Parquet dataset.
+    Returns:
+        list: Partition paths relative to the output folder, sorted.
+    """
+    partitions = []
+    for sym_dir in sorted(os.listdir(output_folder)):
+        if not sym_dir.startswith('SYM_ROOT='):
+            continue
+        for year_dir in sorted(os.listdir(os.path.join(output_folder, sym_dir))):
+            if year_dir.startswith('year='):
+                partitions.append(f'{sym_dir}/{year_dir}')
+
+    return partitions
+
+
+def needs_compaction(partition_dir, file_rows):
+    """
+    Tells whether a partition has more files than its rows require.
+    Args:
+        partition_dir (str): Folder of the partition.
+        file_rows (int): Maximum number of rows per file.
+    Returns:
+        bool: True if the partition should be compacted.
+    """
+    files = [name for name in os.listdir(partition_dir) if name.endswith('.parquet')]
+    rows = sum(
+        pq.read_metadata(os.path.join(partition_dir, name)).num_rows for name in files)
+
+    return len(files) > max(1, math.ceil(rows / file_rows))
+
+
+def compact_partition(output_folder, partition, layout):
+    """
+    Rewrites a partition as sorted, right-sized files. The new files are
+    written next to the dataset first, so a failure leaves the partition as
+    it was.
+    Args:
+        output_folder (str): Output folder of the partitioned Parquet dataset.
+        partition (str): Partition path relative to the output folder.
+        layout (FileLayout): Compression, row group size and file size.
+    """
+    partition_dir = os.path.join(output_folder, partition)
+    working_folder = tempfile.mkdtemp(prefix='.compact-', dir=output_folder)
+
+    try:
+        table = pq.read_table(partition_dir, partitioning=None)
+        compacted_dir = os.path.join(working_folder, 'partition')
+        write_partition_files(table, compacted_dir, layout)
+
+        shutil.rmtree(partition_dir)
+        os.replace(compacted_dir, partition_dir)
+    finally:
+        shutil.rmtree(working_folder)
+
+
+def compact_taq_parquet(output_folder, layout=FileLayout(), partitions=None, force=False):
+    """
+    Compacts the partitions of the dataset made of too many fragments.
+    Args:
+        output_folder (str): Output folder of the partitioned Parquet dataset.
+        layout (FileLayout): Compression, row group size and file size.
+        partitions (list): Partitions to consider; all of them by default.
+        force (bool): Rewrites every partition, e.g. to apply a new layout.
+    Returns:
+        list: The partitions that were compacted.
+    """
+    compacted = []
+
+    for partition in partitions or list_partitions(output_folder):
+        partition_dir = os.path.join(output_folder, partition)
+        if not os.path.isdir(partition_dir):
+            continue
+        if not force and not needs_compaction(partition_dir, layout.file_rows):
+            continue
+
+        print(f'Compacting partition {partition}...')
+        compact_partition(output_folder, partition, layout)
+        compacted.append(partition)
+
+    return compacted
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compact the partitions of the TAQ Parquet dataset.')
+    parser.add_argument(
+        'output_folder',
+        type=str,
+        help='Folder of the partitioned Parquet dataset.')
+    parser.add_argument(
+        '--compression',
+        type=str,
+        default='snappy',
+        help='Compression algorithm for the compacted files.')
+    parser.add_argument(
+        '--row_group_size',
+        type=int,
+        default=DEFAULT_ROW_GROUP_SIZE,
+        help='Maximum number of rows per row group.')
+    parser.add_argument(
+        '--file_rows',
+        type=int,
+        default=DEFAULT_FILE_ROWS,
+        help='Maximum number of rows per file.')
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Rewrite every partition, even the ones already compact.')
+    args = parser.parse_args()
+
+    compact_taq_parquet(
+        args.output_folder,
+        FileLayout(args.compression, args.row_group_size, args.file_rows),
+        force=args.force)
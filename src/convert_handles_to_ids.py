@@ -2,48 +2,90 @@
 # -*- coding: utf-8 -*-
 """
 Convert Twitter handles to Twitter IDs using Polititweet.org
+Answers are kept in a persistent cache (see `handle_cache`), every figure
+card of every fetched search page is recorded so one page can answer many
+handles, and the handles still unknown are looked up concurrently, with a
+bounded number of retries per page.
 """
 import argparse
+import asyncio
 import csv
+import os
 import time
-from bs4 import BeautifulSoup
 import pandas as pd
 import requests
+from async_http import DEFAULT_RATE, AsyncHttpClient
+from handle_cache import DEFAULT_NEGATIVE_TTL, DEFAULT_TTL, HandleCache
+from html_extract import FIGURE_CARD, extract_links
 
 BASE_URL = 'https://polititweet.org/figures'
+MAX_RETRIES = 3
+RETRY_DELAY_SECONDS = 1
+DEFAULT_CONCURRENCY = 4
+HANDLE_CACHE_NAME = '_handle_cache.json'
 
 
-def extract_twitter_id(handle, soup):
+def extract_figure_cards(links):
     """
-    Extracts the Twitter ID from the Polititweet page for a given handle.
+    Extracts every figure card of a Polititweet page.
+    Args:
+        links (PageLinks): The links of the page, as returned by `extract_links`.
+    Returns:
+        dict: The figure id of every Twitter handle on the page.
+    """
+    return {
+        span_href.split('/')[-1]: href.split('=')[-1]
+        for href, span_href in links.cards if href and span_href
+    }
+
+
+def extract_next_href(links):
+    """
+    Extracts the link of the next page of search results.
+    Args:
+        links (PageLinks): The links of the page, as returned by `extract_links`.
+    Returns:
+        str: The query of the next page, if available.
+    """
+    href = links.next_href or ''
+    if links.next_disabled or '?' not in href:
+        return None
+
+    return href[href.index('?'):]
+
+
+def find_twitter_id(handle, links):
+    """
+    Finds the Twitter ID of a handle among the figure cards of a page.
     Args:
         handle (str): The Twitter handle to search for.
-        soup (BeautifulSoup): The BeautifulSoup object containing the page content.
+        links (PageLinks): The links of the page, as returned by `extract_links`.
     Returns:
         str: The Twitter ID if found, otherwise None.
     """
-    # 1. Find main tweets grid
-    tweets_grid = soup.find('div', {'class': 'grid'})
+    figures = extract_figure_cards(links)
 
-    if not tweets_grid:
+    if not figures:
         print('...NOT FOUND!')
         return None
 
-    # 2. Extract ids from the anchor tags, which are the tweet cards.
-    figure_cards = tweets_grid.find_all('a', {'class': 'box figure-card'})
-    if not figure_cards:
-        print('...NOT FOUND!')
-        return None
+    figure_url = figures.get(handle)
+    if figure_url:
+        print(f'...FOUND! {figure_url}')
 
-    for element in figure_cards:
-        user_handle = element.find('span', href=True)['href'].split('/')[-1]
+    return figure_url
 
-        if user_handle == handle:
-            figure_url = element['href'].split('=')[-1]
-            print(f'...FOUND! {figure_url}')
-            return figure_url
 
-    return None
+def extract_twitter_id(handle, soup):
+    """
+    Extracts the Twitter ID from the Polititweet page for a given handle.
+    Args:
+        handle (str): The Twitter handle to search for.
+        soup (BeautifulSoup): The BeautifulSoup object (or the HTML) of the page.
+    Returns:
+        str: The Twitter ID if found, otherwise None.
+    """
+    return find_twitter_id(handle, extract_links(str(soup), FIGURE_CARD))
 
 
 def scrape_page(url, handle):
@@ -59,14 +101,12 @@ def scrape_page(url, handle):
 
     response.raise_for_status()  # Raise an error for bad responses
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+    links = extract_links(response.text, FIGURE_CARD)
 
-    handle_id = extract_twitter_id(handle, soup)
+    handle_id = find_twitter_id(handle, links)
 
     if not handle_id:
-        return None, soup.find(
-            'a:not([disabled])', {
-                'class': 'pagination-next'}, string='Next')
+        return None, extract_next_href(links)
 
     return handle_id, None
 
@@ -87,6 +127,7 @@ def scrape_polititweet(handle_file):
             handle = handles[0]
             print(f'Scraping page for {handle}...', end='')
             pages = 0
+            retries = 0
             next_url = f'?search={handle}'
 
             while next_url:
@@ -102,14 +143,136 @@ def scrape_polititweet(handle_file):
                     time.sleep(.1)
 
                     pages += 1
-                except requests.exceptions.RequestException:
-                    continue
+                    retries = 0
+                except requests.exceptions.RequestException as e:
+                    retries += 1
+                    if retries > MAX_RETRIES:
+                        print(f'...FAILED! {e}')
+                        break
+                    time.sleep(RETRY_DELAY_SECONDS)
 
         print(f'Scraped {len(all_ids)} ids total.')
         print(all_ids)
         return all_ids
 
 
+async def fetch_figures_page(client, url, max_retries=MAX_RETRIES):
+    """
+    Fetches a page of search results, retrying failed requests.
+    Args:
+        client (AsyncHttpClient): The pooled HTTP client.
+        url (str): The URL of the page.
+        max_retries (int): Number of retries after the first failure.
+    Returns:
+        PageLinks: The links of the page, or None if every attempt failed.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            response = await client.get(url)
+            response.raise_for_status()
+            return extract_links(response.text, FIGURE_CARD)
+        except requests.exceptions.RequestException as e:
+            print(f'Failed to retrieve {url} (attempt {attempt + 1}): {e}')
+            if attempt < max_retries:
+                await asyncio.sleep(RETRY_DELAY_SECONDS * 2 ** attempt)
+
+    return None
+
+
+async def resolve_handle(client, cache, handle, max_retries=MAX_RETRIES):
+    """
+    Searches Polititweet for a handle, recording every figure card seen on
+    the way, until the handle is found or the results run out.
+    Args:
+        client (AsyncHttpClient): The pooled HTTP client.
+        cache (HandleCache): The handle cache, updated with every figure card.
+        handle (str): The Twitter handle to resolve.
+        max_retries (int): Number of retries of a failed page.
+    Returns:
+        str: The figure id, or None if it is missing or could not be looked up.
+    """
+    next_url = f'?search={handle}'
+
+    while next_url:
+        # Another search may have come across the handle in the meantime.
+        cached, figure_id = cache.get(handle)
+        if cached:
+            return figure_id
+
+        links = await fetch_figures_page(client, f'{BASE_URL}{next_url}', max_retries)
+        if links is None:
+            print(f'Could not resolve {handle}.')
+            return None
+
+        figures = extract_figure_cards(links)
+        for user_handle, user_id in figures.items():
+            cache.put(user_handle, user_id)
+
+        cached, figure_id = cache.get(handle)
+        if cached:
+            return figure_id
+
+        next_url = extract_next_href(links)
+
+    cache.put(handle, None)
+    return None
+
+
+async def resolve_handles(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        handles, cache, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE,
+        max_retries=MAX_RETRIES):
+    """
+    Resolves handles to figure ids, looking up the ones missing from the
+    cache concurrently.
+    Args:
+        handles (list): The Twitter handles.
+        cache (HandleCache): The handle cache; it is saved at the end.
+        concurrency (int): Maximum number of requests in flight.
+        rate (float): Maximum number of requests per second.
+        max_retries (int): Number of retries of a failed page.
+    Returns:
+        list: A list of dictionaries containing Twitter handles and their corresponding IDs.
+    """
+    pending = list(dict.fromkeys(
+        handle for handle in handles if not cache.get(handle)[0]))
+    print(f'{len(handles) - len(pending)} handles cached, {len(pending)} to look up.')
+
+    # At most `concurrency` searches run at once, so the later ones can be
+    # answered by the figure cards the earlier ones came across.
+    searches = asyncio.Semaphore(concurrency)
+
+    async def search(client, handle):
+        async with searches:
+            await resolve_handle(client, cache, handle, max_retries)
+
+    try:
+        async with AsyncHttpClient(concurrency, concurrency, rate) as client:
+            await asyncio.gather(*(search(client, handle) for handle in pending))
+    finally:
+        cache.save()
+
+    all_ids = []
+    for handle in handles:
+        _, figure_id = cache.get(handle)
+        if figure_id:
+            all_ids.append({'id': figure_id, 'handle': handle})
+
+    print(f'Resolved {len(all_ids)} ids total.')
+    return all_ids
+
+
+def read_handles(handle_file):
+    """
+    Reads the Twitter handles to resolve.
+    Args:
+        handle_file (str): The path to the CSV file containing Twitter handles.
+    Returns:
+        list: The handles, in file order.
+    """
+    with open(handle_file, 'r', encoding='UTF-8') as csv_file:
+        return [row[0] for row in csv.reader(csv_file) if row]
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='Crawls over PolitTweet.org to query a twitter handle and extract its id.')
@@ -122,9 +285,44 @@ if __name__ == '__main__':
         type=str,
         help='The name of the file to output.')
 
+    parser.add_argument(
+        '--cache_file',
+        type=str,
+        help='JSON file caching the answers, next to the output file by default.',
+        default=None)
+    parser.add_argument(
+        '--ttl_days',
+        type=float,
+        help='Days a found id is trusted before being looked up again.',
+        default=DEFAULT_TTL / 86400)
+    parser.add_argument(
+        '--negative_ttl_days',
+        type=float,
+        help='Days a missing handle is trusted before being looked up again.',
+        default=DEFAULT_NEGATIVE_TTL / 86400)
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        help='Maximum number of requests in flight.',
+        default=DEFAULT_CONCURRENCY)
+    parser.add_argument(
+        '--max_retries',
+        type=int,
+        help='Number of retries of a page that failed to load.',
+        default=MAX_RETRIES)
+
     args = parser.parse_args()
 
-    ids = scrape_polititweet(args.handle_file)
+    handle_cache = HandleCache(
+        args.cache_file or os.path.join(os.path.dirname(args.outputname), HANDLE_CACHE_NAME),
+        ttl=args.ttl_days * 86400,
+        negative_ttl=args.negative_ttl_days * 86400)
+
+    ids = asyncio.run(resolve_handles(
+        read_handles(args.handle_file),
+        handle_cache,
+        concurrency=args.concurrency,
+        max_retries=args.max_retries))
 
     df = pd.DataFrame(ids)
     df.to_csv(args.outputname, index=False)
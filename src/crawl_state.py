@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+State of the incremental Polititweet crawl made by `read_tweets`.
+The state lives inside the output folder and records, for every account,
+the newest tweet id already saved (its high-water mark), the cursor of the
+next page of a crawl in progress and the committed mark of the account's
+output as of the last saved page. Pages are listed newest first, so a
+refresh stops as soon as it reaches a tweet older than the high-water mark,
+and an interrupted crawl resumes from its cursor. The state only moves
+forward once a page is durable on disk; anything written past the committed
+mark by an interrupted run is dropped on the next one.
+"""
+import json
+import os
+from tweet_sink import CsvSink
+
+CRAWL_STATE_NAME = '_crawl_state.json'
+
+
+def load_crawl_state(output_folder):
+    """
+    Loads the crawl state of an output folder.
+    Args:
+        output_folder (str): Folder where the tweets are saved.
+    Returns:
+        dict: The state, with an empty `accounts` mapping if there is none yet.
+    """
+    path = os.path.join(output_folder, CRAWL_STATE_NAME)
+    if not os.path.isfile(path):
+        return {'accounts': {}}
+
+    with open(path, 'r', encoding='UTF-8') as state_file:
+        return json.load(state_file)
+
+
+def save_crawl_state(output_folder, state):
+    """
+    Saves the crawl state atomically, so a crash never leaves it half written.
+    Args:
+        output_folder (str): Folder where the tweets are saved.
+        state (dict): The state to save.
+    """
+    path = os.path.join(output_folder, CRAWL_STATE_NAME)
+    tmp_path = f'{path}.tmp'
+
+    with open(tmp_path, 'w', encoding='UTF-8') as state_file:
+        json.dump(state, state_file, indent=2, sort_keys=True)
+        state_file.flush()
+        os.fsync(state_file.fileno())
+
+    os.replace(tmp_path, path)
+
+
+def account_state(state, account_id):
+    """
+    Gets the state of an account, creating it on its first crawl.
+    Args:
+        state (dict): The crawl state.
+        account_id (str): The Twitter account ID.
+    Returns:
+        dict: `newest_id` (high-water mark), `cursor` (next page of the crawl
+        in progress), `crawl_newest_id` (newest tweet of the crawl in
+        progress) and `size` (committed mark of the output, see `tweet_sink`).
+    """
+    return state['accounts'].setdefault(str(account_id), {
+        'newest_id': None,
+        'cursor': None,
+        'crawl_newest_id': None,
+        'size': None
+    })
+
+
+def start_cursor(entry, account_id):
+    """
+    Gets the page a crawl of the account starts from.
+    Args:
+        entry (dict): The state of the account.
+        account_id (str): The Twitter account ID.
+    Returns:
+        str: The cursor of an interrupted crawl, or the first page.
+    """
+    return entry['cursor'] or f'?account={account_id}'
+
+
+def check_format(state, sink_format):
+    """
+    Records the output format in the state, refusing to mix formats.
+    Args:
+        state (dict): The crawl state.
+        sink_format (str): Output format of the crawl.
+    """
+    # States written before the output format was recorded hold CSV files.
+    recorded = state.setdefault('format', 'csv' if state['accounts'] else sink_format)
+    if recorded != sink_format:
+        raise ValueError(
+            f'The output folder holds {recorded} tweets, not {sink_format}; '
+            'use a new output folder to change the output format.')
+
+
+def commit_page(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        output_folder, state, account_id, tweets, next_cursor, sink=None):
+    """
+    Writes the new tweets of a page and moves the crawl of the account
+    forward, saving the state once the page is durable. The crawl is over
+    once it reaches a tweet already saved or the last page; its newest tweet
+    then becomes the high-water mark.
+    Args:
+        output_folder (str): Folder where the tweets are saved.
+        state (dict): The crawl state.
+        account_id (str): The Twitter account ID.
+        tweets (list): Tweets of the page, newest first.
+        next_cursor (str): The cursor of the next page, if available.
+        sink (object): Writer of the account's tweets; a `CsvSink` by default.
+    Returns:
+        bool: True if the crawl should go on with the next page.
+    """
+    entry = account_state(state, account_id)
+    newest_id = entry['newest_id']
+    sink = sink or CsvSink(output_folder, account_id, entry['size'])
+
+    fresh = [tweet for tweet in tweets if newest_id is None or int(tweet['id']) > newest_id]
+    committed = sink.write(fresh)
+
+    ids = [int(tweet['id']) for tweet in fresh]
+    if entry['crawl_newest_id'] is not None:
+        ids.append(entry['crawl_newest_id'])
+    entry['crawl_newest_id'] = max(ids, default=None)
+
+    if len(fresh) < len(tweets) or not next_cursor:
+        if entry['crawl_newest_id'] is not None:
+            entry['newest_id'] = max(newest_id or 0, entry['crawl_newest_id'])
+        entry['cursor'] = None
+        entry['crawl_newest_id'] = None
+    else:
+        entry['cursor'] = next_cursor
+
+    if committed is not None:
+        entry['size'] = committed
+        save_crawl_state(output_folder, state)
+
+    return entry['cursor'] is not None
+
+
+def close_crawl(output_folder, state, account_id, sink):
+    """
+    Flushes the writer of an account and saves the state of its crawl.
+    Args:
+        output_folder (str): Folder where the tweets are saved.
+        state (dict): The crawl state.
+        account_id (str): The Twitter account ID.
+        sink (object): Writer of the account's tweets.
+    """
+    account_state(state, account_id)['size'] = sink.close()
+    save_crawl_state(output_folder, state)
@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Local store of the tweet embeddings used as features by the models of
+`stock_tweet_analysis.ipynb`, instead of `07_tweet_embedding.csv` and its
+stringified vectors.
+The store is a folder holding:
+* `vectors.npy`: the float32 embedding of every tweet, one row per tweet;
+* `ids.npy`: the int64 id of the tweet of every row;
+* `_manifest.json`: the model, its revision, the dimension of the vectors
+  and the number of committed rows.
+Both arrays are plain `.npy` files opened memory-mapped, so the feature
+matrix handed to scikit-learn or LightGBM is read from the page cache
+without parsing or copying. Rows are only ever appended: new tweets are
+written past the committed rows and synced, then committed by replacing the
+manifest, and anything past the committed rows is dropped when the store is
+opened. Embeddings are computed locally, in batches of similar length, by a
+sentence embedding model (see `topic_extraction.SentenceEmbedder`):
+python ./src/embedding_store.py ./data/03_normalized_tweets.parquet ./data/07_tweet_embedding
+`--import_column embeddings` converts the vectors of the legacy
+`07_tweet_embedding.csv` instead.
+"""
+import argparse
+import json
+import os
+import struct
+import time
+import numpy as np
+import pandas as pd
+from scoring_output import (
+    DEFAULT_FLUSH_ROWS, add_model_arguments, length_batches, onnx_models_dir, read_table)
+from topic_extraction import DEFAULT_BATCH_SIZES, DEFAULT_MODELS, SentenceEmbedder
+
+MANIFEST_NAME = '_manifest.json'
+VECTORS_NAME = 'vectors.npy'
+IDS_NAME = 'ids.npy'
+LEGACY_MODEL = 'text-embedding-3-small'
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+NPY_HEADER_SIZE = 128
+
+
+def npy_header(dtype, shape):
+    """
+    Builds a `.npy` header padded to a fixed size, so the shape can be
+    rewritten in place as rows are appended.
+    Args:
+        dtype (dtype): Type of the array.
+        shape (tuple): Shape of the array.
+    Returns:
+        bytes: The `NPY_HEADER_SIZE` bytes of the header.
+    """
+    header = repr({
+        'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        'fortran_order': False,
+        'shape': tuple(shape)
+    }).encode('latin1')
+    header_length = NPY_HEADER_SIZE - len(NPY_MAGIC) - 2
+
+    return (NPY_MAGIC + struct.pack('<H', header_length)
+            + header.ljust(header_length - 1) + b'\n')
+
+
+def append_rows(path, data, rows):
+    """
+    Writes rows after the first `rows` rows of a `.npy` file, drops anything
+    past them, updates the header and syncs the file.
+    Args:
+        path (str): Path to the file, created if missing.
+        data (ndarray): The rows, C-contiguous; none to only drop what is past
+            the first `rows` rows.
+        rows (int): Rows of the file kept.
+    """
+    with open(path, 'r+b' if os.path.isfile(path) else 'w+b') as npy_file:
+        npy_file.seek(NPY_HEADER_SIZE + rows * data.itemsize * int(np.prod(data.shape[1:])))
+        npy_file.write(data.tobytes())
+        npy_file.truncate()
+        npy_file.seek(0)
+        npy_file.write(npy_header(data.dtype, (rows + len(data), *data.shape[1:])))
+        npy_file.flush()
+        os.fsync(npy_file.fileno())
+
+
+class EmbeddingStore:
+    """
+    Append-only store of float32 tweet embeddings, memory-mapped and indexed
+    by tweet id.
+    """
+
+    def __init__(self, path, model_name=None, revision=None):
+        self.path = path
+        self.manifest_path = os.path.join(path, MANIFEST_NAME)
+        self.manifest = {'model': model_name, 'revision': revision, 'dim': None, 'rows': 0}
+        self.cached = {}
+
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='UTF-8') as manifest_file:
+                self.manifest = json.load(manifest_file)
+            for key, value in (('model', model_name), ('revision', revision)):
+                if value is not None and value != self.manifest[key]:
+                    raise ValueError(
+                        f'{path} holds the embeddings of {self.manifest["model"]} '
+                        f'({self.manifest["revision"]}), not of {model_name} ({revision}); '
+                        'use another folder.')
+            self.rollback()
+        else:
+            os.makedirs(path, exist_ok=True)
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    @property
+    def dim(self):
+        """
+        int: Dimension of the vectors, None until the first rows are added.
+        """
+        return self.manifest['dim']
+
+    def rollback(self):
+        """
+        Drops the rows written past the committed ones by an interrupted
+        append.
+        """
+        for name, dtype, row_shape in self.arrays():
+            path = os.path.join(self.path, name)
+            row_bytes = np.dtype(dtype).itemsize * int(np.prod(row_shape))
+            if os.path.getsize(path) != NPY_HEADER_SIZE + len(self) * row_bytes:
+                append_rows(path, np.empty((0, *row_shape), dtype), len(self))
+
+    def arrays(self):
+        """
+        Lists the arrays of the store.
+        Returns:
+            list: The file name, type and row shape of every array.
+        """
+        return [(VECTORS_NAME, np.float32, (self.dim,)), (IDS_NAME, np.int64, ())]
+
+    def load(self, name):
+        """
+        Opens an array of the store memory-mapped and read-only.
+        Args:
+            name (str): `VECTORS_NAME` or `IDS_NAME`.
+        Returns:
+            ndarray: The committed rows of the array.
+        """
+        if name not in self.cached:
+            _, dtype, row_shape = next(array for array in self.arrays() if array[0] == name)
+            shape = (len(self), *row_shape)
+            if len(self):
+                self.cached[name] = np.memmap(
+                    os.path.join(self.path, name), dtype=dtype, mode='r',
+                    offset=NPY_HEADER_SIZE, shape=shape)
+            else:
+                self.cached[name] = np.empty((0, *(dim or 0 for dim in row_shape)), dtype)
+
+        return self.cached[name]
+
+    @property
+    def vectors(self):
+        """
+        ndarray: The embedding of every stored tweet (rows), memory-mapped.
+        """
+        return self.load(VECTORS_NAME)
+
+    @property
+    def ids(self):
+        """
+        ndarray: The id of the tweet of every row, memory-mapped.
+        """
+        return self.load(IDS_NAME)
+
+    def rows_of(self, ids):
+        """
+        Looks tweets up.
+        Args:
+            ids (array-like): Tweet ids.
+        Returns:
+            ndarray: The row of every tweet, -1 for tweets not in the store.
+        """
+        if 'index' not in self.cached:
+            self.cached['index'] = pd.Index(self.ids)
+
+        return self.cached['index'].get_indexer(np.asarray(ids, dtype=np.int64))
+
+    def matrix(self, ids=None):
+        """
+        Gets the feature matrix of tweets, e.g. `X` for scikit-learn or
+        LightGBM.
+        Args:
+            ids (array-like): Tweet ids, in the order of the rows of the
+                matrix; every stored tweet, in store order, by default.
+        Returns:
+            ndarray: The float32 embedding of every tweet (rows). A view of
+            the memory-mapped vectors, without copy, when the tweets are a run
+            of consecutive rows in store order; a new array otherwise.
+        """
+        if ids is None:
+            return self.vectors
+
+        rows = self.rows_of(ids)
+        if (rows < 0).any():
+            missing = np.asarray(ids)[rows < 0]
+            raise KeyError(f'{len(missing)} tweets are not in {self.path}, e.g. {missing[0]}.')
+
+        if rows.size and (np.diff(rows) == 1).all():
+            return self.vectors[rows[0]:rows[-1] + 1]
+
+        return self.vectors[rows]
+
+    def append(self, ids, vectors):
+        """
+        Adds the embeddings of tweets not in the store yet and commits them.
+        Args:
+            ids (array-like): Tweet ids.
+            vectors (array-like): The embedding of every tweet (rows).
+        Returns:
+            int: Number of tweets added; tweets already in the store, or
+            repeated, keep their first embedding.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if not ids.size:
+            return 0
+
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        if self.dim is not None and vectors.shape[1] != self.dim:
+            raise ValueError(
+                f'Expected vectors of dimension {self.dim}, got {vectors.shape[1]}.')
+
+        new = (self.rows_of(ids) < 0) & ~pd.Index(ids).duplicated()
+        if not new.any():
+            return 0
+
+        self.manifest['dim'] = vectors.shape[1]
+        append_rows(os.path.join(self.path, VECTORS_NAME),
+                    np.ascontiguousarray(vectors[new]), len(self))
+        append_rows(os.path.join(self.path, IDS_NAME), ids[new], len(self))
+
+        self.manifest['rows'] += int(new.sum())
+        self.save_manifest()
+        self.cached = {}
+
+        return int(new.sum())
+
+    def save_manifest(self):
+        """
+        Saves the manifest atomically, committing the rows written.
+        """
+        tmp_path = f'{self.manifest_path}.tmp'
+
+        with open(tmp_path, 'w', encoding='UTF-8') as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=2)
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+
+        os.replace(tmp_path, self.manifest_path)
+
+
+def embed_tweets(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+        tweets, sentence_embedder, store, batch_size=DEFAULT_BATCH_SIZES['embedding'],
+        flush_rows=DEFAULT_FLUSH_ROWS, id_column='id', text_column='clean_text'):
+    """
+    Embeds the tweets not in the store yet and appends them to it, every
+    `flush_rows` tweets in the order of `tweets`, so their feature matrix is a
+    view of the store.
+    Args:
+        tweets (DataFrame): Tweets with an id and a text column.
+        sentence_embedder (SentenceEmbedder): Embeds batches of tokenized
+            texts.
+        store (EmbeddingStore): Store of the embeddings.
+        batch_size (int): Texts per forward pass.
+        flush_rows (int): Embedded tweets appended at once.
+        id_column (str): Column of the tweet ids.
+        text_column (str): Column of the texts.
+    Returns:
+        int: Number of tweets embedded.
+    """
+    tweets = tweets.dropna(subset=[id_column]).drop_duplicates(id_column)
+    tweets = tweets[store.rows_of(tweets[id_column]) < 0]
+    print(f'{len(tweets)} tweets to embed, {len(store)} already in {store.path}.')
+
+    start = time.perf_counter()
+    for chunk_start in range(0, len(tweets), flush_rows):
+        chunk = tweets.iloc[chunk_start:chunk_start + flush_rows]
+        input_ids = sentence_embedder.encode(chunk[text_column].fillna('').astype(str).tolist())
+        vectors = np.empty((len(chunk), 0), dtype=np.float32)
+
+        for positions in length_batches(input_ids, batch_size):
+            batch_vectors = sentence_embedder.embed([input_ids[i] for i in positions])
+            if not vectors.shape[1]:
+                vectors = np.empty((len(chunk), batch_vectors.shape[1]), dtype=np.float32)
+            vectors[positions] = batch_vectors
+
+        store.append(chunk[id_column], vectors)
+
+    elapsed = time.perf_counter() - start
+    if len(tweets):
+        print(f'Embedded {len(tweets)} tweets in {elapsed:.1f} s '
+              f'({len(tweets) / max(elapsed, 1e-9):.1f} tweets/sec).')
+
+    return len(tweets)
+
+
+def import_embedding_csv(
+        csv_path, store, column='embeddings', id_column='tweet_id', chunk_rows=10000):
+    """
+    Adds the embeddings of a CSV file with stringified vectors, such as
+    `07_tweet_embedding.csv`, to the store, parsing them as JSON in chunks.
+    Args:
+        csv_path (str): Path to the CSV file.
+        store (EmbeddingStore): Store of the embeddings.
+        column (str): Column of the vectors, e.g. `[0.1, -0.2, ...]`.
+        id_column (str): Column of the tweet ids.
+        chunk_rows (int): Rows parsed and appended at once.
+    Returns:
+        int: Number of tweets added.
+    """
+    count = 0
+
+    for chunk in pd.read_csv(csv_path, usecols=[id_column, column], chunksize=chunk_rows):
+        chunk = chunk.dropna()
+        if not chunk.empty:
+            vectors = json.loads(f'[{",".join(chunk[column])}]')
+            count += store.append(chunk[id_column], np.array(vectors, dtype=np.float32))
+
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Add the embeddings of tweets to a memory-mapped embedding store.')
+    parser.add_argument(
+        'input_path',
+        type=str,
+        help='Tweets, e.g. 03_normalized_tweets.parquet, or a CSV file of embeddings with '
+             '--import_column.')
+    parser.add_argument(
+        'output_path',
+        type=str,
+        help='Folder of the embedding store, e.g. ./data/07_tweet_embedding.')
+    parser.add_argument(
+        '--model',
+        type=str,
+        help=f'Hugging Face model name or local path; {DEFAULT_MODELS["embedding"]} by default, '
+             f'or {LEGACY_MODEL} with --import_column.')
+    parser.add_argument(
+        '--batch_size',
+        type=int,
+        default=DEFAULT_BATCH_SIZES['embedding'],
+        help='Tweets per forward pass.')
+    parser.add_argument(
+        '--flush_rows',
+        type=int,
+        default=DEFAULT_FLUSH_ROWS,
+        help='Embedded tweets appended and committed at once.')
+    parser.add_argument(
+        '--id_column',
+        type=str,
+        help='Column of the tweet ids; id, or tweet_id with --import_column, by default.')
+    parser.add_argument(
+        '--text_column',
+        type=str,
+        default='clean_text',
+        help='Column of the texts.')
+    parser.add_argument(
+        '--import_column',
+        type=str,
+        help='Import the stringified vectors of this column (e.g. embeddings) instead of '
+             'computing them.')
+    add_model_arguments(parser)
+    args = parser.parse_args()
+
+    if args.import_column:
+        embedding_store = EmbeddingStore(args.output_path, args.model or LEGACY_MODEL)
+        tweet_count = import_embedding_csv(
+            args.input_path, embedding_store, args.import_column, args.id_column or 'tweet_id')
+    else:
+        embedder = SentenceEmbedder(
+            args.model or DEFAULT_MODELS['embedding'], threads=args.threads,
+            revision=args.revision, backend=args.backend, onnx_dir=onnx_models_dir(args))
+        embedding_store = EmbeddingStore(args.output_path, embedder.model_name, embedder.revision)
+        tweet_count = embed_tweets(
+            read_table(args.input_path), embedder, embedding_store, args.batch_size,
+            args.flush_rows, args.id_column or 'id', args.text_column)
+    print(f'Added {tweet_count} tweets to {args.output_path} ({len(embedding_store)} in total)')
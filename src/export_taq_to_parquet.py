@@ -3,79 +3,721 @@
 """
 Export TAQ CSVs in a folder to parquet files.
 This script reads TAQ CSV files from a specified input folder, processes them
-to calculate average prices per minute, and saves the results as Parquet files
+to build price bars (average price per minute by default), and saves the results as Parquet files
 in a specified output folder. The script handles large files by reading them
 in chunks, and it allows for optional compression of the output files.
+
+Aggregation is streamed: every chunk is reduced to per (SYM_ROOT, bar)
+buckets (see `taq_bars`), which are merged into a small set of open bars.
+A bar is closed as soon as a later bar shows up for the same symbol, so peak
+memory is bounded by the chunk size plus the open bars and the flush buffer,
+not by the size of the dataset. Closed bars are written once as new Parquet
+fragments and are never rewritten. Bars are 1 minute wide and only carry
+`avg_price` by default; `--bar_width` and `--fields` select 1s/5s/1min/5min
+bars with open/high/low/close, VWAP, volume and trade count.
+
+With `--workers N`, files are parsed and aggregated in a process pool. Each
+worker spills its per-chunk bar buckets to an intermediate Parquet file
+(one row group per chunk) and the merge stage replays them, in file order,
+through the same accumulator and writer as the serial path, so both paths
+produce byte-for-byte identical datasets.
+
+With `--engine pyarrow`, files are read with the multithreaded `pyarrow.csv`
+streaming reader using explicit column types, timestamps are built from the
+parsed DATE and TIME_M columns with vectorized arithmetic and the data stays
+in Arrow until it is reduced to bar buckets.
+
+Exports are incremental: a manifest in the output folder (see
+`taq_manifest`) records every ingested file, so re-runs only process new or
+changed files. By default the affected `SYM_ROOT/year` partitions are
+rewritten, dropping the rows previously contributed by changed or removed
+files; with `--append`, new files are added as new fragments instead.
+Either way the new output is first staged in the output folder, then
+swapped in with renames recorded in a journal; saving the manifest commits
+the swap, and a run that fails before that (or the next run, after a crash)
+reverts it, so the dataset always matches its manifest.
+Both modes assume that different source files cover disjoint trading times
+(e.g. one file per day or per year), as WRDS TAQ drops do.
+
+Files are written sorted by timestamp, with `--row_group_size` rows per row
+group, min/max statistics and a page index, so timestamp predicates skip
+most of a partition. `--compact` merges the fragments of the partitions
+touched by an append (see `compact_taq_parquet`).
 """
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import json
 import os
+import shutil
+import tempfile
+import uuid
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from compact_taq_parquet import (
+    DEFAULT_FILE_ROWS,
+    DEFAULT_ROW_GROUP_SIZE,
+    FileLayout,
+    compact_taq_parquet,
+    parquet_write_options,
+    write_partition_files
+)
+from taq_bars import (
+    BAR_FIELDS,
+    BAR_WIDTHS,
+    DEFAULT_BAR_FIELDS,
+    DEFAULT_BAR_WIDTH,
+    BarAccumulator,
+    aggregate_trades,
+    aggregate_trades_arrow,
+    buckets_to_frame,
+    check_bar_options,
+    merge_buckets
+)
+from taq_filters import (
+    TradeFilters,
+    active_filters,
+    filter_columns,
+    filter_trades,
+    filter_trades_arrow
+)
+from taq_manifest import (
+    check_layout,
+    load_manifest,
+    plan_changes,
+    record_contributions,
+    save_manifest,
+    update_manifest
+)
 
+DEFAULT_FLUSH_ROWS = 10**6
+BUCKET_KEYS = ['SYM_ROOT', 'timestamp']
+RAW_COLUMNS = ['DATE', 'TIME_M', 'SYM_ROOT', 'PRICE', 'SIZE']
+TRADE_COLUMNS = ['timestamp', 'SYM_ROOT', 'PRICE', 'SIZE']
+ENGINES = ['pandas', 'pyarrow']
+STAGING_PREFIX = '.staging-'
+REWRITTEN_DIR = '.rewritten'
+BACKUP_DIR = '.backup'
+SWAP_JOURNAL = '_swap.json'
 
-def export_taq_to_parquet(
-        input_folder,
-        output_folder,
-        chunksize=10**5,
-        compression='snappy'):
+ARROW_BLOCK_SIZE = 64 * 1024 * 1024
+ARROW_COLUMN_TYPES = {
+    'DATE': pa.timestamp('ns'),
+    'TIME_M': pa.string(),
+    'SYM_ROOT': pa.string(),
+    'PRICE': pa.float64(),
+    'SIZE': pa.float64()
+}
+NANOS_PER_SECOND = 10**9
+
+
+def read_taq_chunks(full_path, chunksize, filters=None):
     """
-    Export CSV files to Parquet format.
+    Reads a TAQ CSV file in chunks, keeping only the columns needed to
+    build bars. Trades rejected by the filters are dropped before any
+    conversion.
+    Args:
+        full_path (str): Path to the TAQ CSV file.
+        chunksize (int): Number of rows per chunk to read.
+        filters (TradeFilters): Condition, exchange and symbol filters.
+    Yields:
+        DataFrame: Chunk with the columns `timestamp`, `SYM_ROOT`, `PRICE` and `SIZE`.
     """
-    results = []
+    needed = set(RAW_COLUMNS + filter_columns(filters))
+
+    for chunk in pd.read_csv(full_path, chunksize=chunksize,
+                             usecols=lambda column: column in needed, dtype={
+                                 'DATE': str,
+                                 'TIME_M': str,
+                                 'SYM_ROOT': str,
+                                 'EX': str,
+                                 'TR_SCOND': str
+                             }):
+        chunk = filter_trades(chunk, filters)
+        chunk = chunk.assign(
+            timestamp=pd.to_datetime(chunk['DATE'] + ' ' + chunk['TIME_M']),
+            PRICE=pd.to_numeric(chunk['PRICE'], errors='coerce'),
+            SIZE=(pd.to_numeric(chunk['SIZE'], errors='coerce').astype(float)
+                  if 'SIZE' in chunk else float('nan')))
+
+        yield chunk[TRADE_COLUMNS]
 
-    for filename in os.listdir(input_folder):
-        if not filename.endswith('.csv'):
-            continue
 
-        print(f'Processing file: {filename}...')
-        full_path = os.path.join(input_folder, filename)
+def sniff_padded_times(full_path):
+    """
+    Checks whether the TIME_M column of a TAQ file uses zero-padded
+    `HH:MM:SS` times, which the Arrow CSV reader can parse natively.
+    Args:
+        full_path (str): Path to the TAQ CSV file.
+    Returns:
+        bool: True if the first trade has a two-digit hour.
+    """
+    with open(full_path, 'r', encoding='UTF-8', newline='') as csv_file:
+        reader = csv.DictReader(csv_file)
+        first_row = next(reader, None)
 
-        for chunk in pd.read_csv(full_path, chunksize=chunksize, dtype={
-            'SYM_SUFFIX': str,
-            'SYM_ROOT': str,
-            'EX': str,
-            'TR_SCOND': str
-        }):
-            chunk['timestamp'] = pd.to_datetime(
-                chunk['DATE'] + ' ' + chunk['TIME_M'])
+    if not first_row or not first_row.get('TIME_M'):
+        return False
 
-            chunk['PRICE'] = pd.to_numeric(chunk['PRICE'], errors='coerce')
+    return len(first_row['TIME_M'].split(':')[0]) == 2
 
-            chunk = chunk[['timestamp', 'SYM_ROOT', 'PRICE']]
 
-            chunk.set_index('timestamp', inplace=True)
+def read_taq_batches_arrow(full_path, filters=None, block_size=ARROW_BLOCK_SIZE):
+    """
+    Reads a TAQ CSV file with the multithreaded `pyarrow.csv` streaming
+    reader, parsing only the columns needed to build bars.
+    Zero-padded TIME_M values are parsed as `time64` by the reader itself;
+    otherwise they are read as strings and converted by `arrow_timestamps`.
+    Trades rejected by the filters are dropped before timestamps are built.
+    Args:
+        full_path (str): Path to the TAQ CSV file.
+        filters (TradeFilters): Condition, exchange and symbol filters.
+        block_size (int): Number of bytes parsed per batch.
+    Yields:
+        Table: Batch with the columns `timestamp`, `SYM_ROOT`, `PRICE` and `SIZE`.
+    """
+    column_types = dict(ARROW_COLUMN_TYPES)
+    for column in filter_columns(filters):
+        column_types.setdefault(column, pa.string())
+    if sniff_padded_times(full_path):
+        column_types['TIME_M'] = pa.time64('ns')
 
-            resampled = (
-                chunk
-                .groupby('SYM_ROOT')
-                .resample('1min')
-                .agg({'PRICE': 'mean'})
-                .reset_index()
-            )
+    reader = pa_csv.open_csv(
+        full_path,
+        read_options=pa_csv.ReadOptions(use_threads=True, block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=column_types,
+            include_columns=list(column_types),
+            include_missing_columns=True,
+            timestamp_parsers=[pa_csv.ISO8601, '%Y%m%d']))
 
-            results.append(resampled)
+    for batch in reader:
+        batch = filter_trades_arrow(batch, filters)
+        yield pa.table({
+            'timestamp': arrow_timestamps(batch.column('DATE'), batch.column('TIME_M')),
+            'SYM_ROOT': batch.column('SYM_ROOT'),
+            'PRICE': batch.column('PRICE'),
+            'SIZE': batch.column('SIZE')
+        })
 
-        final = pd.concat(results)
 
-        final = (
-            final
-            .groupby(['timestamp', 'SYM_ROOT'])['PRICE']
-            .mean()
-            .reset_index()
-        )
+def arrow_timestamps(dates, times):
+    """
+    Builds trade timestamps from the parsed DATE and TIME_M columns with
+    vectorized arithmetic on nanoseconds.
+    Args:
+        dates (Array): DATE column parsed as `timestamp[ns]` midnights.
+        times (Array): TIME_M column, either `time64[ns]` or `H:MM:SS.f` strings.
+    Returns:
+        Array: Trade timestamps as `timestamp[ns]`.
+    """
+    if pa.types.is_time(times.type):
+        offset = pc.cast(times, pa.int64())
+        return pc.cast(pc.add(pc.cast(dates, pa.int64()), offset), pa.timestamp('ns'))
 
-        final = final.rename(columns={'PRICE': 'avg_price'})
-        final['year'] = final['timestamp'].dt.year
+    parts = pc.split_pattern(times, ':')
+    hours = pc.cast(pc.list_element(parts, 0), pa.int64())
+    minutes = pc.cast(pc.list_element(parts, 1), pa.int64())
+    seconds = pc.cast(pc.list_element(parts, 2), pa.float64())
 
-        print(f'{filename} aggregated, persisting into Parquet...')
+    offset = pc.add(
+        pc.multiply(pc.add(pc.multiply(hours, 60), minutes), 60 * NANOS_PER_SECOND),
+        pc.cast(pc.round(pc.multiply(seconds, NANOS_PER_SECOND)), pa.int64()))
+
+    return pc.cast(pc.add(pc.cast(dates, pa.int64()), offset), pa.timestamp('ns'))
+
+
+def iter_file_partials(full_path, chunksize, engine='pandas', bar_width=DEFAULT_BAR_WIDTH,
+                       filters=None):
+    """
+    Yields the per-chunk bar buckets of a single TAQ file.
+    Args:
+        full_path (str): Path to the TAQ CSV file.
+        chunksize (int): Number of rows per chunk to read (pandas engine).
+        engine (str): CSV engine, either `pandas` or `pyarrow`.
+        bar_width (str): Bar width, one of `taq_bars.BAR_WIDTHS`.
+        filters (TradeFilters): Condition, exchange and symbol filters.
+    Yields:
+        DataFrame: Partial buckets indexed by (SYM_ROOT, timestamp).
+    """
+    if engine == 'pyarrow':
+        for batch in read_taq_batches_arrow(full_path, filters):
+            yield aggregate_trades_arrow(batch, bar_width)
+    elif engine == 'pandas':
+        for chunk in read_taq_chunks(full_path, chunksize, filters):
+            yield aggregate_trades(chunk, bar_width)
+    else:
+        raise ValueError(f'Unknown engine: {engine}')
+
+
+class PartitionWriter:
+    """
+    Buffers closed buckets and writes them as new fragments of the
+    `SYM_ROOT=/year=` partitioned dataset. Every fragment is written exactly
+    once; late rows for a buffered bucket are merged before the flush.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+            self, output_folder, compression='snappy',
+            flush_rows=DEFAULT_FLUSH_ROWS, prefix='part', fields=None,
+            row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        self.output_folder = output_folder
+        self.layout = FileLayout(compression, row_group_size)
+        self.flush_rows = flush_rows
+        self.prefix = prefix
+        self.fields = fields or DEFAULT_BAR_FIELDS
+        self._pending = []
+        self._flushes = 0
+
+    def write(self, buckets):
+        """
+        Adds closed buckets to the buffer, flushing it once it is full.
+        Args:
+            buckets (DataFrame): Closed buckets indexed by (SYM_ROOT, timestamp).
+        """
+        if buckets is None or buckets.empty:
+            return
+
+        self._pending.append(buckets)
+
+        if sum(len(pending) for pending in self._pending) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered buckets as new Parquet fragments.
+        """
+        buckets = merge_buckets(*self._pending)
+        self._pending = []
+
+        if buckets is None:
+            return
+
+        final = buckets_to_frame(buckets, self.fields)
         final.to_parquet(
-            output_folder,
+            self.output_folder,
             engine='pyarrow',
             index=False,
-            compression=compression,
-            partition_cols=['SYM_ROOT', 'year']
+            partition_cols=['SYM_ROOT', 'year'],
+            basename_template=f'{self.prefix}-{self._flushes:05d}-{{i}}.parquet',
+            use_threads=False,
+            **parquet_write_options(self.layout)
         )
+        self._flushes += 1
+
+
+def spill_file_buckets(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        full_path, spill_path, chunksize, engine='pandas',
+        bar_width=DEFAULT_BAR_WIDTH, filters=None):
+    """
+    Aggregates a single TAQ file into per-chunk bar buckets and writes them
+    to an intermediate Parquet file, one row group per chunk. This is the
+    unit of work of the process pool.
+    Args:
+        full_path (str): Path to the TAQ CSV file.
+        spill_path (str): Path of the intermediate Parquet file.
+        chunksize (int): Number of rows per chunk to read.
+        engine (str): CSV engine, either `pandas` or `pyarrow`.
+        bar_width (str): Bar width, one of `taq_bars.BAR_WIDTHS`.
+        filters (TradeFilters): Condition, exchange and symbol filters.
+    Returns:
+        str: `spill_path`, or None if the file had no valid trades.
+    """
+    writer = None
+    try:
+        for partial in iter_file_partials(full_path, chunksize, engine, bar_width, filters):
+            if partial.empty:
+                continue
+
+            table = pa.Table.from_pandas(partial.reset_index(), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(spill_path, table.schema)
+            writer.write_table(table, row_group_size=table.num_rows)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return spill_path if writer is not None else None
+
+
+def read_spilled_buckets(spill_path):
+    """
+    Reads back the per-chunk bar buckets written by `spill_file_buckets`.
+    Args:
+        spill_path (str): Path of the intermediate Parquet file.
+    Yields:
+        DataFrame: Partial buckets indexed by (SYM_ROOT, timestamp).
+    """
+    parquet_file = pq.ParquetFile(spill_path)
+    for i in range(parquet_file.num_row_groups):
+        yield parquet_file.read_row_group(i).to_pandas().set_index(BUCKET_KEYS)
+
+
+def list_taq_files(input_folder):
+    """
+    Lists the TAQ CSV files of a folder in a stable order.
+    Args:
+        input_folder (str): Folder with all the TAQ CSV files.
+    Returns:
+        list: Sorted CSV file names.
+    """
+    return sorted(
+        filename for filename in os.listdir(input_folder)
+        if filename.endswith('.csv'))
+
+
+def iter_partial_buckets(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        input_folder, filenames, chunksize, workers=1, engine='pandas',
+        bar_width=DEFAULT_BAR_WIDTH, filters=None):
+    """
+    Yields the per-chunk bar buckets of every file, in file order.
+    Args:
+        input_folder (str): Folder with all the TAQ CSV files.
+        filenames (list): CSV file names to process.
+        chunksize (int): Number of rows per chunk to read.
+        workers (int): Number of worker processes; 1 processes files serially.
+        engine (str): CSV engine, either `pandas` or `pyarrow`.
+        bar_width (str): Bar width, one of `taq_bars.BAR_WIDTHS`.
+        filters (TradeFilters): Condition, exchange and symbol filters.
+    Yields:
+        tuple: The file name and its partial buckets indexed by (SYM_ROOT, timestamp).
+    """
+    if workers <= 1:
+        for filename in filenames:
+            print(f'Processing file: {filename}...')
+            full_path = os.path.join(input_folder, filename)
+
+            for partial in iter_file_partials(
+                    full_path, chunksize, engine, bar_width, filters):
+                yield filename, partial
+
+            print(f'{filename} completed!')
+        return
+
+    with tempfile.TemporaryDirectory() as spill_dir, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                spill_file_buckets,
+                os.path.join(input_folder, filename),
+                os.path.join(spill_dir, f'{i:05d}.parquet'),
+                chunksize,
+                engine,
+                bar_width,
+                filters)
+            for i, filename in enumerate(filenames)
+        ]
+
+        for filename, future in zip(filenames, futures):
+            spill_path = future.result()
+            print(f'{filename} aggregated, merging...')
+
+            if spill_path is not None:
+                for partial in read_spilled_buckets(spill_path):
+                    yield filename, partial
+
+            print(f'{filename} completed!')
+
+
+def write_partials(partials, writer):
+    """
+    Streams partial buckets through a `BarAccumulator` into a writer.
+    Args:
+        partials (iterable): (file name, partial buckets) pairs, in file order.
+        writer (PartitionWriter): Writer receiving the closed buckets.
+    Returns:
+        dict: File name to the time range it contributed to each partition.
+    """
+    accumulator = BarAccumulator()
+    contributions = {}
+
+    for filename, partial in partials:
+        record_contributions(contributions.setdefault(filename, {}), partial)
+        writer.write(accumulator.add(partial))
+
+    print('Persisting remaining bars into Parquet...')
+    writer.write(accumulator.drain())
+    writer.flush()
+
+    return contributions
+
+
+def rewrite_partition(output_folder, staging_folder, partition, excluded, layout):
+    """
+    Stages the rewrite of a partition: the rows it already had, minus the
+    time ranges of files being replaced or removed, plus the newly staged
+    rows. The live partition is left untouched.
+    Args:
+        output_folder (str): Output folder of the partitioned Parquet dataset.
+        staging_folder (str): Folder with the freshly aggregated partitions.
+        partition (str): Partition path, as returned by `partition_name`.
+        excluded (list): `[first, last]` ranges whose existing rows are dropped.
+        layout (FileLayout): Compression, row group size and file size.
+    Returns:
+        list: The `(source, target)` moves, relative to the output folder,
+        that swap the rewritten partition in, keeping the live one as a backup.
+    """
+    current_dir = os.path.join(output_folder, partition)
+    staged_dir = os.path.join(staging_folder, partition)
+    frames = []
+
+    if os.path.isdir(current_dir):
+        current = pd.read_parquet(current_dir, engine='pyarrow')
+        drop = pd.Series(False, index=current.index)
+        for first, last in excluded:
+            drop |= current['timestamp'].between(pd.Timestamp(first), pd.Timestamp(last))
+        frames.append(current[~drop])
+
+    if os.path.isdir(staged_dir):
+        frames.append(pd.read_parquet(staged_dir, engine='pyarrow'))
+
+    frames = [frame for frame in frames if not frame.empty]
+    staging_name = os.path.basename(staging_folder)
+    moves = []
+
+    if os.path.isdir(current_dir):
+        moves.append((partition, os.path.join(staging_name, BACKUP_DIR, partition)))
+
+    if frames:
+        write_partition_files(
+            pa.Table.from_pandas(pd.concat(frames, ignore_index=True), preserve_index=False),
+            os.path.join(staging_folder, REWRITTEN_DIR, partition),
+            layout)
+        moves.append((os.path.join(staging_name, REWRITTEN_DIR, partition), partition))
+
+    return moves
+
+
+def rewrite_partitions(output_folder, staging_folder, excluded, layout):
+    """
+    Stages the rewrite of every partition affected by a run.
+    Args:
+        output_folder (str): Output folder of the partitioned Parquet dataset.
+        staging_folder (str): Folder with the freshly aggregated partitions.
+        excluded (dict): Partition name to the ranges whose rows are dropped.
+        layout (FileLayout): Compression, row group size and file size.
+    Returns:
+        list: The moves that swap the rewritten partitions in.
+    """
+    moves = []
+    for partition in sorted(excluded):
+        print(f'Rewriting partition {partition}...')
+        moves.extend(rewrite_partition(
+            output_folder, staging_folder, partition, excluded[partition], layout))
+
+    return moves
+
+
+def fragment_moves(staging_folder):
+    """
+    Lists the moves that add the staged fragments of an append to the dataset.
+    Args:
+        staging_folder (str): Folder with the freshly aggregated partitions.
+    Returns:
+        list: `(source, target)` moves, relative to the output folder.
+    """
+    staging_name = os.path.basename(staging_folder)
+    moves = []
+
+    for folder, subfolders, filenames in os.walk(staging_folder):
+        subfolders[:] = sorted(name for name in subfolders if not name.startswith('.'))
+        relative = os.path.relpath(folder, staging_folder)
+        for filename in sorted(filenames):
+            if filename.endswith('.parquet'):
+                target = os.path.normpath(os.path.join(relative, filename))
+                moves.append((os.path.join(staging_name, target), target))
+
+    return moves
+
+
+def apply_moves(output_folder, moves, undo=False):
+    """
+    Renames files or folders of the output folder, or reverts the renames.
+    Every rename is atomic, and reverting only undoes the renames that were
+    done, so it is safe after a crash at any point.
+    Args:
+        output_folder (str): Output folder of the partitioned Parquet dataset.
+        moves (list): `(source, target)` paths, relative to the output folder.
+        undo (bool): Moves every target that was done back to its source.
+    """
+    steps = [(target, source) for source, target in reversed(moves)] if undo else moves
+
+    for source, target in steps:
+        source = os.path.join(output_folder, source)
+        target = os.path.join(output_folder, target)
+        if undo and (not os.path.exists(source) or os.path.exists(target)):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source, target)
+
+
+def commit_moves(output_folder, staging_folder, moves, manifest):
+    """
+    Swaps the staged output of a run into the dataset and saves the manifest.
+    The moves and the new manifest are first recorded in the staging folder,
+    so until the manifest is saved the swap can be reverted (see
+    `close_staging`); saving the manifest commits it.
+    Args:
+        output_folder (str): Output folder of the partitioned Parquet dataset.
+        staging_folder (str): Folder with the staged output of the run.
+        moves (list): `(source, target)` paths, relative to the output folder.
+        manifest (dict): The manifest of the dataset after the run.
+    """
+    save_manifest(staging_folder, manifest)
+
+    journal_path = os.path.join(staging_folder, SWAP_JOURNAL)
+    with open(f'{journal_path}.tmp', 'w', encoding='UTF-8') as journal_file:
+        json.dump(moves, journal_file)
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+    os.replace(f'{journal_path}.tmp', journal_path)
 
-        print(f'{filename} completed!')
+    apply_moves(output_folder, moves)
+    save_manifest(output_folder, manifest)
+
+
+def close_staging(output_folder, staging_folder):
+    """
+    Removes a staging folder, first reverting its swap if the run did not
+    commit it (the manifest of the dataset is not the one it staged).
+    Args:
+        output_folder (str): Output folder of the partitioned Parquet dataset.
+        staging_folder (str): Folder with the staged output of a run.
+    """
+    journal_path = os.path.join(staging_folder, SWAP_JOURNAL)
+
+    if os.path.isfile(journal_path) and \
+            load_manifest(staging_folder) != load_manifest(output_folder):
+        print(f'Reverting the uncommitted swap of {os.path.basename(staging_folder)}...')
+        with open(journal_path, 'r', encoding='UTF-8') as journal_file:
+            apply_moves(output_folder, json.load(journal_file), undo=True)
+
+    shutil.rmtree(staging_folder)
+
+
+def recover_staging(output_folder):
+    """
+    Cleans up the staging folders left by interrupted runs, reverting the
+    swaps they did not commit.
+    Args:
+        output_folder (str): Output folder of the partitioned Parquet dataset.
+    """
+    for name in sorted(os.listdir(output_folder)):
+        path = os.path.join(output_folder, name)
+        if name.startswith(STAGING_PREFIX) and os.path.isdir(path):
+            close_staging(output_folder, path)
+
+
+def excluded_ranges(manifest, stale, contributions):
+    """
+    Collects, per partition, the time ranges whose existing rows must be
+    dropped: the previous contributions of stale files and the ranges the
+    newly processed files now cover.
+    Args:
+        manifest (dict): The manifest of the output folder.
+        stale (list): Changed or removed file names.
+        contributions (dict): File name to the ranges it contributed now.
+    Returns:
+        dict: Partition name to a list of `[first, last]` ranges.
+    """
+    excluded = {}
+    previous = [manifest['files'][filename]['partitions'] for filename in stale]
+
+    for file_contributions in previous + list(contributions.values()):
+        for partition, bounds in file_contributions.items():
+            excluded.setdefault(partition, []).append(bounds)
+
+    return excluded
+
+
+def export_taq_to_parquet(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+        input_folder,
+        output_folder,
+        chunksize=10**5,
+        compression='snappy',
+        flush_rows=DEFAULT_FLUSH_ROWS,
+        workers=1,
+        engine='pandas',
+        append=False,
+        bar_width=DEFAULT_BAR_WIDTH,
+        fields=None,
+        filters=None,
+        row_group_size=DEFAULT_ROW_GROUP_SIZE,
+        file_rows=DEFAULT_FILE_ROWS,
+        compact=False):
+    """
+    Export CSV files to Parquet format, processing only the files that are
+    not in the output folder's manifest yet or that changed since.
+    Args:
+        input_folder (str): Folder with all the TAQ CSV files.
+        output_folder (str): Output folder for the partitioned Parquet dataset.
+        chunksize (int): Number of rows per chunk to read.
+        compression (str): Compression algorithm for Parquet files.
+        flush_rows (int): Closed bar buckets buffered before a flush.
+        workers (int): Number of processes aggregating files in parallel.
+        engine (str): CSV engine, either `pandas` or `pyarrow`.
+        append (bool): Adds new fragments instead of rewriting partitions.
+        bar_width (str): Bar width, one of `taq_bars.BAR_WIDTHS`.
+        fields (list): Bar fields to write, each one of `taq_bars.BAR_FIELDS`.
+        filters (TradeFilters): Condition, exchange and symbol filters.
+        row_group_size (int): Maximum number of rows per row group.
+        file_rows (int): Maximum number of rows per rewritten file.
+        compact (bool): Compacts the partitions touched by the run.
+    """
+    layout = FileLayout(compression, row_group_size, file_rows)
+    fields = list(fields or DEFAULT_BAR_FIELDS)
+    check_bar_options(bar_width, fields)
+
+    os.makedirs(output_folder, exist_ok=True)
+    recover_staging(output_folder)
+    manifest = load_manifest(output_folder)
+    check_layout(
+        manifest, {'width': bar_width, 'fields': fields}, active_filters(filters))
+    plan = plan_changes(input_folder, list_taq_files(input_folder), manifest)
+
+    if not plan.dirty and not plan.stale:
+        print('All files already ingested, nothing to do.')
+        return
+
+    if append and plan.stale:
+        raise ValueError(
+            'Append mode cannot replace changed or removed files: '
+            f'{", ".join(plan.stale)}. Re-run without --append.')
+
+    partials = iter_partial_buckets(
+        input_folder, plan.dirty, chunksize, workers, engine, bar_width, filters)
+
+    staging_folder = tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=output_folder)
+    try:
+        contributions = write_partials(partials, PartitionWriter(
+            staging_folder, compression, flush_rows,
+            prefix=f'part-{uuid.uuid4().hex[:12]}' if append else 'part', fields=fields,
+            row_group_size=row_group_size))
+
+        if append:
+            moves = fragment_moves(staging_folder)
+        else:
+            moves = rewrite_partitions(
+                output_folder,
+                staging_folder,
+                excluded_ranges(manifest, plan.stale, contributions),
+                layout)
+
+        commit_moves(
+            output_folder, staging_folder, moves, update_manifest(manifest, plan, contributions))
+    finally:
+        close_staging(output_folder, staging_folder)
+
+    if compact:
+        touched = {
+            partition
+            for file_contributions in contributions.values()
+            for partition in file_contributions
+        }
+        compact_taq_parquet(output_folder, layout, partitions=sorted(touched))
 
 
 if __name__ == '__main__':
@@ -99,10 +741,103 @@ if __name__ == '__main__':
         type=str,
         default='snappy',
         help='Compression algorithm for Parquet files.')
+    parser.add_argument(
+        '--flush_rows',
+        type=int,
+        default=DEFAULT_FLUSH_ROWS,
+        help='Number of closed bar rows buffered before writing a fragment.')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of processes aggregating files in parallel.')
+    parser.add_argument(
+        '--engine',
+        type=str,
+        choices=ENGINES,
+        default='pandas',
+        help='CSV engine used to read the TAQ files.')
+    parser.add_argument(
+        '--append',
+        action='store_true',
+        help='Add new files as new fragments instead of rewriting partitions.')
+    parser.add_argument(
+        '--bar_width',
+        type=str,
+        choices=list(BAR_WIDTHS),
+        default=DEFAULT_BAR_WIDTH,
+        help='Width of the bars built from the trades.')
+    parser.add_argument(
+        '--fields',
+        type=str,
+        nargs='+',
+        choices=BAR_FIELDS,
+        default=DEFAULT_BAR_FIELDS,
+        help='Bar fields written to the Parquet files.')
+    parser.add_argument(
+        '--include_conditions',
+        type=str,
+        nargs='+',
+        help='Keep only trades whose sale condition codes are all in this list.')
+    parser.add_argument(
+        '--exclude_conditions',
+        type=str,
+        nargs='+',
+        help='Drop trades with any of these sale condition codes.')
+    parser.add_argument(
+        '--include_exchanges',
+        type=str,
+        nargs='+',
+        help='Keep only trades from these exchanges.')
+    parser.add_argument(
+        '--exclude_exchanges',
+        type=str,
+        nargs='+',
+        help='Drop trades from these exchanges.')
+    parser.add_argument(
+        '--include_symbols',
+        type=str,
+        nargs='+',
+        help='Keep only trades of these symbol roots.')
+    parser.add_argument(
+        '--exclude_symbols',
+        type=str,
+        nargs='+',
+        help='Drop trades of these symbol roots.')
+    parser.add_argument(
+        '--row_group_size',
+        type=int,
+        default=DEFAULT_ROW_GROUP_SIZE,
+        help='Maximum number of rows per Parquet row group.')
+    parser.add_argument(
+        '--file_rows',
+        type=int,
+        default=DEFAULT_FILE_ROWS,
+        help='Maximum number of rows per rewritten Parquet file.')
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Compact the partitions touched by the run into sorted files.')
     args = parser.parse_args()
 
     export_taq_to_parquet(
         args.input_folder,
         args.output_folder,
         args.chunksize,
-        args.compression)
+        args.compression,
+        args.flush_rows,
+        args.workers,
+        args.engine,
+        args.append,
+        args.bar_width,
+        args.fields,
+        TradeFilters(
+            args.include_conditions,
+            args.exclude_conditions,
+            args.include_exchanges,
+            args.exclude_exchanges,
+            args.include_symbols,
+            args.exclude_symbols),
+        args.row_group_size,
+        args.file_rows,
+        args.compact)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Scores the sentiment of the normalized tweets (see `normalize_tweets`) with
+FinBERT, the `progress_apply(run_finbert)` step of `FinBERT.ipynb`.
+Instead of one forward pass per tweet, texts are tokenized once (truncated
+to `max_length` tokens rather than characters), sorted by token length and
+scored in batches padded to their longest text, under
+`torch.inference_mode` with a configurable number of intra-op threads.
+Each distinct text is scored once, and its output is kept in the inference
+cache (see `inference_cache`), so re-runs only score new texts. Results are
+written every `flush_rows` tweets, in scoring order, to a CSV file or
+Parquet dataset (see `scoring_output`), so an interrupted run resumes with
+the tweets not scored yet.
+"""
+import argparse
+from inference_backend import load_model
+from inference_cache import CacheEntry, InferenceCache
+from scoring_output import (
+    DEFAULT_FLUSH_ROWS, ResultWriter, add_scoring_arguments, inference_cache_file,
+    length_batches, onnx_models_dir, read_table, score_tweets)
+
+try:
+    import torch
+    from transformers import AutoModelForSequenceClassification
+except ImportError:
+    torch = AutoModelForSequenceClassification = None
+
+DEFAULT_MODEL = 'yiyanghkust/finbert-tone'
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_LENGTH = 512
+
+
+class FinbertScorer:
+    """
+    FinBERT tokenizer and classifier, scoring batches of pre-tokenized texts
+    with an inference backend (see `inference_backend`).
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+            self, model_name=DEFAULT_MODEL, threads=None, max_length=DEFAULT_MAX_LENGTH,
+            revision=None, backend='fp32', onnx_dir=None):
+        # The revision keys the outputs of the model in the inference cache.
+        self.tokenizer, self.model, self.revision = load_model(
+            AutoModelForSequenceClassification, model_name, threads, revision, backend, onnx_dir)
+        self.labels = self.model.config.id2label
+        self.max_length = max_length
+
+    def encode(self, texts):
+        """
+        Tokenizes texts, without padding.
+        Args:
+            texts (list): The texts.
+        Returns:
+            list: The token ids of every text, truncated to `max_length`.
+        """
+        return self.tokenizer(
+            list(texts), truncation=True, max_length=self.max_length)['input_ids']
+
+    def predict(self, input_ids):
+        """
+        Classifies a batch of tokenized texts, padded to the longest one.
+        Args:
+            input_ids (list): The token ids of every text.
+        Returns:
+            tuple: The label and the probability of the label of every text.
+        """
+        batch = self.tokenizer.pad({'input_ids': input_ids}, return_tensors='pt')
+
+        with torch.inference_mode():
+            probabilities = torch.softmax(self.model(batch), dim=-1)
+        scores, classes = probabilities.max(dim=-1)
+
+        return [self.labels[int(label)] for label in classes], scores.tolist()
+
+
+def model_outputs(scorer, texts, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Scores texts in batches of similar length.
+    Args:
+        scorer (FinbertScorer): Tokenizer and classifier.
+        texts (list): The texts.
+        batch_size (int): Texts per forward pass.
+    Yields:
+        dict: The `CacheEntry` of the texts of a batch, by position.
+    """
+    input_ids = scorer.encode(texts)
+
+    for positions in length_batches(input_ids, batch_size):
+        labels, scores = scorer.predict([input_ids[i] for i in positions])
+        yield {
+            i: CacheEntry(label, score, None) for i, label, score in zip(positions, labels, scores)
+        }
+
+
+def sentiment_columns(entries):
+    """
+    Output columns of the sentiment stage.
+    Args:
+        entries (list): The `CacheEntry` of every tweet.
+    Returns:
+        dict: The `sentiment_label` and `sentiment_score` of every tweet.
+    """
+    return {
+        'sentiment_label': [entry.label for entry in entries],
+        'sentiment_score': [entry.score for entry in entries]
+    }
+
+
+def score_sentiment(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        tweets, scorer, writer, cache=None, batch_size=DEFAULT_BATCH_SIZE,
+        flush_rows=DEFAULT_FLUSH_ROWS, text_column='clean_text'):
+    """
+    Scores the sentiment of the tweets not in the output yet and appends
+    them to it, see `scoring_output.score_tweets`.
+    Args:
+        tweets (DataFrame): Tweets with an `id` and a text column.
+        scorer (FinbertScorer): Tokenizer and classifier.
+        writer (ResultWriter): Output of the scored tweets.
+        cache (InferenceCache): Outputs of the model, if any.
+        batch_size (int): Texts per forward pass.
+        flush_rows (int): Scored tweets written at once.
+        text_column (str): Column of the texts.
+    Returns:
+        int: Number of tweets scored.
+    """
+    return score_tweets(
+        tweets, lambda texts: model_outputs(scorer, texts, batch_size), sentiment_columns,
+        writer, cache, flush_rows, text_column)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Score the sentiment of the normalized tweets with FinBERT.')
+    parser.add_argument(
+        'input_path',
+        type=str,
+        help='Normalized tweets: a CSV file, or a Parquet file or dataset folder.')
+    parser.add_argument(
+        'output_path',
+        type=str,
+        help='Output, e.g. tweets_with_sentiment.csv, or a Parquet dataset folder '
+             'if it ends with .parquet.')
+    parser.add_argument(
+        '--model',
+        type=str,
+        default=DEFAULT_MODEL,
+        help='Hugging Face model name or local path.')
+    parser.add_argument(
+        '--batch_size',
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help='Texts per forward pass.')
+    parser.add_argument(
+        '--max_length',
+        type=int,
+        default=DEFAULT_MAX_LENGTH,
+        help='Tokens kept from every text.')
+    add_scoring_arguments(parser)
+    args = parser.parse_args()
+
+    finbert = FinbertScorer(
+        args.model, args.threads, args.max_length, args.revision, args.backend,
+        onnx_models_dir(args))
+    cache_file = inference_cache_file(args)
+
+    tweet_count = score_sentiment(
+        read_table(args.input_path),
+        finbert,
+        ResultWriter(args.output_path, args.overwrite),
+        InferenceCache(cache_file, args.model, finbert.revision) if cache_file else None,
+        args.batch_size,
+        args.flush_rows)
+    print(f'Scored {tweet_count} tweets into {args.output_path}')
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of the Twitter handle to Polititweet figure id lookups made
+by `convert_handles_to_ids`.
+Answers are kept in a JSON file with the time they were checked: found ids
+are trusted for `ttl` seconds and handles Polititweet does not know about
+for `negative_ttl` seconds, after which they are looked up again. Handles
+are matched case-insensitively, as on Twitter.
+"""
+import json
+import os
+import time
+
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_NEGATIVE_TTL = 24 * 3600
+
+
+class HandleCache:
+    """
+    Handle to figure id answers, with positive and negative expiration.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = {}
+
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='UTF-8') as cache_file:
+                self.entries = json.load(cache_file)['handles']
+
+    def get(self, handle, now=None):
+        """
+        Looks a handle up.
+        Args:
+            handle (str): The Twitter handle.
+            now (float): Current time in seconds since the epoch.
+        Returns:
+            tuple: Whether the answer is cached and still fresh, and the
+            figure id (None if the handle is known to be missing).
+        """
+        entry = self.entries.get(handle.casefold())
+        if entry is None:
+            return False, None
+
+        ttl = self.ttl if entry['id'] is not None else self.negative_ttl
+        if (now or time.time()) - entry['checked'] > ttl:
+            return False, None
+
+        return True, entry['id']
+
+    def put(self, handle, figure_id, now=None):
+        """
+        Records the answer for a handle.
+        Args:
+            handle (str): The Twitter handle.
+            figure_id (str): The figure id, or None if the handle is missing.
+            now (float): Current time in seconds since the epoch.
+        """
+        self.entries[handle.casefold()] = {'id': figure_id, 'checked': now or time.time()}
+
+    def save(self):
+        """
+        Saves the cache atomically, so a crash never leaves it half written.
+        """
+        tmp_path = f'{self.path}.tmp'
+
+        with open(tmp_path, 'w', encoding='UTF-8') as cache_file:
+            json.dump({'handles': self.entries}, cache_file, indent=2, sort_keys=True)
+            cache_file.flush()
+            os.fsync(cache_file.fileno())
+
+        os.replace(tmp_path, self.path)
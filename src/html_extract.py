@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Extraction of the card links of Polititweet pages, shared by `read_tweets`
+and `convert_handles_to_ids`.
+Both scrapers only need the anchors of the `div.grid` cards and the
+`pagination-next` link, so instead of building a BeautifulSoup tree of the
+whole page the links are pulled by the fastest backend available:
+* `selectolax` or `lxml`, C parsers, when they are installed;
+* `stream`, a single pass of the standard library `html.parser` that keeps
+  no tree at all;
+* `bs4`, the BeautifulSoup reference implementation.
+"""
+from collections import namedtuple
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+
+TWEET_CARD = 'box tweet-card'
+FIGURE_CARD = 'box figure-card'
+
+PageLinks = namedtuple('PageLinks', ['has_grid', 'cards', 'next_href', 'next_disabled'])
+PageLinks.__doc__ = """
+Links of a Polititweet page: whether it has a card grid, the `(href,
+span_href)` pair of every card of the grid (`span_href` is the first `span`
+with an `href` inside the card, if any), and the `Next` pagination link.
+"""
+
+
+def class_names(value):
+    """
+    Normalizes a class attribute.
+    Args:
+        value (str): The class attribute.
+    Returns:
+        str: The class names separated by single spaces.
+    """
+    return ' '.join((value or '').split())
+
+
+def extract_with_bs4(html, card_class):
+    """
+    Extracts the links of a page with BeautifulSoup.
+    Args:
+        html (str): The page.
+        card_class (str): Class attribute of the cards, e.g. `TWEET_CARD`.
+    Returns:
+        PageLinks: The links of the page.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    cards = []
+    grid = soup.find('div', {'class': 'grid'})
+    if grid:
+        for card in grid.find_all('a', {'class': card_class}):
+            span = card.find('span', href=True)
+            cards.append((card.get('href'), span['href'] if span else None))
+
+    next_link = soup.find('a', {'class': 'pagination-next'}, string='Next')
+
+    return PageLinks(
+        grid is not None, cards,
+        next_link.get('href') if next_link else None,
+        next_link is not None and next_link.has_attr('disabled'))
+
+
+class LinkParser(HTMLParser):
+    """
+    Single-pass parser collecting the card links of the first `div.grid`
+    and the first `Next` pagination link.
+    """
+
+    def __init__(self, card_class):
+        super().__init__(convert_charrefs=True)
+        self.card_class = card_class
+        self.has_grid = False
+        self.cards = []
+        self.next_link = None
+        self._grid_depth = 0
+        self._card = None
+        self._pagination = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in ('div', 'a', 'span'):
+            return
+        attrs = dict(attrs)
+
+        if tag == 'div':
+            if self._grid_depth:
+                self._grid_depth += 1
+            elif not self.has_grid and 'grid' in class_names(attrs.get('class')).split():
+                self.has_grid = True
+                self._grid_depth = 1
+        elif tag == 'a':
+            classes = class_names(attrs.get('class'))
+            if self._grid_depth and classes == self.card_class:
+                self._card = [attrs.get('href'), None]
+            elif self.next_link is None and 'pagination-next' in classes.split():
+                self._pagination = [attrs, []]
+        elif tag == 'span' and self._card and self._card[1] is None and attrs.get('href'):
+            self._card[1] = attrs['href']
+
+    def handle_endtag(self, tag):
+        if tag == 'div' and self._grid_depth:
+            self._grid_depth -= 1
+        elif tag == 'a':
+            if self._card:
+                self.cards.append(tuple(self._card))
+                self._card = None
+            if self._pagination:
+                attrs, text = self._pagination
+                if ''.join(text) == 'Next':
+                    self.next_link = attrs
+                self._pagination = None
+
+    def handle_data(self, data):
+        if self._pagination:
+            self._pagination[1].append(data)
+
+
+def extract_with_stream(html, card_class):
+    """
+    Extracts the links of a page in a single pass of `html.parser`.
+    Args:
+        html (str): The page.
+        card_class (str): Class attribute of the cards, e.g. `TWEET_CARD`.
+    Returns:
+        PageLinks: The links of the page.
+    """
+    parser = LinkParser(card_class)
+    parser.feed(html)
+    parser.close()
+
+    next_link = parser.next_link or {}
+
+    return PageLinks(
+        parser.has_grid, parser.cards, next_link.get('href'), 'disabled' in next_link)
+
+
+def extract_with_lxml(html, card_class):
+    """
+    Extracts the links of a page with lxml.
+    Args:
+        html (str): The page.
+        card_class (str): Class attribute of the cards, e.g. `TWEET_CARD`.
+    Returns:
+        PageLinks: The links of the page.
+    """
+    tree = lxml_html.fromstring(html)
+
+    cards = []
+    grids = tree.xpath('//div[contains(concat(" ", normalize-space(@class), " "), " grid ")]')
+    if grids:
+        for card in grids[0].xpath('.//a[normalize-space(@class) = $card_class]',
+                                   card_class=card_class):
+            spans = card.xpath('.//span[@href]')
+            cards.append((card.get('href'), spans[0].get('href') if spans else None))
+
+    next_links = tree.xpath(
+        '//a[contains(concat(" ", normalize-space(@class), " "), " pagination-next ")]'
+        '[string(.) = "Next"]')
+    next_link = next_links[0] if next_links else None
+
+    return PageLinks(
+        bool(grids), cards,
+        next_link.get('href') if next_link is not None else None,
+        next_link is not None and next_link.get('disabled') is not None)
+
+
+def extract_with_selectolax(html, card_class):
+    """
+    Extracts the links of a page with the Lexbor parser of selectolax.
+    Args:
+        html (str): The page.
+        card_class (str): Class attribute of the cards, e.g. `TWEET_CARD`.
+    Returns:
+        PageLinks: The links of the page.
+    """
+    tree = SelectolaxParser(html)
+
+    cards = []
+    grid = tree.css_first('div.grid')
+    if grid is not None:
+        for card in grid.css('a'):
+            if class_names(card.attributes.get('class')) == card_class:
+                span = card.css_first('span[href]')
+                cards.append((card.attributes.get('href'),
+                              span.attributes.get('href') if span is not None else None))
+
+    next_link = next(
+        (link for link in tree.css('a.pagination-next') if link.text(deep=True) == 'Next'),
+        None)
+
+    return PageLinks(
+        grid is not None, cards,
+        next_link.attributes.get('href') if next_link is not None else None,
+        next_link is not None and 'disabled' in next_link.attributes)
+
+
+BACKENDS = {
+    'selectolax': extract_with_selectolax,
+    'lxml': extract_with_lxml,
+    'stream': extract_with_stream,
+    'bs4': extract_with_bs4
+}
+
+
+def available_backends():
+    """
+    Lists the backends whose parser is installed, fastest first.
+    Returns:
+        list: Names of the backends.
+    """
+    missing = {'selectolax': SelectolaxParser is None, 'lxml': lxml_html is None}
+    return [name for name in BACKENDS if not missing.get(name)]
+
+
+def extract_links(html, card_class, backend=None):
+    """
+    Extracts the card links and the next page link of a Polititweet page.
+    Args:
+        html (str): The page.
+        card_class (str): Class attribute of the cards, e.g. `TWEET_CARD`.
+        backend (str): Name of the backend; the fastest available by default.
+    Returns:
+        PageLinks: The links of the page.
+    """
+    backend = backend or available_backends()[0]
+    if backend not in available_backends():
+        raise ValueError(f'HTML backend {backend} is not available: {available_backends()}.')
+
+    return BACKENDS[backend](html, card_class)
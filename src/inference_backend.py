@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+CPU inference backends of the tweet scoring stages (`finbert_sentiment`,
+`topic_extraction`):
+* `fp32`: the PyTorch model as published;
+* `int8`: the PyTorch model with its linear layers dynamically quantized to
+  int8, smaller and usually much faster on CPU;
+* `onnx`: the model exported once to an ONNX graph, kept in `onnx_dir`, and
+  run by ONNX Runtime.
+The backends may change the scores slightly: the outputs of a backend other
+than `fp32` are cached under their own revision, and
+`validate_inference_backend` measures how much they differ from `fp32`.
+"""
+import os
+import re
+
+try:
+    import torch
+    from transformers import AutoTokenizer
+except ImportError:
+    torch = AutoTokenizer = None
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+INFERENCE_BACKENDS = ('fp32', 'int8', 'onnx')
+ONNX_OPSET = 17
+ONNX_DIR_NAME = '_onnx_models'
+
+
+def backend_revision(commit, backend):
+    """
+    Builds the revision the outputs of a model are cached under.
+    Args:
+        commit (str): Commit of the model.
+        backend (str): One of `INFERENCE_BACKENDS`.
+    Returns:
+        str: The commit, tagged with the backend unless it is `fp32`.
+    """
+    return commit if backend == 'fp32' else f'{commit}+{backend}'
+
+
+def onnx_model_path(onnx_dir, model_name, commit):
+    """
+    Gets the path of the ONNX export of a model.
+    Args:
+        onnx_dir (str): Folder of the exported models.
+        model_name (str): Hugging Face model name or local path.
+        commit (str): Commit of the model.
+    Returns:
+        str: `<onnx_dir>/<model_name>-<commit>.onnx`, with the model name
+        made safe for a file name.
+    """
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name).strip('_')
+    return os.path.join(onnx_dir, f'{safe_name}-{commit[:12] or "local"}.onnx')
+
+
+def export_onnx(model, tokenizer, path, sequence_output=False):
+    """
+    Exports a model to an ONNX graph taking `input_ids` and `attention_mask`
+    and returning the first output of the model.
+    Args:
+        model (PreTrainedModel): The fp32 model.
+        tokenizer (PreTrainedTokenizer): Its tokenizer.
+        path (str): Path to the ONNX file, written atomically.
+        sequence_output (bool): True if the output has a token axis (e.g.
+            `last_hidden_state`), False for per-text outputs (e.g. `logits`).
+    """
+    sample = tokenizer(['An example tweet.', 'Another one.'], padding=True, return_tensors='pt')
+    output_axes = {0: 'batch', 1: 'tokens'} if sequence_output else {0: 'batch'}
+    tmp_path = f'{path}.tmp'
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with torch.inference_mode():
+        torch.onnx.export(
+            model, (sample['input_ids'], sample['attention_mask']), tmp_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['output'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'tokens'},
+                'attention_mask': {0: 'batch', 1: 'tokens'},
+                'output': output_axes
+            },
+            opset_version=ONNX_OPSET)
+    os.replace(tmp_path, path)
+
+
+class ModelRunner:  # pylint: disable=too-few-public-methods
+    """
+    Runs a model on padded batches with an inference backend, returning its
+    first output (e.g. `logits` or `last_hidden_state`) as a tensor.
+    """
+
+    def __init__(self, model, backend='fp32', session=None):
+        self.config = model.config
+        self.backend = backend
+        self.model = None if session else model
+        self.session = session
+
+    def __call__(self, batch):
+        """
+        Runs a batch through the model.
+        Args:
+            batch (dict): `input_ids` and `attention_mask` tensors.
+        Returns:
+            Tensor: The first output of the model.
+        """
+        if self.session:
+            output = self.session.run(None, {
+                'input_ids': batch['input_ids'].numpy(),
+                'attention_mask': batch['attention_mask'].numpy()
+            })[0]
+            return torch.from_numpy(output)
+
+        with torch.inference_mode():
+            return self.model(
+                input_ids=batch['input_ids'], attention_mask=batch['attention_mask'])[0]
+
+
+def load_model(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        model_class, model_name, threads=None, revision=None, backend='fp32', onnx_dir=None,
+        sequence_output=False):
+    """
+    Loads a tokenizer and a model for CPU inference.
+    Args:
+        model_class (type): `AutoModel` class of the model.
+        model_name (str): Hugging Face model name or local path.
+        threads (int): Intra-op threads; the default of the backend if None.
+        revision (str): Model revision; the latest if None.
+        backend (str): One of `INFERENCE_BACKENDS`.
+        onnx_dir (str): Folder of the ONNX exports, for the `onnx` backend.
+        sequence_output (bool): True if the first output of the model has a
+            token axis.
+    Returns:
+        tuple: The tokenizer, the `ModelRunner` and the revision the outputs
+        are cached under (see `backend_revision`).
+    """
+    if torch is None:
+        raise ImportError('The scoring stages need the torch and transformers packages.')
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f'Unknown inference backend {backend}, expected one of '
+                         f'{INFERENCE_BACKENDS}.')
+    if backend == 'onnx' and onnxruntime is None:
+        raise ImportError('The onnx backend needs the onnxruntime package.')
+    if threads:
+        torch.set_num_threads(threads)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, revision=revision)
+    model = model_class.from_pretrained(model_name, revision=revision).eval()
+    commit = getattr(model.config, '_commit_hash', None) or revision or ''
+
+    session = None
+    if backend == 'int8':
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif backend == 'onnx':
+        path = onnx_model_path(onnx_dir or ONNX_DIR_NAME, model_name, commit)
+        if not os.path.isfile(path):
+            export_onnx(model, tokenizer, path, sequence_output)
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        session = onnxruntime.InferenceSession(
+            path, options, providers=['CPUExecutionProvider'])
+
+    return tokenizer, ModelRunner(model, backend, session), backend_revision(commit, backend)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of the model outputs of the tweet scoring stages (e.g.
+`finbert_sentiment`), shared by all of them.
+Outputs are keyed by the model name, the model revision and a 128-bit hash
+of the text with its whitespace normalized, so retweets and other repeated
+texts are only scored once, across runs and stages. Each entry holds a
+label, its score and an optional vector of scores (e.g. one per topic),
+stored as float32 bytes in a single SQLite file.
+"""
+from collections import namedtuple
+import hashlib
+import sqlite3
+import numpy as np
+
+INFERENCE_CACHE_NAME = '_inference_cache.sqlite'
+SQLITE_MAX_PARAMS = 500
+
+CacheEntry = namedtuple('CacheEntry', ['label', 'score', 'vector'])
+CacheEntry.__doc__ = """
+Cached output of a model for a text: a label, its score and an optional
+vector of scores (a float32 array).
+"""
+
+
+def text_hash(text):
+    """
+    Hashes a text for the cache, ignoring differences of whitespace.
+    Args:
+        text (str): The text.
+    Returns:
+        bytes: A 16-byte digest.
+    """
+    return hashlib.blake2b(' '.join(text.split()).encode('UTF-8'), digest_size=16).digest()
+
+
+class InferenceCache:
+    """
+    Model outputs by text hash, for a given model name and revision.
+    """
+
+    def __init__(self, path, model_name, revision):
+        self.model_name = model_name
+        self.revision = revision or ''
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS outputs ('
+            'model TEXT NOT NULL, revision TEXT NOT NULL, text_hash BLOB NOT NULL, '
+            'label TEXT, score REAL, vector BLOB, '
+            'PRIMARY KEY (model, revision, text_hash)) WITHOUT ROWID')
+
+    def get_many(self, hashes):
+        """
+        Looks texts up.
+        Args:
+            hashes (iterable): Hashes of the texts, see `text_hash`.
+        Returns:
+            dict: The `CacheEntry` of every text found, by hash.
+        """
+        hashes = list(dict.fromkeys(hashes))
+        entries = {}
+
+        for start in range(0, len(hashes), SQLITE_MAX_PARAMS):
+            chunk = hashes[start:start + SQLITE_MAX_PARAMS]
+            rows = self.connection.execute(
+                'SELECT text_hash, label, score, vector FROM outputs '
+                'WHERE model = ? AND revision = ? '
+                f'AND text_hash IN ({", ".join("?" * len(chunk))})',
+                [self.model_name, self.revision, *chunk])
+            for key, label, score, vector in rows:
+                entries[key] = CacheEntry(
+                    label, score,
+                    None if vector is None else np.frombuffer(vector, dtype=np.float32))
+
+        return entries
+
+    def put_many(self, entries):
+        """
+        Records the outputs of texts and commits them.
+        Args:
+            entries (dict): The `CacheEntry` of every text, by hash.
+        """
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?)',
+                [(self.model_name, self.revision, key, entry.label, entry.score,
+                  None if entry.vector is None
+                  else np.asarray(entry.vector, dtype=np.float32).tobytes())
+                 for key, entry in entries.items()])
+
+    def close(self):
+        """
+        Closes the cache file.
+        """
+        self.connection.close()
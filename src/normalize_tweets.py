@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Normalizes the merged tweets of `clean.py` (or the flattened records of
+`read_tweets.py --format parquet`) before sentiment and topic scoring.
+This is the `preprocess_tweets` step of `FinBERT.ipynb`, done on whole
+columns instead of row by row:
+* the `user_id` and `handle` are extracted from the stringified `user`
+  payloads in a single RE2 pass over the column, which reads both JSON and
+  Python-repr payloads, instead of `ast.literal_eval` on every row;
+* `timestamp_ms` and `created_at` are converted to UTC timestamps in one
+  vectorized parse per source;
+* tweets saved more than once are dropped by id, and retweets of the same
+  text by the same account by a 64-bit hash of the account and the text,
+  keeping the earliest one.
+"""
+import argparse
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+CREATED_AT_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+RAW_COLUMNS = [
+    'id', 'user', 'user_id', 'user_screen_name', 'text', 'full_text', 'lang',
+    'timestamp_ms', 'created_at', 'retweeted_status_id'
+]
+NORMALIZED_COLUMNS = ['id', 'user_id', 'handle', 'clean_text', 'lang', 'timestamp', 'is_retweet']
+USER_ID_PATTERN = r'''^\s*\{\s*['"]id['"]\s*:\s*(?P<user_id>\d+)'''
+HANDLE_PATTERN = r'''['"]screen_name['"]\s*:\s*['"](?P<handle>\w+)['"]'''
+RETWEET_PREFIX = 'RT @'
+
+
+def read_raw_tweets(input_path):
+    """
+    Reads the columns needed by the normalization, and only them.
+    Args:
+        input_path (str): A CSV file, or a Parquet file or dataset folder.
+    Returns:
+        DataFrame: The raw tweets.
+    """
+    if os.path.isdir(input_path) or input_path.endswith('.parquet'):
+        names = pq.ParquetDataset(input_path).schema.names
+        return pd.read_parquet(
+            input_path, engine='pyarrow',
+            columns=[column for column in RAW_COLUMNS if column in names])
+
+    return pd.read_csv(
+        input_path, low_memory=False, usecols=lambda column: column in RAW_COLUMNS)
+
+
+def extract_field(payloads, pattern, field):
+    """
+    Extracts a field from every payload of a column in a single pass.
+    Args:
+        payloads (Series): Stringified dictionaries.
+        pattern (str): RE2 pattern with a named group for the field.
+        field (str): Name of the group.
+    Returns:
+        Series: The field as a string, NA where it is missing.
+    """
+    values = pa.array(payloads.astype('string'), type=pa.string(), from_pandas=True)
+    extracted = pc.extract_regex(values, pattern)
+    return pd.Series(
+        pc.struct_field(extracted, field).to_pandas(types_mapper=pd.ArrowDtype),
+        index=payloads.index).astype('string')
+
+
+def parse_user_payloads(payloads):
+    """
+    Reads the user id and handle of stringified `user` payloads.
+    Args:
+        payloads (Series): The `user` column, JSON or Python-repr dictionaries.
+    Returns:
+        DataFrame: `user_id` (nullable integer) and `handle`.
+    """
+    return pd.DataFrame({
+        'user_id': pd.to_numeric(extract_field(payloads, USER_ID_PATTERN, 'user_id'))
+                     .astype('Int64'),
+        'handle': extract_field(payloads, HANDLE_PATTERN, 'handle')
+    }, index=payloads.index)
+
+
+def user_fields(raw):
+    """
+    Gets the user id and handle of every tweet, from the flattened columns
+    when present and from the `user` payload otherwise.
+    Args:
+        raw (DataFrame): The raw tweets.
+    Returns:
+        DataFrame: `user_id` (nullable integer) and `handle`.
+    """
+    users = pd.DataFrame({
+        'user_id': pd.Series(pd.NA, index=raw.index, dtype='Int64'),
+        'handle': pd.Series(pd.NA, index=raw.index, dtype='string')
+    })
+
+    if 'user_id' in raw:
+        users['user_id'] = pd.to_numeric(raw['user_id'], errors='coerce').astype('Int64')
+    if 'user_screen_name' in raw:
+        users['handle'] = raw['user_screen_name'].astype('string')
+
+    missing = users['user_id'].isna() | users['handle'].isna()
+    if 'user' in raw and missing.any():
+        parsed = parse_user_payloads(raw.loc[missing, 'user'])
+        users.loc[missing] = users.loc[missing].fillna(parsed)
+
+    return users
+
+
+def normalize_timestamps(raw):
+    """
+    Converts the creation time of every tweet to UTC, from `timestamp_ms`
+    when present and from `created_at` otherwise.
+    Args:
+        raw (DataFrame): The raw tweets.
+    Returns:
+        Series: UTC timestamps, NaT where the time is unknown.
+    """
+    timestamps = pd.Series(pd.NaT, index=raw.index, dtype='datetime64[ns, UTC]')
+
+    if 'timestamp_ms' in raw:
+        milliseconds = pd.to_numeric(raw['timestamp_ms'], errors='coerce')
+        timestamps = pd.to_datetime(milliseconds, unit='ms', utc=True)
+
+    if 'created_at' in raw:
+        missing = timestamps.isna() & raw['created_at'].notna()
+        created_at = raw.loc[missing, 'created_at']
+        if pd.api.types.is_datetime64_any_dtype(created_at):
+            parsed = pd.to_datetime(created_at, utc=True)
+        else:
+            parsed = pd.to_datetime(
+                created_at, format=CREATED_AT_FORMAT, utc=True, errors='coerce')
+            iso = parsed.isna()
+            if iso.any():
+                parsed[iso] = pd.to_datetime(
+                    created_at[iso], format='ISO8601', utc=True, errors='coerce')
+        timestamps[missing] = parsed
+
+    return timestamps.astype('datetime64[ns, UTC]')
+
+
+def clean_texts(raw):
+    """
+    Puts the text of every tweet on a single line.
+    Args:
+        raw (DataFrame): The raw tweets.
+    Returns:
+        Series: The texts, without line breaks nor surrounding spaces.
+    """
+    texts = pd.Series('', index=raw.index, dtype='string')
+    for column in ('text', 'full_text'):
+        if column in raw:
+            texts = raw[column].astype('string').fillna(texts)
+
+    return (texts.fillna('')
+            .str.replace('\n', ' ', regex=False)
+            .str.replace('\r', '', regex=False)
+            .str.strip())
+
+
+def dedupe_tweets(tweets):
+    """
+    Drops the tweets saved more than once and the repeated retweets of the
+    same text by the same account, keeping the earliest one.
+    Args:
+        tweets (DataFrame): Normalized tweets.
+    Returns:
+        DataFrame: The tweets, in their original order.
+    """
+    tweets = tweets.sort_values('timestamp', kind='stable')
+
+    retweets = tweets[tweets['is_retweet']]
+    text_keys = retweets['clean_text'].str.casefold().str.split().str.join(' ')
+    retweet_hashes = pd.util.hash_pandas_object(
+        pd.DataFrame({'user_id': retweets['user_id'], 'text': text_keys}), index=False)
+
+    duplicated = tweets['id'].duplicated()
+    duplicated[retweets.index] |= retweet_hashes.duplicated()
+
+    return tweets[~duplicated].sort_index()
+
+
+def normalize_tweets(raw):
+    """
+    Normalizes raw tweets for scoring.
+    Args:
+        raw (DataFrame): The raw tweets, as read by `read_raw_tweets`.
+    Returns:
+        DataFrame: The `NORMALIZED_COLUMNS` of the tweets with a known time,
+        deduplicated.
+    """
+    raw = raw.reset_index(drop=True)
+    tweets = user_fields(raw)
+    tweets.insert(0, 'id', pd.to_numeric(raw['id'], errors='coerce').astype('Int64'))
+    tweets['clean_text'] = clean_texts(raw)
+    tweets['lang'] = raw['lang'].astype('string') if 'lang' in raw else pd.NA
+    tweets['timestamp'] = normalize_timestamps(raw)
+
+    is_retweet = tweets['clean_text'].str.startswith(RETWEET_PREFIX)
+    if 'retweeted_status_id' in raw:
+        is_retweet |= raw['retweeted_status_id'].notna()
+    tweets['is_retweet'] = is_retweet.astype(bool)
+
+    tweets = tweets.dropna(subset=['id', 'timestamp'])
+
+    return dedupe_tweets(tweets)[NORMALIZED_COLUMNS].reset_index(drop=True)
+
+
+def write_tweets(tweets, output_path):
+    """
+    Saves normalized tweets as CSV, or as Parquet if the path ends with
+    `.parquet`.
+    Args:
+        tweets (DataFrame): Normalized tweets.
+        output_path (str): Output file.
+    """
+    if output_path.endswith('.parquet'):
+        tweets.to_parquet(output_path, engine='pyarrow', index=False)
+    else:
+        tweets.to_csv(output_path, index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Normalize the merged tweets before sentiment and topic scoring.')
+    parser.add_argument(
+        'input_path',
+        type=str,
+        help='Merged tweets: a CSV file, or a Parquet file or dataset folder.')
+    parser.add_argument(
+        'output_file',
+        type=str,
+        help='Output file, Parquet if it ends with .parquet and CSV otherwise.')
+    args = parser.parse_args()
+
+    write_tweets(normalize_tweets(read_raw_tweets(args.input_path)), args.output_file)
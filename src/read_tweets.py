@@ -3,51 +3,72 @@
 """
 This script scrapes tweets from the Polititweet website.
 It extracts tweets from a specific Twitter account and saves them to CSV files.
-The script uses BeautifulSoup for HTML parsing and requests for HTTP requests.
+The script extracts the card links with `html_extract` and uses requests for HTTP requests.
 It is designed to be run from the command line with the following arguments:
 1. account_id_file: Path to the CSV file containing Twitter account IDs.
 2. output_folder: Path to the folder where the output CSV files will be saved.
 3. max_pages (optional): The maximum number of pages to scrape for each account.
+
+The crawl is incremental (see `crawl_state`): each page's new tweets are
+appended to the account's CSV file, a refresh stops at the first tweet already
+saved, and an interrupted crawl (or one cut by `max_pages`) resumes from the
+page where it stopped. `--format ndjson` or `--format parquet` saves the
+tweets as flattened, typed records instead of CSV (see `tweet_sink`).
+
+With `--concurrency N`, accounts are scraped by an asyncio engine (see
+`async_http`): tweet JSON fetches of a page run concurrently while the next
+page is requested, under a global rate limit (`--rate` requests per second)
+and a limit of requests in flight per host (`--per_host`).
 """
 import argparse
+import asyncio
 import csv
 import time
-from bs4 import BeautifulSoup
-import pandas as pd
 import requests
+from async_http import DEFAULT_CONCURRENCY, DEFAULT_PER_HOST, DEFAULT_RATE, AsyncHttpClient
+from crawl_state import (
+    account_state, check_format, close_crawl, commit_page, load_crawl_state, start_cursor)
+from html_extract import TWEET_CARD, extract_links
+from tweet_sink import SINK_FORMATS, open_sink
 
 SLEEP_TIMEOUT_SECONDS = .1
 BASE_URL = 'https://polititweet.org'
 
 
-def extract_tweet_data(soup):
+def card_hrefs(links):
     """
-    Extracts tweet data from the soup object.
+    Gets the links of the tweet cards of a page.
     Args:
-        soup (BeautifulSoup): The BeautifulSoup object containing the HTML of the page.
+        links (PageLinks): The links of the page, as returned by `extract_links`.
     Returns:
-        list: A list of dictionaries containing tweet data.
+        list: The href of every tweet card, or None if there are none.
     """
-    # 1. Find main tweets grid
-    tweets_grid = soup.find('div', {'class': 'grid'})
-
-    if not tweets_grid:
+    if not links.has_grid:
         print('Could not find the tweets grid on page.')
         return None
 
-    # 2. Extract tweets from the anchor tags, which are the tweet cards.
-    tweet_cards = tweets_grid.find_all('a', {'class': 'box tweet-card'})
-    if not tweet_cards:
+    if not links.cards:
         print('Could not find the tweet cards on the grid.')
         return None
 
+    return [href for href, _ in links.cards]
+
+
+def fetch_tweet_data(hrefs):
+    """
+    Fetches the data of the tweets of a page.
+    Args:
+        hrefs (list): The links of the tweet cards.
+    Returns:
+        list: A list of dictionaries containing tweet data.
+    """
     all_tweets = []
 
-    for element in tweet_cards:
+    for href in hrefs:
         tweet_data = {}
 
         tweet = requests.get(
-            f'{BASE_URL}{element.get("href")}&raw=True',
+            f'{BASE_URL}{href}&raw=True',
             timeout=10)
         if tweet.status_code != 200:
             print(f'Failed to retrieve tweet: status {tweet.status_code}')
@@ -59,13 +80,29 @@ def extract_tweet_data(soup):
     return all_tweets
 
 
+def extract_tweet_data(soup):
+    """
+    Extracts tweet data from the soup object.
+    Args:
+        soup (BeautifulSoup): The BeautifulSoup object (or the HTML) of the page.
+    Returns:
+        list: A list of dictionaries containing tweet data.
+    """
+    hrefs = card_hrefs(extract_links(str(soup), TWEET_CARD))
+    if hrefs is None:
+        return None
+
+    return fetch_tweet_data(hrefs)
+
+
 def scrape_page(url):
     """
     Scrapes a single page of tweets from the given URL.
     Args:
         url (str): The URL of the page to scrape.
     Returns:
-        list: A list of dictionaries containing tweet data.
+        list: A list of dictionaries containing tweet data, or None if the
+        page could not be retrieved.
         str: The URL for the next page, if available.
     """
     response = requests.get(url, timeout=10)
@@ -74,13 +111,10 @@ def scrape_page(url):
         print(f'Failed to retrieve {url}: status {response.status_code}')
         return None, None
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+    links = extract_links(response.text, TWEET_CARD)
+    hrefs = card_hrefs(links)
 
-    page_tweets = extract_tweet_data(soup)
-
-    next_link = soup.find('a', {'class': 'pagination-next'}, string='Next')
-
-    return page_tweets, next_link.get('href') if next_link else None
+    return fetch_tweet_data(hrefs) if hrefs else [], links.next_href
 
 
 def scrape_polititweet(account_id, max_pages=None):
@@ -117,26 +151,211 @@ def scrape_polititweet(account_id, max_pages=None):
     return all_tweets
 
 
-def scrape_all_tweets(account_id_file, output_folder, max_pages=None):
+def crawl_account(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        account_id, output_folder, state, max_pages=None, sink_format='csv'):
+    """
+    Crawls the tweets of an account not saved yet into its output file, one
+    page at a time, from the cursor of an interrupted crawl if there is one.
+    Args:
+        account_id (str): The Twitter account ID to scrape.
+        output_folder (str): Path to the folder where the output files will be saved.
+        state (dict): The crawl state of the output folder.
+        max_pages (int): The maximum number of pages to scrape.
+        sink_format (str): Output format, one of `tweet_sink.SINK_FORMATS`.
+    """
+    pages = 0
+    entry = account_state(state, account_id)
+    next_url = start_cursor(entry, account_id)
+    sink = open_sink(sink_format, output_folder, account_id, entry['size'])
+
+    while next_url:
+        print(f'Scraping page {next_url}...')
+        try:
+            page_tweets, next_url = scrape_page(f'{BASE_URL}/tweets{next_url}')
+        except requests.exceptions.RequestException as e:
+            print(f'Error scraping page: {e}')
+            break
+
+        if page_tweets is None:
+            break
+
+        if not commit_page(output_folder, state, account_id, page_tweets, next_url, sink):
+            break
+
+        # Delay to be kind to the server
+        time.sleep(SLEEP_TIMEOUT_SECONDS)
+
+        pages += 1
+        if max_pages and pages >= max_pages:
+            break
+
+    close_crawl(output_folder, state, account_id, sink)
+
+
+def scrape_all_tweets(account_id_file, output_folder, max_pages=None, sink_format='csv'):
     """"
     Scrapes tweets from multiple accounts listed in a CSV file.
+    Args:
+        account_id_file (str): Path to the CSV file containing Twitter account IDs.
+        output_folder (str): Path to the folder where the output files will be saved.
+        max_pages (int): The maximum number of pages to scrape for each account.
+        sink_format (str): Output format, one of `tweet_sink.SINK_FORMATS`.
+    """
+    with open(account_id_file, 'r', encoding='UTF-8') as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader)  # Skip header
+
+        account_ids = [row[0] for row in reader]
+
+    state = load_crawl_state(output_folder)
+    check_format(state, sink_format)
+
+    for account_id in account_ids:
+        crawl_account(
+            account_id, output_folder, state, max_pages=max_pages, sink_format=sink_format)
+
+        # Delay to be kind to the server
+        time.sleep(SLEEP_TIMEOUT_SECONDS)
+
+
+async def fetch_tweet(client, href):
+    """
+    Fetches the raw JSON of a single tweet.
+    Args:
+        client (AsyncHttpClient): The pooled HTTP client.
+        href (str): The link of the tweet card.
+    Returns:
+        dict: The tweet data, or None if it could not be retrieved.
+    """
+    try:
+        tweet = await client.get(f'{BASE_URL}{href}&raw=True')
+    except requests.exceptions.RequestException as e:
+        print(f'Failed to retrieve tweet: {e}')
+        return None
+
+    if tweet.status_code != 200:
+        print(f'Failed to retrieve tweet: status {tweet.status_code}')
+        return None
+
+    return tweet.json()
+
+
+async def scrape_page_async(client, url):
+    """
+    Scrapes a single page of tweets and starts fetching its tweets.
+    Args:
+        client (AsyncHttpClient): The pooled HTTP client.
+        url (str): The URL of the page to scrape.
+    Returns:
+        list: Tasks fetching the tweets of the page, in page order, or None
+        if the page could not be retrieved.
+        str: The URL for the next page, if available.
+    """
+    response = await client.get(url)
+
+    if response.status_code != 200:
+        print(f'Failed to retrieve {url}: status {response.status_code}')
+        return None, None
+
+    links = extract_links(response.text, TWEET_CARD)
+    fetches = [
+        asyncio.ensure_future(fetch_tweet(client, href))
+        for href in card_hrefs(links) or []
+    ]
+
+    return fetches, links.next_href
+
+
+def discard_page(page):
+    """
+    Cancels a page requested ahead of time that is no longer needed, along
+    with the tweet fetches it already started.
+    Args:
+        page (Task): The task scraping the page.
+    """
+    if not page.done():
+        page.cancel()
+    elif not page.cancelled() and page.exception() is None:
+        for fetch in page.result()[0] or []:
+            fetch.cancel()
+
+
+async def crawl_account_async(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        client, account_id, output_folder, state, max_pages=None, sink_format='csv'):
+    """
+    Crawls the tweets of an account not saved yet into its output file, like
+    `crawl_account`, requesting the next page while the tweets of the current
+    one are being fetched.
+    Args:
+        client (AsyncHttpClient): The pooled HTTP client.
+        account_id (str): The Twitter account ID to scrape.
+        output_folder (str): Path to the folder where the output files will be saved.
+        state (dict): The crawl state of the output folder.
+        max_pages (int): The maximum number of pages to scrape.
+        sink_format (str): Output format, one of `tweet_sink.SINK_FORMATS`.
+    """
+    pages = 0
+    entry = account_state(state, account_id)
+    next_url = start_cursor(entry, account_id)
+    sink = open_sink(sink_format, output_folder, account_id, entry['size'])
+    print(f'Scraping page {next_url}...')
+    page = asyncio.ensure_future(scrape_page_async(client, f'{BASE_URL}/tweets{next_url}'))
+
+    while page:
+        try:
+            fetches, next_url = await page
+        except requests.exceptions.RequestException as e:
+            print(f'Error scraping page: {e}')
+            break
+
+        if fetches is None:
+            break
+
+        pages += 1
+        page = None
+        if next_url and not (max_pages and pages >= max_pages):
+            print(f'Scraping page {next_url}...')
+            page = asyncio.ensure_future(
+                scrape_page_async(client, f'{BASE_URL}/tweets{next_url}'))
+
+        page_tweets = [tweet for tweet in await asyncio.gather(*fetches) if tweet is not None]
+
+        if not commit_page(output_folder, state, account_id, page_tweets, next_url, sink):
+            break
+
+    if page:
+        discard_page(page)
+
+    close_crawl(output_folder, state, account_id, sink)
+
+
+async def scrape_all_tweets_async(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        account_id_file, output_folder, max_pages=None, concurrency=DEFAULT_CONCURRENCY,
+        per_host=DEFAULT_PER_HOST, rate=DEFAULT_RATE, sink_format='csv'):
+    """"
+    Scrapes tweets from multiple accounts listed in a CSV file with the
+    asyncio engine.
     Args:
         account_id_file (str): Path to the CSV file containing Twitter account IDs.
         output_folder (str): Path to the folder where the output CSV files will be saved.
         max_pages (int): The maximum number of pages to scrape for each account.
+        concurrency (int): Maximum number of requests in flight.
+        per_host (int): Maximum number of requests in flight per host.
+        rate (float): Maximum number of requests per second.
+        sink_format (str): Output format, one of `tweet_sink.SINK_FORMATS`.
     """
     with open(account_id_file, 'r', encoding='UTF-8') as csv_file:
         reader = csv.reader(csv_file)
         next(reader)  # Skip header
+        account_ids = [row[0] for row in reader]
 
-        for account_ids in reader:
-            account_id = account_ids[0]
-            tweets = scrape_polititweet(account_id, max_pages=max_pages)
-            df = pd.DataFrame(tweets)
-            df.to_csv(f'{output_folder}/{account_id}.csv', index=False)
+    state = load_crawl_state(output_folder)
+    check_format(state, sink_format)
 
-            # Delay to be kind to the server
-            time.sleep(SLEEP_TIMEOUT_SECONDS)
+    async with AsyncHttpClient(concurrency, per_host, rate) as client:
+        for account_id in account_ids:
+            await crawl_account_async(
+                client, account_id, output_folder, state, max_pages, sink_format)
 
 
 if __name__ == '__main__':
@@ -155,9 +374,40 @@ if __name__ == '__main__':
         type=int,
         help='The total amount of pages to scrape, if not all.',
         default=None)
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        help='Scrape with the asyncio engine, with this many requests in flight.',
+        default=None)
+    parser.add_argument(
+        '--per_host',
+        type=int,
+        help='Maximum number of requests in flight per host with --concurrency.',
+        default=DEFAULT_PER_HOST)
+    parser.add_argument(
+        '--rate',
+        type=float,
+        help='Maximum number of requests per second of the asyncio engine.',
+        default=DEFAULT_RATE)
+    parser.add_argument(
+        '--format',
+        choices=SINK_FORMATS,
+        help='Output format of the tweets.',
+        default='csv')
     args = parser.parse_args()
 
-    scrape_all_tweets(
-        args.account_id_file,
-        args.output_folder,
-        max_pages=args.max_pages)
+    if args.concurrency:
+        asyncio.run(scrape_all_tweets_async(
+            args.account_id_file,
+            args.output_folder,
+            max_pages=args.max_pages,
+            concurrency=args.concurrency,
+            per_host=args.per_host,
+            rate=args.rate,
+            sink_format=args.format))
+    else:
+        scrape_all_tweets(
+            args.account_id_file,
+            args.output_folder,
+            max_pages=args.max_pages,
+            sink_format=args.format)
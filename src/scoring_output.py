@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Shared driver and incremental, resumable output of the tweet scoring stages
+(`finbert_sentiment`, `topic_extraction`).
+Tweets are grouped by text: every distinct text is run through the model
+once, in batches of similar token length, unless its output is already in
+the inference cache (see `inference_cache`). Scored tweets are appended as
+they come, to a CSV file or, for paths ending with `.parquet`, to a Parquet
+dataset folder with one file per write. After every write the committed
+mark of the output (bytes of the CSV file, or number of Parquet files) is
+saved next to it in `<output>.checkpoint.json`; a new run drops anything
+written past the mark and skips the tweets whose id is already in the
+output. An output without a checkpoint (e.g. written by the notebooks) is
+only replaced with `--overwrite`.
+"""
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from inference_backend import INFERENCE_BACKENDS, ONNX_DIR_NAME
+from inference_cache import INFERENCE_CACHE_NAME, text_hash
+from tweet_sink import part_number, truncate_file, uncommitted_parts
+
+CHECKPOINT_SUFFIX = '.checkpoint.json'
+DEFAULT_FLUSH_ROWS = 4096
+
+
+def read_table(input_path, columns=None):
+    """
+    Reads a CSV file, or a Parquet file or dataset folder.
+    Args:
+        input_path (str): Path to the table.
+        columns (list): Columns to read, all of them by default.
+    Returns:
+        DataFrame: The table.
+    """
+    if os.path.isdir(input_path) or input_path.endswith('.parquet'):
+        return pd.read_parquet(input_path, engine='pyarrow', columns=columns)
+
+    return pd.read_csv(input_path, low_memory=False, usecols=columns)
+
+
+class ResultWriter:
+    """
+    Appends scored tweets to a CSV file or a Parquet dataset folder and
+    checkpoints the committed mark of the output after every write. An
+    existing output without a checkpoint is refused unless `overwrite` is
+    set, as it cannot be resumed.
+    """
+
+    def __init__(self, output_path, overwrite=False):
+        self.output_path = output_path
+        self.checkpoint_path = f'{output_path}{CHECKPOINT_SUFFIX}'
+        self.parquet = output_path.endswith('.parquet')
+        self.committed = 0
+
+        if os.path.isfile(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r', encoding='UTF-8') as checkpoint_file:
+                self.committed = json.load(checkpoint_file)['committed']
+        elif not overwrite and self.has_output():
+            raise FileExistsError(
+                f'{output_path} exists without a {CHECKPOINT_SUFFIX} checkpoint; '
+                'use --overwrite to replace it.')
+
+        if self.parquet:
+            os.makedirs(output_path, exist_ok=True)
+            for path in uncommitted_parts(output_path, self.committed):
+                os.remove(path)
+        else:
+            truncate_file(output_path, self.committed)
+
+    def has_output(self):
+        """
+        Checks whether the output already holds data.
+        Returns:
+            bool: True for a non-empty CSV file or a folder with part files.
+        """
+        if self.parquet:
+            return os.path.isdir(self.output_path) and any(
+                name.endswith('.parquet') and part_number(name) is not None
+                for name in os.listdir(self.output_path))
+
+        return os.path.isfile(self.output_path) and os.path.getsize(self.output_path) > 0
+
+    def scored_ids(self):
+        """
+        Lists the tweets already in the output.
+        Returns:
+            Index: Ids of the scored tweets.
+        """
+        if not self.committed:
+            return pd.Index([])
+
+        return pd.Index(read_table(self.output_path, columns=['id'])['id'])
+
+    def write(self, results):
+        """
+        Appends scored tweets to the output and checkpoints it.
+        Args:
+            results (DataFrame): The scored tweets.
+        Returns:
+            int: Committed mark of the output.
+        """
+        if results.empty:
+            return self.committed
+
+        if self.parquet:
+            path = os.path.join(self.output_path, f'part-{self.committed:05d}.parquet')
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'wb') as output_file:
+                pq.write_table(pa.Table.from_pandas(results, preserve_index=False), output_file)
+                output_file.flush()
+                os.fsync(output_file.fileno())
+            os.replace(tmp_path, path)
+            self.committed += 1
+        else:
+            with open(self.output_path, 'a', encoding='UTF-8', newline='') as csv_file:
+                results.to_csv(csv_file, header=not self.committed, index=False)
+                csv_file.flush()
+                os.fsync(csv_file.fileno())
+                self.committed = csv_file.tell()
+
+        self.save_checkpoint()
+        return self.committed
+
+    def save_checkpoint(self):
+        """
+        Saves the committed mark atomically, so a crash never leaves it half
+        written.
+        """
+        tmp_path = f'{self.checkpoint_path}.tmp'
+
+        with open(tmp_path, 'w', encoding='UTF-8') as checkpoint_file:
+            json.dump({'committed': self.committed}, checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+
+        os.replace(tmp_path, self.checkpoint_path)
+
+
+def length_batches(input_ids, batch_size):
+    """
+    Groups tokenized texts of similar length, so batches need little padding.
+    Args:
+        input_ids (list): The token ids of every text.
+        batch_size (int): Texts per batch.
+    Returns:
+        list: Positions of the texts of every batch, shortest texts first.
+    """
+    order = np.argsort([len(ids) for ids in input_ids], kind='stable')
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def save_scores(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        tweets, writer, rows, entries, result_columns, cache=None):
+    """
+    Appends the tweets of scored texts to the output, after recording the
+    outputs in the cache.
+    Args:
+        tweets (DataFrame): The tweets being scored.
+        writer (ResultWriter): Output of the scored tweets.
+        rows (dict): Positions of the tweets of every text, by text hash.
+        entries (dict): The `CacheEntry` of the scored texts, by text hash.
+        result_columns (callable): Maps a list of `CacheEntry` to the output
+            columns, as a dict of lists.
+        cache (InferenceCache): Cache to record the outputs in, if any.
+    """
+    if cache:
+        cache.put_many(entries)
+
+    positions, row_entries = [], []
+    for key, entry in entries.items():
+        positions.extend(rows[key])
+        row_entries.extend([entry] * len(rows[key]))
+
+    writer.write(tweets.iloc[positions].assign(**result_columns(row_entries)))
+
+
+def score_tweets(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+        tweets, score_texts, result_columns, writer, cache=None,
+        flush_rows=DEFAULT_FLUSH_ROWS, text_column='clean_text'):
+    """
+    Scores the tweets not in the output yet and appends them to it. Each
+    distinct text is scored once, and not at all if it is in the cache.
+    Args:
+        tweets (DataFrame): Tweets with an `id` and a text column.
+        score_texts (callable): Scores a list of texts, yielding the
+            `CacheEntry` of the texts of every batch by position.
+        result_columns (callable): Maps a list of `CacheEntry` to the output
+            columns, as a dict of lists.
+        writer (ResultWriter): Output of the scored tweets.
+        cache (InferenceCache): Outputs of the model, if any; updated with
+            every batch written.
+        flush_rows (int): Scored tweets written at once.
+        text_column (str): Column of the texts.
+    Returns:
+        int: Number of tweets scored.
+    """
+    tweets = tweets[~tweets['id'].isin(writer.scored_ids())].reset_index(drop=True)
+    texts = tweets[text_column].fillna('').astype(str).tolist()
+
+    rows = {}
+    for position, text in enumerate(texts):
+        rows.setdefault(text_hash(text), []).append(position)
+
+    cached = cache.get_many(rows) if cache else {}
+    save_scores(tweets, writer, rows, cached, result_columns)
+
+    missing = [key for key in rows if key not in cached]
+    print(f'{len(tweets)} tweets to score: {len(rows)} distinct texts, '
+          f'{len(cached)} cached, {len(missing)} to run through the model.')
+
+    start = time.perf_counter()
+    scored, pending_rows = {}, 0
+    for outputs in score_texts([texts[rows[key][0]] for key in missing]):
+        for i, entry in outputs.items():
+            scored[missing[i]] = entry
+            pending_rows += len(rows[missing[i]])
+
+        if pending_rows >= flush_rows:
+            save_scores(tweets, writer, rows, scored, result_columns, cache)
+            scored, pending_rows = {}, 0
+
+    save_scores(tweets, writer, rows, scored, result_columns, cache)
+
+    elapsed = time.perf_counter() - start
+    if missing:
+        print(f'Scored {len(missing)} texts in {elapsed:.1f} s '
+              f'({len(missing) / max(elapsed, 1e-9):.1f} tweets/sec).')
+
+    return len(tweets)
+
+
+def add_model_arguments(parser):
+    """
+    Adds the command line options of the model of a stage: its revision and
+    inference backend.
+    Args:
+        parser (ArgumentParser): Parser of the stage, with an `output_path`.
+    """
+    parser.add_argument(
+        '--revision',
+        type=str,
+        help='Model revision (branch, tag or commit); the latest by default.')
+    parser.add_argument(
+        '--threads',
+        type=int,
+        help='Intra-op threads of torch; its default when omitted.')
+    parser.add_argument(
+        '--backend',
+        type=str,
+        choices=INFERENCE_BACKENDS,
+        default='fp32',
+        help='Inference backend: fp32 PyTorch, dynamically quantized int8 PyTorch, '
+             'or an ONNX Runtime export.')
+    parser.add_argument(
+        '--onnx_dir',
+        type=str,
+        help=f'Folder of the ONNX exports of the models; {ONNX_DIR_NAME} next to the output '
+             'by default.')
+
+
+def add_scoring_arguments(parser):
+    """
+    Adds the command line options shared by the scoring stages.
+    Args:
+        parser (ArgumentParser): Parser of the stage, with an `output_path`.
+    """
+    add_model_arguments(parser)
+    parser.add_argument(
+        '--flush_rows',
+        type=int,
+        default=DEFAULT_FLUSH_ROWS,
+        help='Scored tweets written and checkpointed at once.')
+    parser.add_argument(
+        '--cache_file',
+        type=str,
+        help=f'Inference cache; {INFERENCE_CACHE_NAME} next to the output by default.')
+    parser.add_argument(
+        '--no_cache',
+        action='store_true',
+        help='Score every text with the model, without the inference cache.')
+    parser.add_argument(
+        '--overwrite',
+        action='store_true',
+        help='Replace an existing output that has no checkpoint to resume from.')
+
+
+def inference_cache_file(args):
+    """
+    Gets the inference cache of a scoring stage from its options.
+    Args:
+        args (Namespace): Options parsed with `add_scoring_arguments`.
+    Returns:
+        str: Path to the cache, or None if it is disabled.
+    """
+    if args.no_cache:
+        return None
+
+    return args.cache_file or os.path.join(os.path.dirname(args.output_path), INFERENCE_CACHE_NAME)
+
+
+def onnx_models_dir(args):
+    """
+    Gets the folder of the ONNX exports of a scoring stage from its options.
+    Args:
+        args (Namespace): Options parsed with `add_scoring_arguments`.
+    Returns:
+        str: Path to the folder.
+    """
+    return args.onnx_dir or os.path.join(os.path.dirname(args.output_path), ONNX_DIR_NAME)
@@ -3,22 +3,194 @@
 """
 Splits large CSV files into smaller chunks based on a maximum file size.
 This is useful for processing large datasets in manageable sizes.
+Files are split on their raw bytes, without parsing them: each chunk gets the
+header of the file followed by as many whole records as fit under the
+maximum size, copied as they are. Records end at a newline outside of a
+quoted field, so quoted newlines stay inside their record.
 """
 import argparse
+import mmap
 import os
-import pandas as pd
 
 
-DEFAULT_MAX_FILE_SIZE = 45 * 1024 * 1024  # 95 MB
+DEFAULT_MAX_FILE_SIZE = 45 * 1024 * 1024  # 45 MB
+COPY_BLOCK_SIZE = 1024 * 1024
 
 
-def estimate_bytes_per_row(sample_df):
+def last_record_end(data, start, end):
     """
-    Estimate the number of bytes per row in a DataFrame by sampling.
-    This is useful for determining how to split large CSV files into smaller chunks.
+    Finds the end of the last whole record of a byte range: the last newline
+    preceded by an even number of quotes since the start of the range.
+    Args:
+        data (mmap): The file contents.
+        start (int): Offset where a record starts.
+        end (int): Offset the records must end by.
+    Returns:
+        int: Offset after the newline ending the last record that fits, or
+        None if the first record is longer than the range.
     """
-    csv_sample = sample_df.to_csv(index=False).encode('utf-8')
-    return len(csv_sample) / len(sample_df)
+    block = data[start:end]
+    newline = block.rfind(b'\n')
+    quotes = block.count(b'"', 0, max(newline, 0))
+
+    while newline != -1 and quotes % 2:
+        previous = block.rfind(b'\n', 0, newline)
+        quotes -= block.count(b'"', previous + 1, newline)
+        newline = previous
+
+    return None if newline == -1 else start + newline + 1
+
+
+def first_record_end(data, start):
+    """
+    Finds the end of the record starting at an offset.
+    Args:
+        data (mmap): The file contents.
+        start (int): Offset where the record starts.
+    Returns:
+        int: Offset after the newline ending the record, or the end of the
+        file for an unterminated last record.
+    """
+    position, quoted = start, False
+
+    while True:
+        quote = data.find(b'"', position)
+        if not quoted:
+            newline = data.find(b'\n', position, len(data) if quote == -1 else quote)
+            if newline != -1:
+                return newline + 1
+        if quote == -1:
+            return len(data)
+        quoted = not quoted
+        position = quote + 1
+
+
+def plan_chunks(data, max_file_size):
+    """
+    Cuts the records of a CSV file into chunks that fill the maximum size.
+    Args:
+        data (mmap): The file contents.
+        max_file_size (int): Maximum chunk size in bytes, header included.
+    Returns:
+        tuple: The header as bytes, and the `(start, end)` byte range of the
+        records of every chunk. A record longer than the maximum size gets a
+        chunk of its own.
+    """
+    header_end = first_record_end(data, 0)
+    header = data[:header_end]
+    if not header.endswith(b'\n'):
+        header += b'\n'
+
+    capacity = max_file_size - len(header)
+    chunks = []
+    start = header_end
+
+    while start < len(data):
+        end = len(data) if start + capacity >= len(data) else None
+        if end is None and capacity > 0:
+            end = last_record_end(data, start, start + capacity)
+        if end is None:
+            end = first_record_end(data, start)
+        chunks.append((start, end))
+        start = end
+
+    return header, chunks
+
+
+def copy_range(source, target, offset, count):
+    """
+    Copies a byte range between files, in the kernel when it is supported.
+    Args:
+        source (file): File opened for binary reading.
+        target (file): File opened for binary writing, at its end.
+        offset (int): Offset of the range in the source file.
+        count (int): Bytes to copy.
+    """
+    target.flush()
+    while count > 0:
+        try:
+            copied = os.copy_file_range(
+                source.fileno(), target.fileno(), count, offset, target.tell())
+        except (AttributeError, OSError):
+            break
+        if not copied:
+            break
+        target.seek(copied, os.SEEK_CUR)
+        offset += copied
+        count -= copied
+
+    source.seek(offset)
+    while count > 0:
+        block = source.read(min(count, COPY_BLOCK_SIZE))
+        if not block:
+            raise EOFError(f'{source.name} ended before the end of the copied range.')
+        target.write(block)
+        count -= len(block)
+
+
+def new_chunk_paths(full_path, count):
+    """
+    Names the chunks of a file after those of an earlier split of it (e.g.
+    before an incremental crawl appended to it again), so they are kept.
+    Args:
+        full_path (str): Path to the CSV file.
+        count (int): Number of chunks.
+    Returns:
+        list: `<name>__<i>.csv` paths, numbered from one past the largest
+        existing chunk, or from 0 if there is none.
+    """
+    base_path = full_path[:-len('.csv')]
+    folder, name = os.path.split(base_path)
+    prefix = f'{name}__'
+    indexes = [
+        int(filename[len(prefix):-len('.csv')]) for filename in os.listdir(folder or '.')
+        if filename.startswith(prefix) and filename.endswith('.csv')
+        and filename[len(prefix):-len('.csv')].isdigit()
+    ]
+    first_index = max(indexes, default=-1) + 1
+
+    return [f'{base_path}__{i}.csv' for i in range(first_index, first_index + count)]
+
+
+def split_file(full_path, max_file_size=DEFAULT_MAX_FILE_SIZE):
+    """
+    Splits a CSV file into `<name>__<i>.csv` chunks next to it and removes it
+    once every chunk is durable on disk. Chunks are numbered after those of
+    an earlier split of the same file.
+    Args:
+        full_path (str): Path to the CSV file.
+        max_file_size (int): Maximum chunk size in bytes.
+    Returns:
+        list: Paths to the chunks.
+    """
+    with open(full_path, 'rb') as source:
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            header, chunks = plan_chunks(data, max_file_size)
+
+        chunk_paths = new_chunk_paths(full_path, len(chunks))
+        for chunk_path, (start, end) in zip(chunk_paths, chunks):
+            tmp_path = f'{chunk_path}.tmp'
+
+            with open(tmp_path, 'wb') as target:
+                target.write(header)
+                copy_range(source, target, start, end - start)
+                target.flush()
+                os.fsync(target.fileno())
+
+            os.replace(tmp_path, chunk_path)
+            print(f'  ➤ Wrote: {os.path.basename(chunk_path)} '
+                  f'({len(header) + end - start} bytes)')
+
+    folder_fd = os.open(os.path.dirname(full_path) or '.', os.O_RDONLY)
+    try:
+        os.fsync(folder_fd)
+    finally:
+        os.close(folder_fd)
+
+    os.remove(full_path)
+    print(f'  ⛔ Removed original: {os.path.basename(full_path)}')
+
+    return chunk_paths
 
 
 def split_large_files(input_folder, max_file_size=DEFAULT_MAX_FILE_SIZE):
@@ -40,22 +212,7 @@ def split_large_files(input_folder, max_file_size=DEFAULT_MAX_FILE_SIZE):
             continue
 
         print(f'Splitting {filename} (size: {file_size} bytes)...')
-
-        sample_df = pd.read_csv(full_path, nrows=100)
-        bytes_per_row = estimate_bytes_per_row(sample_df)
-        chunk_size = int(max_file_size / bytes_per_row)
-
-        reader = pd.read_csv(full_path, chunksize=chunk_size)
-        base_name = filename[:-4]
-
-        for i, chunk in enumerate(reader):
-            chunk_filename = f'{base_name}__{i}.csv'
-            chunk_path = os.path.join(input_folder, chunk_filename)
-            chunk.to_csv(chunk_path, index=False)
-            print(f'  ➤ Wrote: {chunk_filename} ({chunk.shape[0]} rows)')
-
-        os.remove(full_path)
-        print(f'  ⛔ Removed original: {filename}')
+        split_file(full_path, max_file_size)
 
 
 if __name__ == '__main__':
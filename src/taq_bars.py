@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Bar builder for the TAQ exporter.
+Trades are reduced, in one vectorized pass per chunk, to per (SYM_ROOT, bar)
+buckets holding everything needed for open/high/low/close, average price,
+volume-weighted price, volume and trade count. Buckets from different chunks
+can be merged exactly, so a bar that spans chunk or file boundaries gives
+the same result as if it had been read at once.
+"""
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+BUCKET_KEYS = ['SYM_ROOT', 'timestamp']
+BUCKET_COLUMNS = [
+    'open', 'high', 'low', 'close', 'price_sum', 'price_count',
+    'size_sum', 'notional', 'first_ts', 'last_ts'
+]
+
+# Bar widths are pandas frequency strings, mapped to Arrow's temporal units.
+BAR_WIDTHS = {
+    '1s': (1, 'second'),
+    '5s': (5, 'second'),
+    '1min': (1, 'minute'),
+    '5min': (5, 'minute')
+}
+BAR_FIELDS = [
+    'avg_price', 'open', 'high', 'low', 'close', 'vwap', 'volume', 'trade_count'
+]
+DEFAULT_BAR_WIDTH = '1min'
+DEFAULT_BAR_FIELDS = ['avg_price']
+
+
+def check_bar_options(bar_width, fields):
+    """
+    Validates the bar width and output fields requested by the user.
+    Args:
+        bar_width (str): One of the keys of `BAR_WIDTHS`.
+        fields (list): Output fields, each one of `BAR_FIELDS`.
+    """
+    if bar_width not in BAR_WIDTHS:
+        raise ValueError(f'Unknown bar width: {bar_width}')
+
+    unknown = [field for field in fields if field not in BAR_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f'Unknown bar fields: {", ".join(unknown) or "none given"}')
+
+
+def aggregate_trades(chunk, bar_width=DEFAULT_BAR_WIDTH):
+    """
+    Reduces a chunk of trades to bar buckets per symbol.
+    Args:
+        chunk (DataFrame): Trades with `timestamp`, `SYM_ROOT`, `PRICE` and `SIZE`.
+        bar_width (str): One of the keys of `BAR_WIDTHS`.
+    Returns:
+        DataFrame: `BUCKET_COLUMNS` indexed by (SYM_ROOT, timestamp).
+    """
+    chunk = (
+        chunk
+        .dropna(subset=['timestamp', 'SYM_ROOT', 'PRICE'])
+        .sort_values('timestamp', kind='stable')
+    )
+
+    return (
+        chunk
+        .assign(
+            bar=chunk['timestamp'].dt.floor(bar_width),
+            notional=chunk['PRICE'] * chunk['SIZE'])
+        .groupby(['SYM_ROOT', 'bar'])
+        .agg(
+            open=('PRICE', 'first'),
+            high=('PRICE', 'max'),
+            low=('PRICE', 'min'),
+            close=('PRICE', 'last'),
+            price_sum=('PRICE', 'sum'),
+            price_count=('PRICE', 'count'),
+            size_sum=('SIZE', 'sum'),
+            notional=('notional', 'sum'),
+            first_ts=('timestamp', 'min'),
+            last_ts=('timestamp', 'max'))
+        .rename_axis(BUCKET_KEYS)
+    )
+
+
+def aggregate_trades_arrow(batch, bar_width=DEFAULT_BAR_WIDTH):
+    """
+    Reduces an Arrow batch of trades to bar buckets per symbol. The grouping
+    runs in Arrow; only the buckets reach pandas.
+    Args:
+        batch (Table): Trades with `timestamp`, `SYM_ROOT`, `PRICE` and `SIZE`.
+        bar_width (str): One of the keys of `BAR_WIDTHS`.
+    Returns:
+        DataFrame: `BUCKET_COLUMNS` indexed by (SYM_ROOT, timestamp).
+    """
+    multiple, unit = BAR_WIDTHS[bar_width]
+    valid = pc.and_(
+        pc.and_(pc.is_valid(batch.column('timestamp')), pc.is_valid(batch.column('SYM_ROOT'))),
+        pc.is_valid(batch.column('PRICE')))
+    batch = batch.filter(valid).sort_by('timestamp')
+
+    trades = pa.table({
+        'SYM_ROOT': batch.column('SYM_ROOT'),
+        'timestamp': pc.floor_temporal(batch.column('timestamp'), multiple=multiple, unit=unit),
+        'trade_ts': batch.column('timestamp'),
+        'PRICE': batch.column('PRICE'),
+        'SIZE': batch.column('SIZE'),
+        'notional': pc.multiply(batch.column('PRICE'), batch.column('SIZE'))
+    })
+    keep_zero = pc.ScalarAggregateOptions(skip_nulls=True, min_count=0)
+
+    buckets = (
+        trades
+        .group_by(BUCKET_KEYS, use_threads=False)
+        .aggregate([
+            ('PRICE', 'first'), ('PRICE', 'max'), ('PRICE', 'min'), ('PRICE', 'last'),
+            ('PRICE', 'sum'), ('PRICE', 'count'), ('SIZE', 'sum', keep_zero),
+            ('notional', 'sum', keep_zero), ('trade_ts', 'min'), ('trade_ts', 'max')])
+        .rename_columns({
+            'PRICE_first': 'open', 'PRICE_max': 'high', 'PRICE_min': 'low',
+            'PRICE_last': 'close', 'PRICE_sum': 'price_sum', 'PRICE_count': 'price_count',
+            'SIZE_sum': 'size_sum', 'notional_sum': 'notional',
+            'trade_ts_min': 'first_ts', 'trade_ts_max': 'last_ts'})
+        .to_pandas()
+    )
+
+    return buckets.set_index(BUCKET_KEYS)[BUCKET_COLUMNS].sort_index()
+
+
+def merge_buckets(*frames):
+    """
+    Merges partial bar buckets that share the same (SYM_ROOT, timestamp) key:
+    sums and counts are added, highs and lows combined, and the open and
+    close are taken from the earliest and latest trades.
+    Args:
+        *frames (DataFrame): Partial buckets as returned by `aggregate_trades`.
+    Returns:
+        DataFrame: Merged buckets, sorted by (SYM_ROOT, timestamp).
+    """
+    frames = [frame for frame in frames if frame is not None and not frame.empty]
+    if not frames:
+        return None
+
+    merged = pd.concat(frames) if len(frames) > 1 else frames[0]
+    if merged.index.is_unique:
+        return merged.sort_index()
+
+    buckets = merged.groupby(level=BUCKET_KEYS).agg({
+        'high': 'max',
+        'low': 'min',
+        'price_sum': 'sum',
+        'price_count': 'sum',
+        'size_sum': 'sum',
+        'notional': 'sum',
+        'first_ts': 'min',
+        'last_ts': 'max'
+    })
+    buckets['open'] = (
+        merged.sort_values('first_ts', kind='stable')
+        .groupby(level=BUCKET_KEYS)['open'].first())
+    buckets['close'] = (
+        merged.sort_values('last_ts', kind='stable')
+        .groupby(level=BUCKET_KEYS)['close'].last())
+
+    return buckets[BUCKET_COLUMNS]
+
+
+class BarAccumulator:
+    """
+    Keeps the running buckets of the bars still open. A bar stays open while
+    it is the latest bar seen for its symbol, which lets a bar that spans
+    chunk (or file) boundaries be completed before it is emitted.
+    """
+
+    def __init__(self):
+        self._open = None
+
+    def add(self, partial):
+        """
+        Merges a chunk's partial buckets and returns the buckets that closed.
+        Args:
+            partial (DataFrame): Partial buckets as returned by `aggregate_trades`.
+        Returns:
+            DataFrame: Closed buckets, or None if every bucket is still open.
+        """
+        merged = merge_buckets(self._open, partial)
+        if merged is None:
+            return None
+
+        bars = merged.index.get_level_values('timestamp')
+        latest = (
+            bars.to_series(index=merged.index)
+            .groupby(level='SYM_ROOT')
+            .transform('max')
+        )
+        is_open = bars == latest.values
+
+        self._open = merged[is_open]
+        closed = merged[~is_open]
+
+        return closed if not closed.empty else None
+
+    def drain(self):
+        """
+        Closes and returns every bucket that is still open.
+        Returns:
+            DataFrame: Remaining buckets, or None if there are none.
+        """
+        remaining, self._open = self._open, None
+        return remaining
+
+
+def buckets_to_frame(buckets, fields=None):
+    """
+    Converts closed buckets into the output layout of the exporter.
+    Args:
+        buckets (DataFrame): Buckets indexed by (SYM_ROOT, timestamp).
+        fields (list): Output fields, each one of `BAR_FIELDS`.
+    Returns:
+        DataFrame: Rows with `timestamp`, `SYM_ROOT`, the fields and `year`.
+    """
+    fields = fields or DEFAULT_BAR_FIELDS
+    final = buckets.reset_index()
+    values = {
+        'avg_price': lambda: final['price_sum'] / final['price_count'],
+        'open': lambda: final['open'],
+        'high': lambda: final['high'],
+        'low': lambda: final['low'],
+        'close': lambda: final['close'],
+        'vwap': lambda: final['notional'] / final['size_sum'].where(final['size_sum'] > 0),
+        'volume': lambda: final['size_sum'],
+        'trade_count': lambda: final['price_count']
+    }
+
+    bars = final[['timestamp', 'SYM_ROOT']].copy()
+    for field in fields:
+        bars[field] = values[field]()
+    bars['year'] = bars['timestamp'].dt.year
+
+    return bars
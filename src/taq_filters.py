@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Trade filters for the TAQ exporter.
+Filters on sale conditions (TR_SCOND), exchanges (EX) and symbols (SYM_ROOT)
+are applied to the raw chunks, before timestamps are parsed, so discarded
+trades are never converted nor aggregated.
+
+TR_SCOND holds up to four one-character condition codes (blanks are
+padding). A trade is dropped if any of its codes is excluded and, when an
+include list is given, kept only if all of its codes are included; a trade
+without conditions is a regular trade and is always kept by the include list.
+"""
+from collections import namedtuple
+import re
+import pyarrow as pa
+import pyarrow.compute as pc
+
+TradeFilters = namedtuple(
+    'TradeFilters',
+    [
+        'include_conditions', 'exclude_conditions',
+        'include_exchanges', 'exclude_exchanges',
+        'include_symbols', 'exclude_symbols'
+    ],
+    defaults=(None,) * 6)
+
+FILTER_COLUMNS = {
+    'include_conditions': 'TR_SCOND',
+    'exclude_conditions': 'TR_SCOND',
+    'include_exchanges': 'EX',
+    'exclude_exchanges': 'EX',
+    'include_symbols': 'SYM_ROOT',
+    'exclude_symbols': 'SYM_ROOT'
+}
+
+
+def active_filters(filters):
+    """
+    Lists the filters that actually restrict trades, with sorted values.
+    Args:
+        filters (TradeFilters): The configured filters, or None.
+    Returns:
+        dict: Filter name to its sorted list of values.
+    """
+    if filters is None:
+        return {}
+
+    return {
+        name: sorted(set(values))
+        for name, values in filters._asdict().items()
+        if values
+    }
+
+
+def filter_columns(filters):
+    """
+    Lists the raw columns needed to apply the filters.
+    Args:
+        filters (TradeFilters): The configured filters, or None.
+    Returns:
+        list: Column names, without duplicates.
+    """
+    return sorted({FILTER_COLUMNS[name] for name in active_filters(filters)})
+
+
+def condition_patterns(filters):
+    """
+    Builds the regular expressions matching trades to drop by condition.
+    Args:
+        filters (TradeFilters): The configured filters.
+    Returns:
+        list: Patterns; a trade matching any of them is dropped.
+    """
+    active = active_filters(filters)
+    patterns = []
+
+    if 'exclude_conditions' in active:
+        codes = ''.join(re.escape(code) for code in active['exclude_conditions'])
+        patterns.append(f'[{codes}]')
+
+    if 'include_conditions' in active:
+        codes = ''.join(re.escape(code) for code in active['include_conditions'])
+        patterns.append(f'[^{codes} ]')
+
+    return patterns
+
+
+def filter_trades(chunk, filters):
+    """
+    Drops the trades of a raw pandas chunk rejected by the filters.
+    Args:
+        chunk (DataFrame): Raw TAQ rows, before any conversion.
+        filters (TradeFilters): The configured filters, or None.
+    Returns:
+        DataFrame: The rows that passed every filter.
+    """
+    active = active_filters(filters)
+    if not active:
+        return chunk
+
+    keep = chunk['SYM_ROOT'].notna()
+
+    if 'include_symbols' in active:
+        keep &= chunk['SYM_ROOT'].isin(active['include_symbols'])
+    if 'exclude_symbols' in active:
+        keep &= ~chunk['SYM_ROOT'].isin(active['exclude_symbols'])
+    if 'include_exchanges' in active:
+        keep &= chunk['EX'].isin(active['include_exchanges'])
+    if 'exclude_exchanges' in active:
+        keep &= ~chunk['EX'].isin(active['exclude_exchanges'])
+
+    patterns = condition_patterns(filters)
+    if patterns:
+        conditions = chunk['TR_SCOND'].fillna('')
+        for pattern in patterns:
+            keep &= ~conditions.str.contains(pattern, regex=True)
+
+    return chunk[keep]
+
+
+def filter_trades_arrow(batch, filters):
+    """
+    Drops the trades of a raw Arrow batch rejected by the filters.
+    Args:
+        batch (RecordBatch): Raw TAQ rows, before timestamps are built.
+        filters (TradeFilters): The configured filters, or None.
+    Returns:
+        RecordBatch: The rows that passed every filter.
+    """
+    active = active_filters(filters)
+    if not active:
+        return batch
+
+    def is_in(column, values):
+        return pc.fill_null(
+            pc.is_in(batch.column(column), value_set=pa.array(values, pa.string())), False)
+
+    keep = pc.is_valid(batch.column('SYM_ROOT'))
+
+    if 'include_symbols' in active:
+        keep = pc.and_(keep, is_in('SYM_ROOT', active['include_symbols']))
+    if 'exclude_symbols' in active:
+        keep = pc.and_(keep, pc.invert(is_in('SYM_ROOT', active['exclude_symbols'])))
+    if 'include_exchanges' in active:
+        keep = pc.and_(keep, is_in('EX', active['include_exchanges']))
+    if 'exclude_exchanges' in active:
+        keep = pc.and_(keep, pc.invert(is_in('EX', active['exclude_exchanges'])))
+
+    for pattern in condition_patterns(filters):
+        matches = pc.match_substring_regex(pc.fill_null(batch.column('TR_SCOND'), ''), pattern)
+        keep = pc.and_(keep, pc.invert(matches))
+
+    return batch.filter(keep)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Manifest of the TAQ files already ingested by `export_taq_to_parquet`.
+The manifest lives inside the output folder and records, for every source
+CSV, its size, modification time and content hash, plus the time range it
+contributed to each `SYM_ROOT=/year=` partition. It lets re-runs process only
+new or changed files and rewrite only the partitions they affect.
+"""
+from collections import namedtuple
+import hashlib
+import json
+import os
+import pandas as pd
+
+MANIFEST_NAME = '_manifest.json'
+HASH_BLOCK_SIZE = 1024 * 1024
+
+ManifestPlan = namedtuple('ManifestPlan', ['dirty', 'stale', 'entries'])
+
+
+def hash_file(path, block_size=HASH_BLOCK_SIZE):
+    """
+    Computes the SHA-256 hash of a file without loading it in memory.
+    Args:
+        path (str): Path to the file.
+        block_size (int): Number of bytes read at a time.
+    Returns:
+        str: Hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(block_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def file_stat(path):
+    """
+    Reads the size and modification time of a file.
+    Args:
+        path (str): Path to the file.
+    Returns:
+        dict: `size` in bytes and `mtime` in nanoseconds.
+    """
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+
+def load_manifest(output_folder):
+    """
+    Loads the manifest of an output folder.
+    Args:
+        output_folder (str): Output folder of the partitioned Parquet dataset.
+    Returns:
+        dict: The manifest, with an empty `files` mapping if there is none yet.
+    """
+    path = os.path.join(output_folder, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return {'files': {}}
+
+    with open(path, 'r', encoding='UTF-8') as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(output_folder, manifest):
+    """
+    Saves the manifest atomically, so a crash never leaves it half written.
+    Args:
+        output_folder (str): Output folder of the partitioned Parquet dataset.
+        manifest (dict): The manifest to save.
+    """
+    path = os.path.join(output_folder, MANIFEST_NAME)
+    tmp_path = f'{path}.tmp'
+
+    with open(tmp_path, 'w', encoding='UTF-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        manifest_file.flush()
+        os.fsync(manifest_file.fileno())
+
+    os.replace(tmp_path, path)
+
+
+def check_layout(manifest, bars, filters):
+    """
+    Makes sure a run builds the same kind of bars, with the same trade
+    filters, as the ones already in the output folder, then records the
+    layout in the manifest.
+    Args:
+        manifest (dict): The manifest of the output folder.
+        bars (dict): Bar `width` and `fields` of the current run.
+        filters (dict): Active trade filters of the current run.
+    """
+    previous = {
+        'bars': manifest.get('bars', {'width': '1min', 'fields': ['avg_price']}),
+        'filters': manifest.get('filters', {})
+    }
+    current = {'bars': bars, 'filters': filters}
+
+    if manifest['files'] and previous != current:
+        raise ValueError(
+            f'Output folder holds {previous["bars"]["width"]} bars with fields '
+            f'{", ".join(previous["bars"]["fields"])} and filters {previous["filters"]}; '
+            'use a new output folder for a different layout.')
+
+    manifest.update(current)
+
+
+def plan_changes(input_folder, filenames, manifest):
+    """
+    Compares the files of the input folder with the manifest. Files whose
+    size and mtime did not change are trusted without hashing; the others
+    are hashed, so a touched but identical file is not processed again.
+    Args:
+        input_folder (str): Folder with all the TAQ CSV files.
+        filenames (list): CSV file names found in the input folder.
+        manifest (dict): The manifest of the output folder.
+    Returns:
+        ManifestPlan: `dirty` files to process (new or changed), `stale`
+        files whose previous contributions must be dropped (changed or
+        removed) and the refreshed manifest `entries` of the current files.
+    """
+    known = manifest['files']
+    dirty, stale, entries = [], [], {}
+
+    for filename in filenames:
+        stat = file_stat(os.path.join(input_folder, filename))
+        previous = known.get(filename)
+
+        if previous and previous['size'] == stat['size'] \
+                and previous['mtime'] == stat['mtime']:
+            entries[filename] = previous
+            continue
+
+        sha256 = hash_file(os.path.join(input_folder, filename))
+        if previous and previous['sha256'] == sha256:
+            entries[filename] = dict(previous, **stat)
+            continue
+
+        entries[filename] = dict(stat, sha256=sha256, partitions={})
+        dirty.append(filename)
+        if previous:
+            stale.append(filename)
+
+    stale.extend(sorted(set(known) - set(filenames)))
+
+    return ManifestPlan(dirty, stale, entries)
+
+
+def partition_name(sym_root, year):
+    """
+    Builds the relative path of a `SYM_ROOT=/year=` partition.
+    Args:
+        sym_root (str): Security symbol root.
+        year (int): Year of the partition.
+    Returns:
+        str: The partition path relative to the output folder.
+    """
+    return f'SYM_ROOT={sym_root}/year={year}'
+
+
+def record_contributions(contributions, partial):
+    """
+    Extends the time range each partition received from a file with the
+    bar buckets of one of its chunks.
+    Args:
+        contributions (dict): Partition name to `[first, last]` timestamps.
+        partial (DataFrame): Partial buckets indexed by (SYM_ROOT, timestamp).
+    """
+    if partial is None or partial.empty:
+        return
+
+    keys = partial.index.to_frame(index=False)
+    keys['year'] = keys['timestamp'].dt.year
+    ranges = keys.groupby(['SYM_ROOT', 'year'])['timestamp'].agg(['min', 'max'])
+
+    for (sym_root, year), first, last in ranges.itertuples(name=None):
+        name = partition_name(sym_root, year)
+        if name in contributions:
+            first = min(first, contributions[name][0])
+            last = max(last, contributions[name][1])
+        contributions[name] = [first, last]
+
+
+def serialize_contributions(contributions):
+    """
+    Converts contribution ranges into JSON-friendly ISO strings.
+    Args:
+        contributions (dict): Partition name to `[first, last]` timestamps.
+    Returns:
+        dict: Partition name to `[first, last]` ISO formatted strings.
+    """
+    return {
+        name: [pd.Timestamp(first).isoformat(), pd.Timestamp(last).isoformat()]
+        for name, (first, last) in sorted(contributions.items())
+    }
+
+
+def update_manifest(manifest, plan, contributions):
+    """
+    Records the files of a finished run in the manifest.
+    Args:
+        manifest (dict): The manifest of the output folder.
+        plan (ManifestPlan): The plan the run executed.
+        contributions (dict): File name to the ranges it contributed now.
+    Returns:
+        dict: The updated manifest.
+    """
+    for filename, file_contributions in contributions.items():
+        plan.entries[filename]['partitions'] = serialize_contributions(file_contributions)
+
+    manifest['files'] = plan.entries
+    return manifest
@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Scores how likely every tweet refers to each topic of `TOPIC_LABELS`, the
+zero-shot classification of `topic_extraction.ipynb`.
+Two modes are available:
+* `nli` (default): the multi-label zero-shot classification of
+  `facebook/bart-large-mnli`, the score of a topic being the probability of
+  entailment (against contradiction) of the hypothesis `This example is
+  <topic>.` given the tweet. The hypotheses are tokenized once, and the
+  tweet x topic pairs of `batch_size` tweets go through a single forward
+  pass, instead of one pass per pair and tweet;
+* `embedding`: every tweet is embedded once by a sentence embedding model
+  and scored by the cosine similarity of its embedding with the embeddings
+  of the hypotheses, which are computed once and kept in the inference
+  cache. Much faster, but the scores are similarities rather than
+  probabilities.
+The output has the columns of the input tweets, `top_topic` and one column
+per topic. Scores are kept in the inference cache and written incrementally
+like the sentiment scores (see `scoring_output`); throughput is reported in
+tweets per second.
+"""
+import argparse
+import hashlib
+import numpy as np
+from inference_backend import load_model
+from inference_cache import CacheEntry, InferenceCache, text_hash
+from scoring_output import (
+    DEFAULT_FLUSH_ROWS, ResultWriter, add_scoring_arguments, inference_cache_file,
+    length_batches, onnx_models_dir, read_table, score_tweets)
+
+try:
+    import torch
+    from transformers import AutoModel, AutoModelForSequenceClassification
+except ImportError:
+    torch = AutoModel = AutoModelForSequenceClassification = None
+
+TOPIC_LABELS = [
+    'Healthcare and Pharmaceuticals', 'Technology', 'Energy', 'Financials',
+    'Automotive', 'Agriculture', 'Airlines and Travel', 'Cryptocurrency and Fintech',
+    'Defense and Aerospace', 'Arts and Entertainment'
+]
+HYPOTHESIS_TEMPLATE = 'This example is {}.'
+TOPIC_MODES = ('nli', 'embedding')
+DEFAULT_MODELS = {
+    'nli': 'facebook/bart-large-mnli',
+    'embedding': 'sentence-transformers/all-MiniLM-L6-v2'
+}
+DEFAULT_BATCH_SIZES = {'nli': 8, 'embedding': 64}
+DEFAULT_MAX_LENGTH = 512
+
+
+def settings_digest(mode, labels, template):
+    """
+    Hashes the settings the topic scores depend on, besides the model.
+    Args:
+        mode (str): One of `TOPIC_MODES`.
+        labels (list): The topics.
+        template (str): The hypothesis template.
+    Returns:
+        str: A short digest, added to the model revision in the cache key.
+    """
+    settings = '\n'.join([mode, template, *labels]).encode('UTF-8')
+    return hashlib.blake2b(settings, digest_size=8).hexdigest()
+
+
+def config_label_index(config, name):
+    """
+    Finds the output of an NLI model for a relation.
+    Args:
+        config (PretrainedConfig): Configuration of the model.
+        name (str): Start of the relation name, e.g. `entail`.
+    Returns:
+        int: Index of the relation in the logits.
+    """
+    for label, index in config.label2id.items():
+        if label.lower().startswith(name):
+            return index
+
+    raise ValueError(f'The model has no {name} label: {config.label2id}.')
+
+
+class NliTopicScorer:
+    """
+    Zero-shot topic scores of an NLI model, for batches of tweet x topic
+    pairs.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+            self, model_name=DEFAULT_MODELS['nli'], labels=None, threads=None,
+            max_length=DEFAULT_MAX_LENGTH, revision=None, template=HYPOTHESIS_TEMPLATE,
+            backend='fp32', onnx_dir=None):
+        self.labels = labels or TOPIC_LABELS
+        self.tokenizer, self.model, model_revision = load_model(
+            AutoModelForSequenceClassification, model_name, threads, revision, backend, onnx_dir)
+        self.revision = f'{model_revision}:{settings_digest("nli", self.labels, template)}'
+
+        self.hypotheses = [
+            self.tokenizer(template.format(label), add_special_tokens=False)['input_ids']
+            for label in self.labels
+        ]
+        self.max_premise_length = (
+            max_length - max(len(ids) for ids in self.hypotheses)
+            - self.tokenizer.num_special_tokens_to_add(pair=True))
+        # Outputs of the contradiction and entailment relations in the logits.
+        self.relations = [
+            config_label_index(self.model.config, 'contradiction'),
+            config_label_index(self.model.config, 'entail')
+        ]
+
+    def encode(self, texts):
+        """
+        Tokenizes tweets, without special tokens, truncated so that every
+        pair with a hypothesis fits in the model.
+        Args:
+            texts (list): The tweets.
+        Returns:
+            list: The token ids of every tweet.
+        """
+        return self.tokenizer(
+            list(texts), add_special_tokens=False, truncation=True,
+            max_length=self.max_premise_length)['input_ids']
+
+    def predict(self, input_ids):
+        """
+        Scores a batch of tokenized tweets against every topic in a single
+        forward pass.
+        Args:
+            input_ids (list): The token ids of every tweet.
+        Returns:
+            ndarray: The score of every tweet (rows) and topic (columns).
+        """
+        pairs = [
+            self.tokenizer.build_inputs_with_special_tokens(premise, hypothesis)
+            for premise in input_ids for hypothesis in self.hypotheses
+        ]
+        batch = self.tokenizer.pad({'input_ids': pairs}, return_tensors='pt')
+
+        with torch.inference_mode():
+            logits = self.model(batch)[:, self.relations]
+            scores = torch.softmax(logits, dim=-1)[:, 1]
+
+        return scores.reshape(len(input_ids), len(self.labels)).numpy()
+
+
+class SentenceEmbedder:
+    """
+    Unit sentence embeddings of a model, by mean pooling of its last hidden
+    state.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+            self, model_name=DEFAULT_MODELS['embedding'], threads=None,
+            max_length=DEFAULT_MAX_LENGTH, revision=None, backend='fp32', onnx_dir=None):
+        self.model_name = model_name
+        self.tokenizer, self.model, self.revision = load_model(
+            AutoModel, model_name, threads, revision, backend, onnx_dir, sequence_output=True)
+        self.max_length = min(max_length, self.tokenizer.model_max_length)
+
+    def encode(self, texts):
+        """
+        Tokenizes texts, without padding.
+        Args:
+            texts (list): The texts.
+        Returns:
+            list: The token ids of every text, truncated to `max_length`.
+        """
+        return self.tokenizer(
+            list(texts), truncation=True, max_length=self.max_length)['input_ids']
+
+    def embed(self, input_ids):
+        """
+        Embeds a batch of tokenized texts, by mean pooling.
+        Args:
+            input_ids (list): The token ids of every text.
+        Returns:
+            ndarray: The unit embedding of every text (rows), as float32.
+        """
+        batch = self.tokenizer.pad({'input_ids': input_ids}, return_tensors='pt')
+
+        with torch.inference_mode():
+            hidden = self.model(batch)
+            mask = batch['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+            vectors = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+            vectors = torch.nn.functional.normalize(vectors, dim=-1)
+
+        return vectors.numpy().astype(np.float32)
+
+
+class EmbeddingTopicScorer(SentenceEmbedder):
+    """
+    Topic scores as cosine similarities between the embeddings of the tweets
+    and of the topic hypotheses.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+            self, model_name=DEFAULT_MODELS['embedding'], labels=None, threads=None,
+            max_length=DEFAULT_MAX_LENGTH, revision=None, template=HYPOTHESIS_TEMPLATE,
+            backend='fp32', onnx_dir=None, label_cache_file=None):
+        super().__init__(model_name, threads, max_length, revision, backend, onnx_dir)
+        model_revision = self.revision
+        self.labels = labels or TOPIC_LABELS
+        self.revision = f'{model_revision}:{settings_digest("embedding", self.labels, template)}'
+
+        hypotheses = [template.format(label) for label in self.labels]
+        self.label_vectors = self.label_embeddings(
+            hypotheses,
+            InferenceCache(label_cache_file, model_name, model_revision)
+            if label_cache_file else None)
+
+    def label_embeddings(self, hypotheses, cache=None):
+        """
+        Embeds the topic hypotheses, reusing the embeddings in the cache.
+        Args:
+            hypotheses (list): The hypothesis of every topic.
+            cache (InferenceCache): Embeddings of the model, if any.
+        Returns:
+            ndarray: The unit embedding of every topic (rows).
+        """
+        keys = [text_hash(hypothesis) for hypothesis in hypotheses]
+        cached = cache.get_many(keys) if cache else {}
+
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        if missing:
+            vectors = self.embed(self.encode([hypotheses[i] for i in missing]))
+            for i, vector in zip(missing, vectors):
+                cached[keys[i]] = CacheEntry(hypotheses[i], None, vector)
+            if cache:
+                cache.put_many({keys[i]: cached[keys[i]] for i in missing})
+
+        return np.stack([cached[key].vector for key in keys])
+
+    def predict(self, input_ids):
+        """
+        Scores a batch of tokenized tweets against every topic.
+        Args:
+            input_ids (list): The token ids of every tweet.
+        Returns:
+            ndarray: The score of every tweet (rows) and topic (columns).
+        """
+        return self.embed(input_ids) @ self.label_vectors.T
+
+
+def topic_outputs(scorer, texts, batch_size):
+    """
+    Scores texts in batches of similar length.
+    Args:
+        scorer (object): A `NliTopicScorer` or `EmbeddingTopicScorer`.
+        texts (list): The texts.
+        batch_size (int): Texts per forward pass.
+    Yields:
+        dict: The `CacheEntry` of the texts of a batch, by position: the top
+        topic, its score and the score of every topic.
+    """
+    input_ids = scorer.encode(texts)
+
+    for positions in length_batches(input_ids, batch_size):
+        scores = scorer.predict([input_ids[i] for i in positions])
+        yield {
+            i: CacheEntry(scorer.labels[int(np.argmax(row))], float(np.max(row)), row)
+            for i, row in zip(positions, scores)
+        }
+
+
+def topic_columns(labels):
+    """
+    Builds the mapping of cache entries to the output columns of the topic
+    stage.
+    Args:
+        labels (list): The topics.
+    Returns:
+        callable: Maps a list of `CacheEntry` to the `top_topic` and the
+        score of every topic of every tweet.
+    """
+    def columns(entries):
+        vectors = np.array([entry.vector for entry in entries]).reshape(len(entries), len(labels))
+        result = {'top_topic': [entry.label for entry in entries]}
+        result.update({label: vectors[:, i] for i, label in enumerate(labels)})
+        return result
+
+    return columns
+
+
+def score_topics(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        tweets, scorer, writer, cache=None, batch_size=DEFAULT_BATCH_SIZES['nli'],
+        flush_rows=DEFAULT_FLUSH_ROWS, text_column='clean_text'):
+    """
+    Scores the topics of the tweets not in the output yet and appends them
+    to it, see `scoring_output.score_tweets`.
+    Args:
+        tweets (DataFrame): Tweets with an `id` and a text column.
+        scorer (object): A `NliTopicScorer` or `EmbeddingTopicScorer`.
+        writer (ResultWriter): Output of the scored tweets.
+        cache (InferenceCache): Outputs of the scorer, if any.
+        batch_size (int): Tweets per forward pass.
+        flush_rows (int): Scored tweets written at once.
+        text_column (str): Column of the texts.
+    Returns:
+        int: Number of tweets scored.
+    """
+    return score_tweets(
+        tweets, lambda texts: topic_outputs(scorer, texts, batch_size),
+        topic_columns(scorer.labels), writer, cache, flush_rows, text_column)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Score how likely every tweet refers to each topic.')
+    parser.add_argument(
+        'input_path',
+        type=str,
+        help='Tweets, e.g. tweets_with_sentiment.csv, or a Parquet file or dataset folder.')
+    parser.add_argument(
+        'output_path',
+        type=str,
+        help='Output, e.g. tweets_with_sentiment_and_topic.csv, or a Parquet dataset folder '
+             'if it ends with .parquet.')
+    parser.add_argument(
+        '--mode',
+        type=str,
+        choices=TOPIC_MODES,
+        default='nli',
+        help='Zero-shot NLI classification, or similarity of sentence embeddings.')
+    parser.add_argument(
+        '--model',
+        type=str,
+        help='Hugging Face model name or local path; the default model of the mode if omitted.')
+    parser.add_argument(
+        '--batch_size',
+        type=int,
+        help='Tweets per forward pass; 8 for nli (80 pairs) and 64 for embedding by default.')
+    add_scoring_arguments(parser)
+    args = parser.parse_args()
+
+    topic_model = args.model or DEFAULT_MODELS[args.mode]
+    cache_file = inference_cache_file(args)
+
+    if args.mode == 'nli':
+        topic_scorer = NliTopicScorer(
+            topic_model, threads=args.threads, revision=args.revision, backend=args.backend,
+            onnx_dir=onnx_models_dir(args))
+    else:
+        topic_scorer = EmbeddingTopicScorer(
+            topic_model, threads=args.threads, revision=args.revision, backend=args.backend,
+            onnx_dir=onnx_models_dir(args), label_cache_file=cache_file)
+
+    tweet_count = score_topics(
+        read_table(args.input_path),
+        topic_scorer,
+        ResultWriter(args.output_path, args.overwrite),
+        InferenceCache(cache_file, topic_model, topic_scorer.revision) if cache_file else None,
+        args.batch_size or DEFAULT_BATCH_SIZES[args.mode],
+        args.flush_rows)
+    print(f'Scored {tweet_count} tweets into {args.output_path}')
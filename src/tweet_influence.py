@@ -0,0 +1,429 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures the influence of tweets over the volatility of stocks.
+For every ticker of the partitioned TAQ Parquet dataset, minute log-returns
+during trading hours are fitted with an ARIMA(1,0,0) + GARCH(1,1) baseline,
+then every tweet whose topics map to the ticker is tested with an OLS of the
+squared standardized residuals on a one-minute impulse at the tweet time
+(weighted by the signed FinBERT score, unless disabled). This is the event
+study of `tweet_influence.ipynb`.
+
+Tickers are independent: with `--workers N` they are fitted in a process
+pool, each worker reading only its ticker's partitions, and the results are
+appended to the output CSV as soon as each ticker is done. With
+`--cache_dir`, fitted baselines are kept on disk (see `baseline_cache`), so
+re-running the study with other tweets only redoes the event regressions.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+import warnings
+from zoneinfo import ZoneInfo
+from arch import arch_model
+import numpy as np
+import pandas as pd
+from scipy import stats
+from statsmodels.tsa.arima.model import ARIMA
+from baseline_cache import DEFAULT_MAX_BYTES, BaselineCache, baseline_key
+
+MARKET_TZ = ZoneInfo('US/Eastern')
+TRADING_START = '09:30'
+TRADING_END = '16:00'
+TOPIC_THRESH = 0.80
+ARIMA_ORDER = (1, 0, 0)
+GARCH_ORDER = (1, 1)
+KERNEL = np.array([1.0])
+DEFAULT_MAX_PVALUE = 0.05
+RESULT_COLUMNS = ['handle', 'tweet_id', 'ticker', 'gamma', 'stderr', 'pvalue']
+TWEET_COLUMNS = ['id', 'handle', 'timestamp', 'sentiment_label', 'sentiment_score']
+
+
+def list_tickers(stock_folder):
+    """
+    Lists the tickers of the partitioned TAQ Parquet dataset.
+    Args:
+        stock_folder (str): Folder of the partitioned TAQ Parquet dataset.
+    Returns:
+        list: Security symbol roots, sorted.
+    """
+    return sorted(
+        name.split('=', 1)[1]
+        for name in os.listdir(stock_folder)
+        if name.startswith('SYM_ROOT=')
+    )
+
+
+def read_ticker_prices(stock_folder, ticker):
+    """
+    Reads the minute bars of a single ticker, every year included.
+    Args:
+        stock_folder (str): Folder of the partitioned TAQ Parquet dataset.
+        ticker (str): Security symbol root.
+    Returns:
+        DataFrame: The `timestamp` and `avg_price` of the ticker.
+    """
+    return pd.read_parquet(
+        os.path.join(stock_folder, f'SYM_ROOT={ticker}'),
+        engine='pyarrow',
+        columns=['timestamp', 'avg_price'])
+
+
+def prepare_returns(raw):
+    """
+    Computes minute log-returns during trading hours on a regular grid.
+    Args:
+        raw (DataFrame): Bars with `timestamp` and `avg_price`.
+    Returns:
+        Series: Log-returns indexed by minute, without missing values.
+    """
+    timestamps = (
+        pd.to_datetime(raw['timestamp'])
+        .dt.tz_localize(MARKET_TZ, nonexistent='shift_forward', ambiguous='NaT')
+        .dt.tz_localize(None)
+    )
+
+    prices = (
+        raw.assign(timestamp=timestamps)
+        .dropna(subset=['timestamp'])
+        .set_index('timestamp')
+        .sort_index()
+        .between_time(TRADING_START, TRADING_END)
+        ['avg_price']
+        .resample('1min')
+        .last()
+    )
+
+    return np.log(prices).diff().dropna()
+
+
+def fit_baseline_garch(returns):
+    """
+    Fits the ARIMA(1,0,0) + GARCH(1,1) baseline of a ticker.
+    Args:
+        returns (Series): Minute log-returns.
+    Returns:
+        tuple: Squared standardized residuals of the baseline and the fitted
+        parameters of both models.
+    """
+    with warnings.catch_warnings():
+        # Convergence and data scale warnings are expected on minute returns.
+        warnings.simplefilter('ignore')
+        ar_res = ARIMA(returns, order=ARIMA_ORDER, trend='n').fit()
+        garch = arch_model(
+            ar_res.resid, mean='Zero', vol='Garch', p=GARCH_ORDER[0], q=GARCH_ORDER[1]
+        ).fit(disp='off', show_warning=False)
+
+    params = {'arima': ar_res.params.to_dict(), 'garch': garch.params.to_dict()}
+    return garch.std_resid ** 2, params
+
+
+def load_baseline(ticker, returns, cache=None):
+    """
+    Fits the baseline of a ticker, or loads it from the cache.
+    Args:
+        ticker (str): Security symbol root.
+        returns (Series): Minute log-returns.
+        cache (BaselineCache): Cache of fitted baselines, or None.
+    Returns:
+        Series: Squared standardized residuals of the baseline.
+    """
+    if cache is None:
+        return fit_baseline_garch(returns)[0]
+
+    key = baseline_key(ticker, returns, {'arima': ARIMA_ORDER, 'garch': GARCH_ORDER})
+    cached = cache.get(key)
+    if cached is not None:
+        return cached[0]
+
+    std_resid2, params = fit_baseline_garch(returns)
+    cache.put(key, std_resid2, params)
+
+    return std_resid2
+
+
+def market_times(timestamps):
+    """
+    Converts tweet timestamps into naive New York times.
+    Args:
+        timestamps (Series): Tweet timestamps, as strings or datetimes.
+    Returns:
+        Series: Naive market times, NaT where the value could not be parsed.
+    """
+    return (
+        pd.to_datetime(timestamps, errors='coerce', utc=True, format='mixed')
+        .dt.tz_convert(MARKET_TZ)
+        .dt.tz_localize(None)
+    )
+
+
+def tweet_weights(tweets, use_finbert=True):
+    """
+    Computes the impulse weight of every tweet.
+    Args:
+        tweets (DataFrame): Tweets, with `sentiment_label` and `sentiment_score`.
+        use_finbert (bool): Weights impulses by the signed FinBERT score;
+            otherwise every impulse is 1.
+    Returns:
+        ndarray: One weight per tweet.
+    """
+    if not use_finbert:
+        return np.ones(len(tweets))
+
+    if 'sentiment_label' not in tweets or 'sentiment_score' not in tweets:
+        return np.zeros(len(tweets))
+
+    signs = (
+        tweets['sentiment_label'].astype(str).str.lower()
+        .map({'positive': 1.0, 'negative': -1.0})
+        .fillna(0.0)
+    )
+    return (signs * tweets['sentiment_score'].astype(float)).to_numpy()
+
+
+def relevant_tweets(tweets, ticker, topic_to_tickers):
+    """
+    Selects the tweets with a high score on a topic mapped to the ticker.
+    Args:
+        tweets (DataFrame): Tweets with one score column per topic.
+        ticker (str): Security symbol root.
+        topic_to_tickers (dict): Topic to the tickers it maps to.
+    Returns:
+        DataFrame: The relevant tweets.
+    """
+    topics = [
+        topic for topic, tickers in topic_to_tickers.items()
+        if topic in tweets and ticker in tickers
+    ]
+    if not topics:
+        return tweets.iloc[0:0]
+
+    return tweets[(tweets[topics] >= TOPIC_THRESH).any(axis=1)]
+
+
+def centered_impulse_sums(y, events, weights, kernel):
+    """
+    Computes the centered sums of squares and cross products of each
+    event's impulse x, from the sums over its kernel window.
+    Args:
+        y (ndarray): Squared standardized residuals.
+        events (ndarray): Position of each event in `y`.
+        weights (ndarray): Impulse weight of each event.
+        kernel (ndarray): Impulse shape, one value per minute.
+    Returns:
+        tuple: Centered sums of x² and of x·y of each event.
+    """
+    weights = np.asarray(weights, dtype=float)
+
+    # Kernel window of every event, truncated at the end of the series.
+    positions = np.asarray(events, dtype=np.int64)[:, None] + np.arange(len(kernel))
+    inside = positions < len(y)
+    window_kernel = np.where(inside, kernel, 0.0)
+    window_y = np.where(inside, y[np.minimum(positions, len(y) - 1)], 0.0)
+
+    sum_x = weights * window_kernel.sum(axis=1)
+    sum_xx = weights ** 2 * (window_kernel ** 2).sum(axis=1)
+    sum_xy = weights * (window_kernel * window_y).sum(axis=1)
+
+    return sum_xx - sum_x ** 2 / len(y), sum_xy - sum_x * y.mean()
+
+
+def event_regressions(std_resid2, events, weights, kernel=KERNEL):
+    """
+    Regresses the squared standardized residuals on each event's impulse
+    (the kernel, scaled by the event weight, starting at the event minute).
+    Every regression is solved in closed form from the global moments of the
+    residuals and the sums over the event's kernel window, so no full-length
+    impulse series is built. Results match `statsmodels.OLS` with a constant.
+    Args:
+        std_resid2 (Series): Squared standardized residuals of the baseline.
+        events (ndarray): Position of each event in `std_resid2`.
+        weights (ndarray): Impulse weight of each event.
+        kernel (ndarray): Impulse shape, one value per minute.
+    Returns:
+        DataFrame: `gamma`, `stderr` and `pvalue` of each event.
+    """
+    y = std_resid2.to_numpy(dtype=float)
+    n = len(y)
+    centered_xx, centered_xy = centered_impulse_sums(y, events, weights, kernel)
+    centered_yy = ((y - y.mean()) ** 2).sum()
+    degenerate = centered_xx <= 0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gamma = np.where(degenerate, 0.0, centered_xy / centered_xx)
+        residual_ss = np.maximum(centered_yy - gamma * centered_xy, 0.0)
+        stderr = np.where(degenerate, 0.0, np.sqrt(residual_ss / (n - 2) / centered_xx))
+        pvalue = 2 * stats.t.sf(np.abs(gamma / stderr), n - 2)
+
+    return pd.DataFrame({'gamma': gamma, 'stderr': stderr, 'pvalue': pvalue})
+
+
+def study_ticker(ticker, stock_folder, tweets, use_finbert=True, cache_dir=None):
+    """
+    Runs the event study of a single ticker.
+    Args:
+        ticker (str): Security symbol root.
+        stock_folder (str): Folder of the partitioned TAQ Parquet dataset.
+        tweets (DataFrame): The tweets relevant to the ticker.
+        use_finbert (bool): Weights impulses by the signed FinBERT score.
+        cache_dir (str): Folder of the baseline cache, or None.
+    Returns:
+        DataFrame: `RESULT_COLUMNS` for every tweet inside the ticker's data.
+    """
+    if tweets.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    returns = prepare_returns(read_ticker_prices(stock_folder, ticker))
+    if returns.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    cache = BaselineCache(cache_dir) if cache_dir else None
+    std_resid2 = load_baseline(ticker, returns, cache).dropna()
+
+    # First trading minute at or after each tweet.
+    events = np.searchsorted(
+        std_resid2.index.to_numpy(), market_times(tweets['timestamp']).to_numpy(), 'left')
+    inside = events < len(std_resid2)
+    tweets = tweets[inside]
+
+    regressions = event_regressions(
+        std_resid2, events[inside], tweet_weights(tweets, use_finbert))
+
+    return regressions.assign(
+        handle=tweets['handle'].to_numpy(),
+        tweet_id=tweets['id'].to_numpy(),
+        ticker=ticker
+    )[RESULT_COLUMNS]
+
+
+def iter_ticker_studies(tasks, stock_folder, use_finbert=True, workers=1, cache_dir=None):
+    """
+    Yields the event study of every ticker, as soon as it is done.
+    Args:
+        tasks (list): `(ticker, tweets)` pairs.
+        stock_folder (str): Folder of the partitioned TAQ Parquet dataset.
+        use_finbert (bool): Weights impulses by the signed FinBERT score.
+        workers (int): Number of worker processes; 1 runs serially.
+        cache_dir (str): Folder of the baseline cache, or None.
+    Yields:
+        tuple: The ticker and its results.
+    """
+    if workers <= 1:
+        for ticker, tweets in tasks:
+            yield ticker, study_ticker(ticker, stock_folder, tweets, use_finbert, cache_dir)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                study_ticker, ticker, stock_folder, tweets, use_finbert, cache_dir): ticker
+            for ticker, tweets in tasks
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def run_event_study(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        tweets, stock_folder, tickers_topics, use_finbert=True, workers=1,
+        output_file=None, max_pvalue=DEFAULT_MAX_PVALUE, cache_dir=None,
+        cache_max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Runs the event study over every ticker of the dataset.
+    Args:
+        tweets (DataFrame): Tweets with sentiment and one score column per topic.
+        stock_folder (str): Folder of the partitioned TAQ Parquet dataset.
+        tickers_topics (DataFrame): Mapping with the columns `ticker` and `topic`.
+        use_finbert (bool): Weights impulses by the signed FinBERT score.
+        workers (int): Number of worker processes; 1 runs serially.
+        output_file (str): CSV the significant results are appended to, per ticker.
+        max_pvalue (float): Largest p-value written to `output_file`.
+        cache_dir (str): Folder of the baseline cache, or None to always refit.
+        cache_max_bytes (int): Size above which cached baselines are evicted.
+    Returns:
+        DataFrame: `RESULT_COLUMNS` for every tested tweet/ticker pair.
+    """
+    topic_to_tickers = tickers_topics.groupby('topic')['ticker'].apply(list).to_dict()
+    columns = [column for column in TWEET_COLUMNS if column in tweets]
+    tasks = [
+        (ticker, relevant_tweets(tweets, ticker, topic_to_tickers)[columns])
+        for ticker in list_tickers(stock_folder)
+    ]
+
+    if output_file:
+        pd.DataFrame(columns=RESULT_COLUMNS).to_csv(output_file, index=False)
+
+    results = []
+    for ticker, result in iter_ticker_studies(
+            tasks, stock_folder, use_finbert, workers, cache_dir):
+        print(f'{ticker}: {len(result)} tweets evaluated')
+        results.append(result)
+
+        if output_file:
+            result[result['pvalue'] < max_pvalue].to_csv(
+                output_file, mode='a', header=False, index=False)
+
+    if cache_dir:
+        BaselineCache(cache_dir, cache_max_bytes).evict()
+
+    results = [result for result in results if not result.empty]
+    if not results:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    return pd.concat(results, ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Measure the influence of tweets over stock volatility.')
+    parser.add_argument(
+        'tweets_file',
+        type=str,
+        help='CSV of tweets with sentiment and topic scores.')
+    parser.add_argument(
+        'stock_folder',
+        type=str,
+        help='Folder of the partitioned TAQ Parquet dataset, one SYM_ROOT= folder per ticker.')
+    parser.add_argument(
+        'tickers_topics_file',
+        type=str,
+        help='CSV (;-separated) linking tickers to industries.')
+    parser.add_argument(
+        'output_file',
+        type=str,
+        help='Output CSV, e.g. 06_tweet_influence_over_stock.csv.')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of processes fitting tickers in parallel.')
+    parser.add_argument(
+        '--no_finbert',
+        action='store_true',
+        help='Use unweighted impulses instead of the signed FinBERT score.')
+    parser.add_argument(
+        '--max_pvalue',
+        type=float,
+        default=DEFAULT_MAX_PVALUE,
+        help='Largest p-value written to the output CSV.')
+    parser.add_argument(
+        '--cache_dir',
+        type=str,
+        help='Folder where fitted baselines are cached between runs.')
+    parser.add_argument(
+        '--cache_max_mb',
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help='Size of the baseline cache above which old entries are evicted.')
+    args = parser.parse_args()
+
+    run_event_study(
+        pd.read_csv(args.tweets_file),
+        args.stock_folder,
+        pd.read_csv(args.tickers_topics_file, sep=';')
+        .rename(columns={'industry': 'topic'})[['topic', 'ticker']],
+        not args.no_finbert,
+        args.workers,
+        args.output_file,
+        args.max_pvalue,
+        args.cache_dir,
+        args.cache_max_mb * 1024 * 1024)
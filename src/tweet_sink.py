@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Streaming writers for the tweets scraped by `read_tweets`.
+Each account's tweets are written page by page instead of being kept in
+memory until the end of the crawl:
+* `csv`: the raw tweet fields, appended to `<account_id>.csv`;
+* `ndjson`: one flattened tweet per line, each page appended to
+  `<account_id>.ndjson.gz` as its own gzip member;
+* `parquet`: flattened, typed tweets in `<account_id>.parquet/`, one file per
+  flush and one row group per page.
+Flattened tweets have typed columns for the fields used downstream (e.g.
+`user_id`, `user_screen_name`, `created_at` as a UTC timestamp) and keep the
+remaining fields, as JSON, in the `extra` column.
+Every writer reports a committed mark (bytes of the file, or number of
+Parquet files) once a page is durable on disk, and drops anything written
+past the mark when it is opened again. A file missing or shorter than its
+mark (e.g. removed by `split_large_files`) is started over.
+"""
+from datetime import datetime
+import gzip
+import json
+import os
+import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SINK_FORMATS = ('csv', 'ndjson', 'parquet')
+DEFAULT_FLUSH_ROWS = 5000
+CREATED_AT_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+PART_PATTERN = re.compile(r'part-(\d{5,})\.parquet(?:\.tmp)?')
+
+TWEET_FIELDS = [
+    ('id', ('id',), pa.int64()),
+    ('created_at', ('created_at',), pa.timestamp('ms', tz='UTC')),
+    ('text', ('text',), pa.string()),
+    ('lang', ('lang',), pa.string()),
+    ('source', ('source',), pa.string()),
+    ('in_reply_to_status_id', ('in_reply_to_status_id',), pa.int64()),
+    ('in_reply_to_user_id', ('in_reply_to_user_id',), pa.int64()),
+    ('in_reply_to_screen_name', ('in_reply_to_screen_name',), pa.string()),
+    ('is_quote_status', ('is_quote_status',), pa.bool_()),
+    ('quoted_status_id', ('quoted_status_id',), pa.int64()),
+    ('retweet_count', ('retweet_count',), pa.int64()),
+    ('favorite_count', ('favorite_count',), pa.int64()),
+    ('timestamp_ms', ('timestamp_ms',), pa.int64()),
+    ('user_id', ('user', 'id'), pa.int64()),
+    ('user_screen_name', ('user', 'screen_name'), pa.string()),
+    ('user_name', ('user', 'name'), pa.string()),
+    ('user_followers_count', ('user', 'followers_count'), pa.int64()),
+    ('user_verified', ('user', 'verified'), pa.bool_()),
+    ('retweeted_status_id', ('retweeted_status', 'id'), pa.int64()),
+    ('hashtags', ('entities', 'hashtags', 'text'), pa.list_(pa.string())),
+    ('user_mentions', ('entities', 'user_mentions', 'screen_name'), pa.list_(pa.string()))
+]
+TWEET_SCHEMA = pa.schema(
+    [(column, data_type) for column, _, data_type in TWEET_FIELDS] + [('extra', pa.string())])
+FLAT_KEYS = {path[0] for _, path, _ in TWEET_FIELDS if len(path) == 1} | {'id_str', 'full_text'}
+
+
+def parse_created_at(value):
+    """
+    Parses the creation time of a tweet.
+    Args:
+        value (str): Time in the Twitter format, e.g. `Wed Oct 10 20:19:24 +0000 2018`.
+    Returns:
+        datetime: The time in UTC, or None if it cannot be parsed.
+    """
+    try:
+        return datetime.strptime(value, CREATED_AT_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def field_value(tweet, path, data_type):
+    """
+    Reads a nested field of a tweet and converts it to its column type.
+    Args:
+        tweet (dict): The raw tweet.
+        path (tuple): Keys leading to the field; for list columns, the last
+            key is read from every item of the list.
+        data_type (DataType): Type of the column.
+    Returns:
+        object: The converted value, or None if the field is missing.
+    """
+    value = tweet
+    keys = path[:-1] if pa.types.is_list(data_type) else path
+    for key in keys:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+
+    return None if value is None else convert_value(value, path, data_type)
+
+
+def convert_value(value, path, data_type):
+    """
+    Converts a tweet field to its column type.
+    Args:
+        value (object): The raw field.
+        path (tuple): Keys leading to the field.
+        data_type (DataType): Type of the column.
+    Returns:
+        object: The converted value.
+    """
+    if pa.types.is_list(data_type):
+        return [str(item.get(path[-1])) for item in value if isinstance(item, dict)]
+    if pa.types.is_timestamp(data_type):
+        return parse_created_at(value)
+    if pa.types.is_integer(data_type):
+        return int(value)
+    if pa.types.is_boolean(data_type):
+        return bool(value)
+
+    return str(value)
+
+
+def flatten_tweet(tweet):
+    """
+    Flattens a raw tweet into the typed columns of `TWEET_SCHEMA`.
+    Args:
+        tweet (dict): The raw tweet, as returned by Polititweet.
+    Returns:
+        dict: One value per column; the fields without a column of their
+        own are kept as JSON in `extra`.
+    """
+    tweet = dict(tweet)
+    if 'full_text' in tweet:
+        tweet['text'] = tweet['full_text']
+
+    record = {
+        column: field_value(tweet, path, data_type) for column, path, data_type in TWEET_FIELDS
+    }
+    extra = {key: value for key, value in tweet.items() if key not in FLAT_KEYS}
+    record['extra'] = json.dumps(extra, sort_keys=True) if extra else None
+
+    return record
+
+
+def tweets_to_table(tweets):
+    """
+    Converts raw tweets to a typed Arrow table.
+    Args:
+        tweets (list): The raw tweets.
+    Returns:
+        Table: The flattened tweets, with the `TWEET_SCHEMA` schema.
+    """
+    return pa.Table.from_pylist([flatten_tweet(tweet) for tweet in tweets], schema=TWEET_SCHEMA)
+
+
+def truncate_file(path, size):
+    """
+    Truncates a file to its committed size, creating it if needed.
+    Args:
+        path (str): Path to the file.
+        size (int): Bytes to keep.
+    """
+    with open(path, 'ab') as output_file:
+        output_file.truncate(size)
+
+
+def committed_size(path, size):
+    """
+    Checks the committed size of a file against the file on disk.
+    Args:
+        path (str): Path to the file.
+        size (int): Committed size of a previous crawl, if any.
+    Returns:
+        int: The committed size, or 0 if the file is missing or shorter, in
+        which case a new file is started.
+    """
+    if not size or not os.path.isfile(path) or os.path.getsize(path) < size:
+        return 0
+
+    return size
+
+
+def part_number(name):
+    """
+    Reads the sequence number of a Parquet file written by `ParquetSink`.
+    Args:
+        name (str): File name, e.g. `part-00003.parquet`, or the `.tmp` file
+            it is written to.
+    Returns:
+        int: The sequence number, or None if the file is not a part file.
+    """
+    match = PART_PATTERN.fullmatch(name)
+    return int(match.group(1)) if match else None
+
+
+def uncommitted_parts(directory, committed):
+    """
+    Lists the part files of a Parquet dataset folder past its committed
+    mark, along with the temporary files of interrupted writes. Other files
+    of the folder are left alone.
+    Args:
+        directory (str): The dataset folder.
+        committed (int): Number of committed part files.
+    Returns:
+        list: Paths to the files to remove.
+    """
+    return [
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if part_number(name) is not None
+        and (name.endswith('.tmp') or part_number(name) >= committed)
+    ]
+
+
+class CsvSink:
+    """
+    Appends the raw fields of the tweets to `<account_id>.csv`. If a page
+    brings new fields, the file is rewritten with the union of the columns.
+    """
+
+    def __init__(self, output_folder, account_id, committed=None):
+        self.path = os.path.join(output_folder, f'{account_id}.csv')
+        self.committed = committed_size(self.path, committed)
+        truncate_file(self.path, self.committed)
+
+    def write(self, tweets):
+        """
+        Appends a page of tweets and flushes it to disk.
+        Args:
+            tweets (list): The raw tweets of the page.
+        Returns:
+            int: Bytes of the file after the page.
+        """
+        if not tweets:
+            return self.committed
+
+        df = pd.DataFrame(tweets)
+
+        if self.committed:
+            columns = pd.read_csv(self.path, nrows=0).columns.tolist()
+            if not set(df.columns) <= set(columns):
+                saved = pd.read_csv(self.path, dtype=str, keep_default_na=False)
+                tmp_path = f'{self.path}.tmp'
+                with open(tmp_path, 'w', encoding='UTF-8', newline='') as csv_file:
+                    pd.concat([saved, df], ignore_index=True).to_csv(csv_file, index=False)
+                    csv_file.flush()
+                    os.fsync(csv_file.fileno())
+                os.replace(tmp_path, self.path)
+                self.committed = os.path.getsize(self.path)
+                return self.committed
+            df = df.reindex(columns=columns)
+
+        with open(self.path, 'a', encoding='UTF-8', newline='') as csv_file:
+            df.to_csv(csv_file, header=not self.committed, index=False)
+            csv_file.flush()
+            os.fsync(csv_file.fileno())
+            self.committed = csv_file.tell()
+
+        return self.committed
+
+    def close(self):
+        """
+        Returns:
+            int: Bytes of the file.
+        """
+        return self.committed
+
+
+class NdjsonSink:
+    """
+    Appends flattened tweets to `<account_id>.ndjson.gz`, one gzip member per
+    page; gzip readers read the members as a single stream.
+    """
+
+    def __init__(self, output_folder, account_id, committed=None):
+        self.path = os.path.join(output_folder, f'{account_id}.ndjson.gz')
+        self.committed = committed_size(self.path, committed)
+        truncate_file(self.path, self.committed)
+
+    def write(self, tweets):
+        """
+        Appends a page of tweets and flushes it to disk.
+        Args:
+            tweets (list): The raw tweets of the page.
+        Returns:
+            int: Bytes of the file after the page.
+        """
+        if not tweets:
+            return self.committed
+
+        lines = ''.join(
+            json.dumps(flatten_tweet(tweet), default=datetime.isoformat) + '\n' for tweet in tweets)
+
+        with open(self.path, 'ab') as output_file:
+            with gzip.GzipFile(fileobj=output_file, mode='wb') as gzip_file:
+                gzip_file.write(lines.encode('UTF-8'))
+            output_file.flush()
+            os.fsync(output_file.fileno())
+            self.committed = output_file.tell()
+
+        return self.committed
+
+    def close(self):
+        """
+        Returns:
+            int: Bytes of the file.
+        """
+        return self.committed
+
+
+class ParquetSink:
+    """
+    Buffers flattened tweets and writes them as new files of the
+    `<account_id>.parquet/` dataset once `flush_rows` tweets are buffered,
+    each page as its own row group. Pages are only committed once flushed.
+    """
+
+    def __init__(self, output_folder, account_id, committed=None, flush_rows=DEFAULT_FLUSH_ROWS):
+        self.directory = os.path.join(output_folder, f'{account_id}.parquet')
+        self.committed = committed or 0
+        self.flush_rows = flush_rows
+        self._pages = []
+
+        os.makedirs(self.directory, exist_ok=True)
+        for path in uncommitted_parts(self.directory, self.committed):
+            os.remove(path)
+
+    def write(self, tweets):
+        """
+        Buffers a page of tweets, flushing the buffer once it is full.
+        Args:
+            tweets (list): The raw tweets of the page.
+        Returns:
+            int: Number of files after the flush, or None if the page is
+            only buffered.
+        """
+        if tweets:
+            self._pages.append(tweets_to_table(tweets))
+
+        if sum(page.num_rows for page in self._pages) >= self.flush_rows:
+            return self.flush()
+
+        return None
+
+    def flush(self):
+        """
+        Writes the buffered pages as a new file.
+        Returns:
+            int: Number of files of the dataset.
+        """
+        if not self._pages:
+            return self.committed
+
+        path = os.path.join(self.directory, f'part-{self.committed:05d}.parquet')
+        tmp_path = f'{path}.tmp'
+
+        with open(tmp_path, 'wb') as output_file:
+            with pq.ParquetWriter(output_file, TWEET_SCHEMA, compression='snappy') as writer:
+                for page in self._pages:
+                    writer.write_table(page)
+            output_file.flush()
+            os.fsync(output_file.fileno())
+
+        os.replace(tmp_path, path)
+        self._pages = []
+        self.committed += 1
+
+        return self.committed
+
+    def close(self):
+        """
+        Flushes the buffered pages.
+        Returns:
+            int: Number of files of the dataset.
+        """
+        return self.flush()
+
+
+def open_sink(sink_format, output_folder, account_id, committed=None):
+    """
+    Opens the writer of an account's tweets.
+    Args:
+        sink_format (str): One of `SINK_FORMATS`.
+        output_folder (str): Folder where the tweets are saved.
+        account_id (str): The Twitter account ID.
+        committed (int): Committed mark of a previous crawl, if any.
+    Returns:
+        object: A `CsvSink`, `NdjsonSink` or `ParquetSink`.
+    """
+    sinks = {'csv': CsvSink, 'ndjson': NdjsonSink, 'parquet': ParquetSink}
+    if sink_format not in sinks:
+        raise ValueError(f'Unknown output format {sink_format}, expected one of {SINK_FORMATS}.')
+
+    return sinks[sink_format](output_folder, account_id, committed)
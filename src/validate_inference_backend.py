@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures how much an inference backend (see `inference_backend`) changes
+the outputs of the scoring stages, before adopting it:
+python ./src/validate_inference_backend.py ./data/tweets_with_sentiment_and_topic.csv \
+    --backend int8
+A sample of the tweets is scored with the backend and with the `fp32`
+baseline (or compared with the scores already in the file, with
+`--baseline file`), and for every stage the report gives how often the
+labels agree (`sentiment_label`, `top_topic`), the mean and maximum drift of
+the scores (`sentiment_score`, or the mean absolute difference of the topic
+scores) and the throughput of both backends in tweets per second.
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from finbert_sentiment import DEFAULT_BATCH_SIZE, DEFAULT_MODEL, FinbertScorer, model_outputs
+from inference_backend import INFERENCE_BACKENDS, ONNX_DIR_NAME
+from inference_cache import CacheEntry
+from scoring_output import read_table
+from topic_extraction import (
+    DEFAULT_BATCH_SIZES, DEFAULT_MODELS, TOPIC_LABELS, EmbeddingTopicScorer, NliTopicScorer,
+    topic_outputs)
+
+STAGES = ('sentiment', 'topic')
+BASELINES = ('fp32', 'file')
+DEFAULT_SAMPLE = 1000
+
+
+def stage_outputs(stage, scorer, texts, batch_size):
+    """
+    Scores texts with the scorer of a stage.
+    Args:
+        stage (str): One of `STAGES`.
+        scorer (object): A `FinbertScorer`, or a topic scorer.
+        texts (list): The texts.
+        batch_size (int): Texts per forward pass.
+    Returns:
+        tuple: The `CacheEntry` of every text and the seconds it took.
+    """
+    outputs = model_outputs if stage == 'sentiment' else topic_outputs
+    entries = [None] * len(texts)
+
+    start = time.perf_counter()
+    for batch in outputs(scorer, texts, batch_size):
+        for i, entry in batch.items():
+            entries[i] = entry
+
+    return entries, time.perf_counter() - start
+
+
+def file_baseline(tweets, stage):
+    """
+    Reads the outputs of a stage already saved with the tweets.
+    Args:
+        tweets (DataFrame): Tweets with the columns of the stage, e.g. those
+            of `tweets_with_sentiment_and_topic.csv`.
+        stage (str): One of `STAGES`.
+    Returns:
+        list: The `CacheEntry` of every tweet.
+    """
+    if stage == 'sentiment':
+        return [
+            CacheEntry(None if pd.isna(label) else label, score, None)
+            for label, score in zip(tweets['sentiment_label'], tweets['sentiment_score'])
+        ]
+
+    entries = []
+    for label, vector in zip(tweets['top_topic'], tweets[TOPIC_LABELS].to_numpy(np.float32)):
+        # Tweets the notebook failed to classify have no topic scores.
+        label = None if pd.isna(label) else label
+        if np.isnan(vector).all():
+            entries.append(CacheEntry(label, None, None))
+        else:
+            entries.append(CacheEntry(label, float(np.nanmax(vector)), vector))
+
+    return entries
+
+
+def compare_outputs(baseline, candidate):
+    """
+    Compares the outputs of a backend with the baseline.
+    Args:
+        baseline (list): The `CacheEntry` of every text with the baseline.
+        candidate (list): The `CacheEntry` of every text with the backend.
+    Returns:
+        dict: `label_agreement` (share of equal labels), `mean_score_drift`
+        and `max_score_drift` (absolute difference of the score, or mean
+        absolute difference of the score vectors).
+    """
+    agreements, drifts = [], []
+
+    for base, entry in zip(baseline, candidate):
+        agreements.append(base.label == entry.label)
+        if base.vector is not None and entry.vector is not None:
+            drifts.append(np.nanmean(np.abs(np.asarray(base.vector) - np.asarray(entry.vector))))
+        elif base.score is not None and entry.score is not None:
+            drifts.append(abs(base.score - entry.score))
+
+    return {
+        'label_agreement': float(np.mean(agreements)) if agreements else float('nan'),
+        'mean_score_drift': float(np.nanmean(drifts)) if drifts else float('nan'),
+        'max_score_drift': float(np.nanmax(drifts)) if drifts else float('nan')
+    }
+
+
+def validate_backend(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        tweets, stage, make_scorer, backend, baseline='fp32', batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Compares the outputs of a stage with a backend and with the baseline.
+    Args:
+        tweets (DataFrame): Tweets with a `clean_text` column, and the
+            columns of the stage for the `file` baseline.
+        stage (str): One of `STAGES`.
+        make_scorer (callable): Builds the scorer of the stage for a backend.
+        backend (str): The backend to validate.
+        baseline (str): `fp32` to score the tweets with the fp32 backend, or
+            `file` to use the scores saved with the tweets.
+        batch_size (int): Texts per forward pass.
+    Returns:
+        dict: The comparison (see `compare_outputs`), with the throughput of
+        the backend and of the fp32 baseline in tweets per second.
+    """
+    texts = tweets['clean_text'].fillna('').astype(str).tolist()
+    candidate, seconds = stage_outputs(stage, make_scorer(backend), texts, batch_size)
+
+    baseline_rate = None
+    if baseline == 'file':
+        expected = file_baseline(tweets, stage)
+    else:
+        expected, baseline_seconds = stage_outputs(stage, make_scorer('fp32'), texts, batch_size)
+        baseline_rate = len(texts) / max(baseline_seconds, 1e-9)
+
+    report = compare_outputs(expected, candidate)
+    report['tweets_per_sec'] = len(texts) / max(seconds, 1e-9)
+    report['fp32_tweets_per_sec'] = baseline_rate
+
+    return report
+
+
+def print_report(stage, backend, report):
+    """
+    Prints the validation report of a stage.
+    Args:
+        stage (str): One of `STAGES`.
+        backend (str): The validated backend.
+        report (dict): The report of `validate_backend`.
+    """
+    print(f'{stage} ({backend}):')
+    print(f'  label agreement  {report["label_agreement"]:8.2%}')
+    print(f'  mean score drift {report["mean_score_drift"]:8.4f}')
+    print(f'  max score drift  {report["max_score_drift"]:8.4f}')
+    print(f'  throughput       {report["tweets_per_sec"]:8.1f} tweets/sec', end='')
+    if report['fp32_tweets_per_sec']:
+        print(f' ({report["tweets_per_sec"] / report["fp32_tweets_per_sec"]:.1f}x fp32)')
+    else:
+        print()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compare the scores of an inference backend with the fp32 baseline.')
+    parser.add_argument(
+        'input_path',
+        type=str,
+        help='Scored tweets, e.g. tweets_with_sentiment_and_topic.csv.')
+    parser.add_argument(
+        '--backend',
+        type=str,
+        choices=[backend for backend in INFERENCE_BACKENDS if backend != 'fp32'],
+        default='int8',
+        help='Backend to validate.')
+    parser.add_argument(
+        '--stage',
+        type=str,
+        choices=STAGES,
+        action='append',
+        help='Stage to validate; every stage by default.')
+    parser.add_argument(
+        '--baseline',
+        type=str,
+        choices=BASELINES,
+        default='fp32',
+        help='Score the sample with fp32, or compare with the scores of the file (nli topics).')
+    parser.add_argument(
+        '--sample',
+        type=int,
+        default=DEFAULT_SAMPLE,
+        help='Tweets scored, sampled at random from the file.')
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Seed of the sample.')
+    parser.add_argument(
+        '--topic_mode',
+        type=str,
+        choices=('nli', 'embedding'),
+        default='nli',
+        help='Mode of the topic stage.')
+    parser.add_argument(
+        '--threads',
+        type=int,
+        help='Intra-op threads; the default of the backend when omitted.')
+    parser.add_argument(
+        '--onnx_dir',
+        type=str,
+        default=ONNX_DIR_NAME,
+        help='Folder of the ONNX exports of the models.')
+    args = parser.parse_args()
+
+    sample = read_table(args.input_path)
+    sample = sample.sample(n=min(args.sample, len(sample)), random_state=args.seed)
+
+    scorers = {
+        'sentiment': lambda backend: FinbertScorer(
+            DEFAULT_MODEL, args.threads, backend=backend, onnx_dir=args.onnx_dir),
+        'topic': lambda backend: (
+            NliTopicScorer if args.topic_mode == 'nli' else EmbeddingTopicScorer)(
+                DEFAULT_MODELS[args.topic_mode], threads=args.threads, backend=backend,
+                onnx_dir=args.onnx_dir)
+    }
+    batch_sizes = {'sentiment': DEFAULT_BATCH_SIZE, 'topic': DEFAULT_BATCH_SIZES[args.topic_mode]}
+
+    for stage_name in args.stage or STAGES:
+        print_report(stage_name, args.backend, validate_backend(
+            sample, stage_name, scorers[stage_name], args.backend, args.baseline,
+            batch_sizes[stage_name]))
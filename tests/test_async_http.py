@@ -0,0 +1,86 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+import pytest
+
+from async_http import AsyncHttpClient, TokenBucket
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            server.ports.add(self.client_address[1])
+        time.sleep(0.05)
+        with server.lock:
+            server.active -= 1
+
+        body = self.path.encode('UTF-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(name='server')
+def fixture_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+    server.lock = threading.Lock()
+    server.active = 0
+    server.peak = 0
+    server.ports = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_token_bucket_limits_rate():
+    async def take(count):
+        bucket = TokenBucket(rate=50, capacity=1)
+        for _ in range(count):
+            await bucket.acquire()
+
+    start = time.monotonic()
+    asyncio.run(take(11))
+
+    assert time.monotonic() - start >= 0.18
+
+
+def test_client_bounds_requests_per_host(server):
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    async def fetch_all():
+        async with AsyncHttpClient(concurrency=8, per_host=3, rate=None) as client:
+            return await asyncio.gather(*(client.get(f'{url}/{i}') for i in range(12)))
+
+    responses = asyncio.run(fetch_all())
+
+    assert [response.text for response in responses] == [f'/{i}' for i in range(12)]
+    assert server.peak <= 3
+    # Keep-alive connections are reused instead of opening one per request.
+    assert len(server.ports) <= 3
+
+
+def test_client_runs_requests_concurrently(server):
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    async def fetch_all():
+        async with AsyncHttpClient(concurrency=4, per_host=4, rate=None) as client:
+            await asyncio.gather(*(client.get(f'{url}/{i}') for i in range(8)))
+
+    start = time.monotonic()
+    asyncio.run(fetch_all())
+
+    assert server.peak > 1
+    assert time.monotonic() - start < 8 * 0.05
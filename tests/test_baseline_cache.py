@@ -0,0 +1,54 @@
+import os
+import numpy as np
+import pandas as pd
+from baseline_cache import BaselineCache, baseline_key
+
+ORDERS = {"arima": (1, 0, 0), "garch": (1, 1)}
+
+def make_returns(seed, size=100):
+    index = pd.date_range("2023-01-03 09:31", periods=size, freq="1min")
+    return pd.Series(np.random.default_rng(seed).normal(0, 0.001, size), index=index)
+
+def test_baseline_key_depends_on_data_and_orders():
+    returns = make_returns(0)
+
+    assert baseline_key("AAPL", returns, ORDERS) == baseline_key("AAPL", returns.copy(), ORDERS)
+    assert baseline_key("AAPL", returns, ORDERS) != baseline_key("AAPL", make_returns(1), ORDERS)
+    assert baseline_key("AAPL", returns, ORDERS) != baseline_key(
+        "AAPL", returns, {"arima": (2, 0, 0), "garch": (1, 1)})
+    assert baseline_key("AAPL", returns, ORDERS).startswith("AAPL-")
+
+def test_baseline_cache_round_trip_and_invalidation(tmp_path):
+    cache = BaselineCache(tmp_path)
+    returns = make_returns(0)
+    key = baseline_key("AAPL", returns, ORDERS)
+
+    assert cache.get(key) is None
+    cache.put(key, returns ** 2, {"garch": {"omega": 0.1}})
+    std_resid2, params = cache.get(key)
+
+    np.testing.assert_array_equal(std_resid2.to_numpy(), (returns ** 2).to_numpy())
+    assert (std_resid2.index == returns.index).all()
+    assert params == {"garch": {"omega": 0.1}}
+
+    other = baseline_key("AAPL-B", returns, ORDERS)
+    cache.put(other, returns, {})
+    newer = baseline_key("AAPL", make_returns(1), ORDERS)
+    cache.put(newer, returns, {})
+
+    assert cache.get(key) is None
+    assert sorted(os.listdir(tmp_path)) == sorted([f"{other}.parquet", f"{newer}.parquet"])
+
+def test_baseline_cache_evicts_least_recently_used(tmp_path):
+    cache = BaselineCache(tmp_path)
+    keys = [baseline_key(ticker, make_returns(0), ORDERS) for ticker in ["A", "B", "C"]]
+    for i, key in enumerate(keys):
+        cache.put(key, make_returns(i), {})
+        os.utime(tmp_path / f"{key}.parquet", ns=(i * 10**9, i * 10**9))
+    cache.get(keys[0])
+
+    size = os.path.getsize(tmp_path / f"{keys[2]}.parquet")
+    cache.max_bytes = 2 * size + 100
+
+    assert cache.evict() == [keys[1]]
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
@@ -0,0 +1,148 @@
+import os
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+import pytest
+from build_event_windows import (
+    COMPLETED_INDEX,
+    DEFAULT_WINDOWS,
+    build_event_windows,
+    extract_shard,
+    load_completed,
+    mark_completed,
+    parse_window,
+    tweet_times,
+    window_positions
+)
+
+@pytest.fixture
+def stock_folder(tmp_path):
+    for ticker, year, start, periods in [
+        ("AAPL", 2022, "2022-12-31 23:00", 120),
+        ("AAPL", 2023, "2023-01-01 00:00", 3000),
+        ("TSLA", 2023, "2023-01-01 00:00", 3000),
+    ]:
+        folder = tmp_path / f"SYM_ROOT={ticker}" / f"year={year}"
+        folder.mkdir(parents=True)
+        timestamps = pd.date_range(start, periods=periods, freq="1min")
+        timestamps = timestamps[timestamps.year == year]
+        pd.DataFrame({
+            "timestamp": timestamps,
+            "avg_price": np.arange(len(timestamps), dtype=float),
+        }).to_parquet(folder / "part-00000-0.parquet", index=False)
+    return tmp_path
+
+@pytest.fixture
+def tweets():
+    return pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "handle": ["@a", "@a", "@b", "@b"],
+        "ticker": ["AAPL", "TSLA", "AAPL", "MSFT"],
+        "timestamp": [
+            "2023-01-01 04:50:00+00:00", "2023-01-01 15:00:30+00:00",
+            "2023-01-01 10:00:00+00:00", "2023-01-01 10:00:00+00:00",
+        ],
+        "sentiment_label": ["positive", "negative", "neutral", "neutral"],
+        "Technology": [1, 0, 1, 0],
+    })
+
+def naive_windows(tweet, prices):
+    time = pd.Timestamp(tweet["timestamp"]).tz_convert("US/Eastern").tz_localize(None)
+    around = prices[(prices["timestamp"] >= time - pd.Timedelta(minutes=30))
+                    & (prices["timestamp"] <= time + pd.Timedelta(minutes=30))]
+    later = time + pd.Timedelta(days=1)
+    after = prices[(prices["timestamp"] >= later)
+                   & (prices["timestamp"] < later + pd.Timedelta(minutes=30))]
+    return pd.concat([around, after])["timestamp"].tolist()
+
+def test_build_event_windows_matches_masks(stock_folder, tweets):
+    result = build_event_windows(tweets, stock_folder)
+
+    for _, tweet in tweets[tweets["ticker"] != "MSFT"].iterrows():
+        prices = pd.read_parquet(stock_folder / f"SYM_ROOT={tweet['ticker']}")
+        rows = result[result["tweet_id"] == tweet["id"]]
+        assert rows["timestamp"].tolist() == naive_windows(tweet, prices)
+
+    assert 4 not in set(result["tweet_id"])
+    first = result[result["tweet_id"] == 1]
+    assert len(first) == 61 + 30
+    assert first["timestamp"].dt.year.unique().tolist() == [2022, 2023]
+    assert first["minutes_since_tweet"].iloc[0] == -30.0
+    assert set(first["ticker"]) == {"AAPL"} and set(first["Technology"]) == {1}
+    assert "price" in result and "avg_price" not in result
+
+def test_build_event_windows_uses_market_time(tmp_path):
+    folder = tmp_path / "SYM_ROOT=AAPL" / "year=2023"
+    folder.mkdir(parents=True)
+    timestamps = pd.date_range("2023-06-01 09:30", "2023-06-02 16:00", freq="1min")
+    pd.DataFrame({"timestamp": timestamps, "avg_price": np.arange(len(timestamps), dtype=float)}) \
+        .to_parquet(folder / "part-00000-0.parquet", index=False)
+    tweets = pd.DataFrame({
+        "id": [1], "handle": ["@a"], "ticker": ["AAPL"],
+        "timestamp": ["2023-06-01T14:15:00Z"], "sentiment_label": ["positive"],
+    })
+
+    result = build_event_windows(tweets, tmp_path)
+
+    around = result[result["timestamp"].dt.day == 1]["timestamp"]
+    assert around.min() == pd.Timestamp("2023-06-01 09:45")
+    assert around.max() == pd.Timestamp("2023-06-01 10:45")
+    assert result["timestamp"].max() == pd.Timestamp("2023-06-02 10:44")
+
+def test_tweet_times_converts_to_market_time():
+    times = tweet_times(pd.Series(["2023-01-03 14:45:00+00:00", "2023-06-01T13:45:00Z", "nope"]))
+    assert times.tolist()[:2] == [pd.Timestamp("2023-01-03 09:45"), pd.Timestamp("2023-06-01 09:45")]
+    assert pd.isna(times.iloc[2])
+
+def test_window_positions_respects_open_ends():
+    bar_times = pd.date_range("2023-01-01", periods=10, freq="1min").to_numpy()
+    times = bar_times[[2, 5]]
+    windows = [parse_window("0min", "2min"), DEFAULT_WINDOWS[1]._replace(
+        start=pd.Timedelta(minutes=1), end=pd.Timedelta(minutes=3))]
+
+    tweet_positions, bar_positions = window_positions(bar_times, times, windows)
+
+    assert tweet_positions.tolist() == [0, 0, 0, 0, 0, 1, 1, 1, 1, 1]
+    assert bar_positions.tolist() == [2, 3, 4, 3, 4, 5, 6, 7, 6, 7]
+
+def test_parse_window_rejects_reversed_offsets():
+    with pytest.raises(ValueError, match="ends before"):
+        parse_window("30min", "-30min")
+
+def test_build_event_windows_workers_and_checkpoints_match_serial(tmp_path, stock_folder, tweets):
+    expected = build_event_windows(tweets, stock_folder)
+
+    pooled = build_event_windows(tweets, stock_folder, workers=2)
+    checkpointed = build_event_windows(
+        tweets, stock_folder, workers=2, checkpoint_dir=tmp_path / "checkpoints")
+
+    pd.testing.assert_frame_equal(pooled, expected)
+    pd.testing.assert_frame_equal(checkpointed, expected)
+
+def test_build_event_windows_resumes_from_completed_shards(tmp_path, stock_folder, tweets):
+    checkpoint_dir = tmp_path / "checkpoints"
+    build_event_windows(tweets, stock_folder, checkpoint_dir=checkpoint_dir)
+
+    completed = load_completed(checkpoint_dir)
+    assert len(completed) == 4
+    assert sorted(name for name in os.listdir(checkpoint_dir) if name.endswith(".parquet")) == sorted(
+        f"{key}.parquet" for key, rows in completed.items() if rows)
+
+    with open(checkpoint_dir / COMPLETED_INDEX, "a", encoding="UTF-8") as index_file:
+        index_file.write("TSLA-2023-truncat")
+
+    tweets.loc[tweets["id"] == 2, "sentiment_label"] = "positive"
+    with patch("build_event_windows.extract_shard", wraps=extract_shard) as mock_extract:
+        result = build_event_windows(tweets, stock_folder, checkpoint_dir=checkpoint_dir)
+        assert [call.args[0] for call in mock_extract.call_args_list] == ["TSLA"]
+
+    assert set(result.loc[result["tweet_id"] == 2, "sentiment_label"]) == {"positive"}
+    assert len(load_completed(checkpoint_dir)) == 5
+
+def test_mark_completed_after_cut_line(tmp_path):
+    (tmp_path / COMPLETED_INDEX).write_text("AAPL-2023-a\t10\nTSLA-2023-b\t12", encoding="UTF-8")
+    assert load_completed(tmp_path) == {"AAPL-2023-a": 10}
+
+    mark_completed(tmp_path, "TSLA-2023-c", 7)
+    mark_completed(tmp_path, "TSLA-2023-d", 0)
+    assert load_completed(tmp_path) == {"AAPL-2023-a": 10, "TSLA-2023-c": 7, "TSLA-2023-d": 0}
@@ -1,7 +1,11 @@
+import os
+import tempfile
 import unittest
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from unittest.mock import patch, mock_open, MagicMock
-from clean import merge_csv_files
+from clean import merge_csv_files, merge_csv_files_to_parquet
 
 class TestMergeCSVFiles(unittest.TestCase):
 
@@ -82,5 +86,58 @@ class TestMergeCSVFiles(unittest.TestCase):
         # Assert that only the valid file was processed
         mock_read_csv.assert_called_once_with('file1.csv', low_memory=False)
 
+class TestMergeCSVFilesToParquet(unittest.TestCase):
+
+    def test_merge_csv_files_to_parquet(self):
+        with tempfile.TemporaryDirectory() as folder:
+            tweets_folder = os.path.join(folder, 'tweets')
+            os.mkdir(tweets_folder)
+            pd.DataFrame({
+                'id': [3, 2],
+                'text': ['line one\nline two', 'plain'],
+                'retweet_count': [10, 20],
+                'in_reply_to_status_id': [None, None],
+                'truncated': [True, False]
+            }).to_csv(os.path.join(tweets_folder, 'a.csv'), index=False)
+            pd.DataFrame({
+                'id': [1],
+                'text': ['other account'],
+                'retweet_count': [1.5],
+                'in_reply_to_status_id': [1234567890123456789],
+                'lang': ['en']
+            }).to_csv(os.path.join(tweets_folder, 'b.csv'), index=False)
+            with open(os.path.join(tweets_folder, 'empty.csv'), 'w', encoding='UTF-8'):
+                pass
+
+            output_folder = os.path.join(folder, 'merged.parquet')
+            schema = merge_csv_files_to_parquet(
+                tweets_folder, output_folder, workers=2, block_size=64)
+
+            self.assertEqual(schema, pa.schema([
+                ('id', pa.int64()),
+                ('text', pa.string()),
+                ('retweet_count', pa.float64()),
+                ('in_reply_to_status_id', pa.int64()),
+                ('truncated', pa.bool_()),
+                ('lang', pa.string())
+            ]))
+            self.assertEqual(sorted(os.listdir(output_folder)),
+                             ['part-00000.parquet', 'part-00001.parquet'])
+            self.assertEqual(sorted(os.listdir(folder)), ['merged.parquet', 'tweets'])
+
+            df = pd.read_parquet(output_folder)
+            self.assertEqual(df['id'].tolist(), [3, 2, 1])
+            self.assertEqual(df['text'].tolist()[0], 'line one\nline two')
+            self.assertEqual(
+                pq.read_table(output_folder)['in_reply_to_status_id'].to_pylist(),
+                [None, None, 1234567890123456789])
+            self.assertEqual(df['lang'].tolist()[2], 'en')
+
+            columns = pd.read_parquet(output_folder, columns=['id', 'truncated'])
+            self.assertEqual(columns.columns.tolist(), ['id', 'truncated'])
+            self.assertEqual(pq.read_schema(
+                os.path.join(output_folder, 'part-00001.parquet')), schema)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,45 @@
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+from compact_taq_parquet import FileLayout, compact_taq_parquet, list_partitions
+
+def write_fragment(folder, name, timestamps):
+    frame = pd.DataFrame({
+        "timestamp": pd.to_datetime(timestamps),
+        "avg_price": [float(i) for i in range(len(timestamps))],
+    })
+    folder.mkdir(parents=True, exist_ok=True)
+    frame.to_parquet(folder / name, index=False)
+
+def test_compact_taq_parquet_merges_fragments(tmp_path):
+    partition = tmp_path / "SYM_ROOT=AAPL" / "year=2023"
+    write_fragment(partition, "part-c.parquet", ["2023-01-03 09:31"])
+    write_fragment(partition, "part-b.parquet", ["2023-01-03 09:30"])
+    write_fragment(partition, "part-a.parquet", ["2023-01-02 09:30", "2023-01-02 09:31", "2023-01-02 09:32"])
+    write_fragment(tmp_path / "SYM_ROOT=MSFT" / "year=2023", "part-a.parquet", ["2023-01-02 09:30"])
+
+    compacted = compact_taq_parquet(tmp_path, FileLayout(row_group_size=2, file_rows=4))
+
+    assert compacted == ["SYM_ROOT=AAPL/year=2023"]
+    assert list_partitions(tmp_path) == ["SYM_ROOT=AAPL/year=2023", "SYM_ROOT=MSFT/year=2023"]
+    assert sorted(os.listdir(partition)) == ["part-00000-0.parquet", "part-00000-1.parquet"]
+
+    result = pd.read_parquet(partition)
+    assert result["timestamp"].is_monotonic_increasing
+    assert len(result) == 5
+
+    metadata = pq.ParquetFile(partition / "part-00000-0.parquet").metadata
+    assert metadata.num_row_groups == 2
+    column = metadata.row_group(0).column(0)
+    assert column.statistics.has_min_max
+    assert column.has_column_index and column.has_offset_index
+    assert metadata.row_group(0).sorting_columns[0].column_index == 0
+
+def test_compact_taq_parquet_skips_compact_partitions(tmp_path):
+    partition = tmp_path / "SYM_ROOT=AAPL" / "year=2023"
+    write_fragment(partition, "part-a.parquet", ["2023-01-02 09:30"])
+
+    assert compact_taq_parquet(tmp_path) == []
+    assert compact_taq_parquet(tmp_path, force=True) == ["SYM_ROOT=AAPL/year=2023"]
+    assert os.listdir(partition) == ["part-00000-0.parquet"]
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".compact-")]
@@ -1,7 +1,47 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import tempfile
+import threading
 import unittest
 from unittest.mock import patch, mock_open, MagicMock
 from bs4 import BeautifulSoup
+import requests
 import convert_handles_to_ids as converter
+from handle_cache import HandleCache
+from html_extract import FIGURE_CARD, extract_links
+
+FIGURE_PAGES = {
+    '/figures?search=handle1': (['handle3', 'handle1'], None),
+    '/figures?search=handle2': (['handle4'], '/figures?search=handle2&page=2'),
+    '/figures?search=handle2&page=2': (['handle2'], None),
+    '/figures?search=handle5': ([], None)
+}
+
+
+class FiguresHandler(BaseHTTPRequestHandler):
+    """Stand-in for the Polititweet figure search."""
+    requests = []
+
+    def do_GET(self):
+        FiguresHandler.requests.append(self.path)
+        if self.path not in FIGURE_PAGES:
+            self.send_error(500)
+            return
+
+        handles, next_href = FIGURE_PAGES[self.path]
+        cards = ''.join(
+            f'<a class="box figure-card" href="/figures?id={handle[-1] * 3}">'
+            f'<span href="/user/{handle}">{handle}</span></a>' for handle in handles)
+        body = f'<div class="grid">{cards}</div>'
+        if next_href:
+            body += f'<a class="pagination-next" href="{next_href}">Next</a>'
+
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(body.encode('UTF-8'))
+
+    def log_message(self, *args):
+        pass
 
 class TestConvertHandlesToIds(unittest.TestCase):
 
@@ -89,6 +129,63 @@ class TestConvertHandlesToIds(unittest.TestCase):
         soup = BeautifulSoup(html_content, 'html.parser')
         twitter_id = converter.extract_twitter_id('handle1', soup)
         self.assertIsNone(twitter_id)
+    @patch('convert_handles_to_ids.time.sleep')
+    @patch('builtins.open', new_callable=mock_open, read_data='handle1\n')
+    @patch('convert_handles_to_ids.requests.get')
+    def test_scrape_polititweet_gives_up_failing_page(self, mock_get, mock_file, mock_sleep):
+        mock_get.side_effect = requests.exceptions.ConnectionError('down')
+
+        result = converter.scrape_polititweet('handles.csv')
+        self.assertEqual(result, [])
+        self.assertEqual(mock_get.call_count, converter.MAX_RETRIES + 1)
+
+    def test_extract_next_href(self):
+        links = extract_links(
+            '<a class="pagination-next" href="/figures?search=a&page=2">Next</a>', FIGURE_CARD)
+        self.assertEqual(converter.extract_next_href(links), '?search=a&page=2')
+
+        links = extract_links(
+            '<a class="pagination-next" disabled href="/figures?page=2">Next</a>', FIGURE_CARD)
+        self.assertIsNone(converter.extract_next_href(links))
+
+    @patch('convert_handles_to_ids.RETRY_DELAY_SECONDS', 0)
+    def test_resolve_handles(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FiguresHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        FiguresHandler.requests = []
+
+        try:
+            with tempfile.TemporaryDirectory() as cache_dir, patch(
+                    'convert_handles_to_ids.BASE_URL',
+                    f'http://127.0.0.1:{server.server_address[1]}/figures'):
+                cache = HandleCache(f'{cache_dir}/cache.json')
+                result = asyncio.run(converter.resolve_handles(
+                    ['handle1', 'handle2', 'handle3', 'handle5', 'handle6'], cache,
+                    concurrency=1, max_retries=1))
+
+                self.assertEqual(result, [
+                    {'id': '111', 'handle': 'handle1'},
+                    {'id': '222', 'handle': 'handle2'},
+                    {'id': '333', 'handle': 'handle3'}
+                ])
+                # handle3 was answered by the page of handle1.
+                self.assertNotIn('/figures?search=handle3', FiguresHandler.requests)
+                # handle5 is cached as missing; handle6 failed and is retried next time.
+                self.assertEqual(cache.get('handle5'), (True, None))
+                self.assertEqual(cache.get('handle6'), (False, None))
+                self.assertEqual(FiguresHandler.requests.count('/figures?search=handle6'), 2)
+
+                # A new run answers from the persistent cache.
+                FiguresHandler.requests = []
+                cache = HandleCache(f'{cache_dir}/cache.json')
+                result = asyncio.run(converter.resolve_handles(
+                    ['handle4', 'handle1'], cache, max_retries=0))
+                self.assertEqual(len(result), 2)
+                self.assertEqual(FiguresHandler.requests, [])
+        finally:
+            server.shutdown()
+            server.server_close()
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,95 @@
+import os
+import pandas as pd
+import pytest
+from crawl_state import (
+    account_state,
+    check_format,
+    close_crawl,
+    commit_page,
+    load_crawl_state,
+    save_crawl_state,
+    start_cursor
+)
+from split_large_files import split_large_files
+from tweet_sink import ParquetSink
+
+def test_load_crawl_state_missing(tmp_path):
+    assert load_crawl_state(tmp_path) == {'accounts': {}}
+
+def test_save_and_load_crawl_state(tmp_path):
+    state = {'accounts': {'1': {'newest_id': 5, 'cursor': None, 'crawl_newest_id': None, 'size': 10}}}
+    save_crawl_state(tmp_path, state)
+    assert load_crawl_state(tmp_path) == state
+    assert os.listdir(tmp_path) == ['_crawl_state.json']
+
+def test_start_cursor():
+    state = {'accounts': {}}
+    entry = account_state(state, 1)
+    assert start_cursor(entry, 1) == '?account=1'
+    entry['cursor'] = '?account=1&page=3'
+    assert start_cursor(account_state(state, '1'), 1) == '?account=1&page=3'
+
+def test_commit_page_stops_at_high_water_mark(tmp_path):
+    state = {'accounts': {'1': {'newest_id': 3, 'cursor': None, 'crawl_newest_id': None, 'size': None}}}
+
+    assert commit_page(tmp_path, state, '1', [{'id': 6}, {'id': 5}], '?account=1&page=2')
+    assert state['accounts']['1']['newest_id'] == 3
+    assert state['accounts']['1']['crawl_newest_id'] == 6
+
+    assert not commit_page(tmp_path, state, '1', [{'id': 4}, {'id': 3}], '?account=1&page=3')
+
+    entry = load_crawl_state(tmp_path)['accounts']['1']
+    assert entry['newest_id'] == 6
+    assert entry['cursor'] is None
+    assert pd.read_csv(tmp_path / "1.csv")['id'].tolist() == [6, 5, 4]
+
+def test_commit_page_keeps_high_water_mark_without_new_tweets(tmp_path):
+    state = {'accounts': {}}
+    assert not commit_page(tmp_path, state, '1', [], None)
+    assert state['accounts']['1']['newest_id'] is None
+
+def test_commit_page_saves_state_once_page_is_durable(tmp_path):
+    state = {'accounts': {}}
+    sink = ParquetSink(tmp_path, '1', flush_rows=3)
+
+    assert commit_page(tmp_path, state, '1', [{'id': 6}, {'id': 5}], '?account=1&page=2', sink)
+    assert load_crawl_state(tmp_path) == {'accounts': {}}
+
+    assert commit_page(tmp_path, state, '1', [{'id': 4}, {'id': 3}], '?account=1&page=3', sink)
+    entry = load_crawl_state(tmp_path)['accounts']['1']
+    assert entry['cursor'] == '?account=1&page=3'
+    assert entry['size'] == 1
+
+    assert commit_page(tmp_path, state, '1', [{'id': 2}], '?account=1&page=4', sink)
+    close_crawl(tmp_path, state, '1', sink)
+    entry = load_crawl_state(tmp_path)['accounts']['1']
+    assert entry['cursor'] == '?account=1&page=4'
+    assert entry['size'] == 2
+    assert pd.read_parquet(tmp_path / "1.parquet")['id'].tolist() == [6, 5, 4, 3, 2]
+
+def test_check_format(tmp_path):
+    state = {'accounts': {}}
+    check_format(state, 'parquet')
+    with pytest.raises(ValueError, match='new output folder'):
+        check_format(state, 'csv')
+
+    # States written before the format was recorded hold CSV files.
+    with pytest.raises(ValueError, match='holds csv tweets'):
+        check_format({'accounts': {'1': {}}}, 'ndjson')
+
+def test_commit_page_after_split_starts_a_new_file(tmp_path):
+    state = {'accounts': {}}
+    commit_page(tmp_path, state, '1', [{'id': i, 'text': 'x' * 40} for i in range(9, 3, -1)], None)
+    split_large_files(str(tmp_path), max_file_size=150)
+    parts = sorted(path.name for path in tmp_path.glob('1__*.csv'))
+    assert not (tmp_path / "1.csv").exists()
+
+    tweets = [{'id': i, 'text': 'y' * 40} for i in range(15, 9, -1)] + [{'id': 9, 'text': 'x'}]
+    assert not commit_page(tmp_path, state, '1', tweets, None)
+    assert state['accounts']['1']['newest_id'] == 15
+    assert pd.read_csv(tmp_path / "1.csv")['id'].tolist() == [15, 14, 13, 12, 11, 10]
+
+    split_large_files(str(tmp_path), max_file_size=150)
+    assert set(parts) < {path.name for path in tmp_path.glob('1__*.csv')}
+    ids = pd.concat(pd.read_csv(path) for path in tmp_path.glob('1__*.csv'))['id']
+    assert sorted(ids) == list(range(4, 16))
@@ -0,0 +1,100 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from embedding_store import (
+    IDS_NAME, VECTORS_NAME, EmbeddingStore, append_rows, embed_tweets, import_embedding_csv)
+
+class LengthEmbedder:
+    """Stand-in for SentenceEmbedder: embeds a text as its word count and its first letter."""
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts):
+        return [text.split() for text in texts]
+
+    def embed(self, input_ids):
+        self.batches.append(len(input_ids))
+        return np.array([[len(words), ord(words[0][0]) if words else 0] for words in input_ids],
+                        dtype=np.float32)
+
+def test_store_files_are_plain_npy(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "store"), "model", "abc")
+    store.append([3, 1], [[0.1, 0.2], [0.3, 0.4]])
+
+    np.testing.assert_array_equal(np.load(tmp_path / "store" / IDS_NAME), [3, 1])
+    vectors = np.load(tmp_path / "store" / VECTORS_NAME, mmap_mode="r")
+    assert vectors.dtype == np.float32 and vectors.shape == (2, 2)
+    np.testing.assert_allclose(vectors, [[0.1, 0.2], [0.3, 0.4]])
+
+def test_store_is_append_only(tmp_path):
+    path = str(tmp_path / "store")
+    store = EmbeddingStore(path, "model", "abc")
+    assert store.append([1, 2, 2], [[1, 1], [2, 2], [9, 9]]) == 2
+    assert store.append([2, 3], [[8, 8], [3, 3]]) == 1
+
+    store = EmbeddingStore(path, "model")
+    assert len(store) == 3 and store.dim == 2
+    np.testing.assert_array_equal(store.ids, [1, 2, 3])
+    np.testing.assert_array_equal(store.rows_of([3, 4, 1]), [2, -1, 0])
+    np.testing.assert_allclose(store.vectors, [[1, 1], [2, 2], [3, 3]])
+
+    with pytest.raises(ValueError):
+        store.append([4], [[1, 2, 3]])
+    with pytest.raises(ValueError):
+        EmbeddingStore(path, "other model")
+
+def test_store_drops_uncommitted_rows(tmp_path):
+    path = str(tmp_path / "store")
+    EmbeddingStore(path, "model").append([1], [[1.0, 1.0]])
+    # An append interrupted before its manifest was saved.
+    append_rows(os.path.join(path, VECTORS_NAME), np.ones((5, 2), np.float32), 1)
+
+    store = EmbeddingStore(path, "model")
+    assert store.vectors.shape == (1, 2)
+    assert os.path.getsize(os.path.join(path, VECTORS_NAME)) == 128 + 8
+    assert np.load(os.path.join(path, VECTORS_NAME)).shape == (1, 2)
+
+def test_matrix_is_a_view_of_consecutive_rows(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "store"), "model")
+    store.append([10, 11, 12, 13], np.arange(8).reshape(4, 2))
+
+    view = store.matrix([11, 12])
+    assert isinstance(view, np.memmap) and view.flags["C_CONTIGUOUS"]
+    np.testing.assert_allclose(view, [[2, 3], [4, 5]])
+    assert store.matrix().shape == (4, 2)
+
+    gathered = store.matrix([13, 10])
+    assert not isinstance(gathered, np.memmap)
+    np.testing.assert_allclose(gathered, [[6, 7], [0, 1]])
+
+    with pytest.raises(KeyError):
+        store.matrix([10, 99])
+
+def test_embed_tweets_keeps_tweet_order(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "store"), "model")
+    store.append([2], [[0, 0]])
+    tweets = pd.DataFrame({
+        "id": [1, 2, 3, 4, 1],
+        "clean_text": ["a b c", "b", "c d", "d", "a"]
+    })
+    embedder = LengthEmbedder()
+
+    assert embed_tweets(tweets, embedder, store, batch_size=2, flush_rows=2) == 3
+    assert embedder.batches == [2, 1]
+    np.testing.assert_array_equal(store.ids, [2, 1, 3, 4])
+    np.testing.assert_allclose(store.matrix([1, 3, 4]), [[3, 97], [2, 99], [1, 100]])
+    assert embed_tweets(tweets, embedder, store) == 0
+
+def test_import_embedding_csv(tmp_path):
+    csv_path = tmp_path / "07_tweet_embedding.csv"
+    pd.DataFrame({
+        "tweet_id": [5, 6, 7],
+        "clean_text": ["up", "down", "flat"],
+        "embeddings": ["[0.5, -1.0]", "[1e-05, 2.0]", None]
+    }).to_csv(csv_path)
+    store = EmbeddingStore(str(tmp_path / "store"), "text-embedding-3-small")
+
+    assert import_embedding_csv(str(csv_path), store, chunk_rows=1) == 2
+    np.testing.assert_allclose(store.matrix([5, 6]), [[0.5, -1.0], [1e-05, 2.0]])
@@ -1,8 +1,12 @@
+from contextlib import nullcontext
 import os
 import pandas as pd
+import pyarrow.parquet as pq
 import pytest
 from unittest.mock import patch
-from export_taq_to_parquet import export_taq_to_parquet
+from export_taq_to_parquet import export_taq_to_parquet, read_taq_chunks
+from taq_manifest import load_manifest
+from taq_filters import TradeFilters
 
 @pytest.fixture
 def mock_input_folder(tmp_path):
@@ -56,3 +60,277 @@ def test_export_taq_to_parquet_read_csv_error(mock_read_csv, mock_input_folder,
             chunksize=10**5,
             compression='snappy'
         )
+
+def test_export_taq_to_parquet_merges_minutes_across_chunks(mock_input_folder, mock_output_folder):
+    data = {
+        "DATE": ["2023-01-01"] * 4,
+        "TIME_M": ["12:00:01", "12:00:30", "12:00:59", "12:01:00"],
+        "SYM_ROOT": ["AAPL"] * 4,
+        "PRICE": [150.0, 151.0, 155.0, 160.0],
+    }
+    pd.DataFrame(data).to_csv(mock_input_folder / "test.csv", index=False)
+
+    export_taq_to_parquet(
+        input_folder=mock_input_folder,
+        output_folder=mock_output_folder,
+        chunksize=2,
+        compression='snappy'
+    )
+
+    result = pd.read_parquet(mock_output_folder).sort_values('timestamp')
+    assert list(result['avg_price']) == [152.0, 160.0]
+
+def test_export_taq_to_parquet_writes_each_minute_once(mock_input_folder, mock_output_folder):
+    for day in ["2023-01-02", "2023-01-03"]:
+        data = {
+            "DATE": [day] * 3,
+            "TIME_M": ["09:30:00", "09:30:10", "09:31:00"],
+            "SYM_ROOT": ["AAPL", "MSFT", "AAPL"],
+            "PRICE": [150.0, 300.0, 151.0],
+        }
+        pd.DataFrame(data).to_csv(mock_input_folder / f"{day}.csv", index=False)
+
+    export_taq_to_parquet(
+        input_folder=mock_input_folder,
+        output_folder=mock_output_folder,
+        chunksize=1,
+        compression='snappy',
+        flush_rows=2
+    )
+
+    result = pd.read_parquet(mock_output_folder)
+    assert len(result) == 6
+    assert not result.duplicated(['SYM_ROOT', 'timestamp']).any()
+
+def test_export_taq_to_parquet_workers_match_serial(tmp_path, mock_input_folder):
+    for day in ["2023-01-02", "2023-01-03", "2023-01-04"]:
+        data = {
+            "DATE": [day] * 5,
+            "TIME_M": ["09:30:00", "09:30:10", "09:30:59", "09:31:00", "09:32:30"],
+            "SYM_ROOT": ["AAPL", "MSFT", "AAPL", "AAPL", "MSFT"],
+            "PRICE": [150.0, 300.0, 150.5, 151.0, 301.25],
+        }
+        pd.DataFrame(data).to_csv(mock_input_folder / f"{day}.csv", index=False)
+
+    outputs = {}
+    for workers in [1, 2]:
+        output = tmp_path / f"output_{workers}"
+        export_taq_to_parquet(
+            input_folder=mock_input_folder,
+            output_folder=output,
+            chunksize=2,
+            compression='snappy',
+            flush_rows=3,
+            workers=workers
+        )
+        outputs[workers] = {
+            path.relative_to(output): path.read_bytes()
+            for path in output.rglob("*.parquet")
+        }
+
+    assert outputs[1] == outputs[2]
+
+@pytest.mark.parametrize("times", [
+    ["9:30:00.123456789", "9:30:10.000000000", "9:30:59.999000000",
+     "9:31:00.000000000", "16:00:00.500000000"],
+    ["09:30:00.123456789", "09:30:10.000000000", "09:30:59.999000000",
+     "09:31:00.000000000", "16:00:00.500000000"],
+])
+def test_export_taq_to_parquet_pyarrow_engine_matches_pandas(tmp_path, mock_input_folder, times):
+    data = {
+        "DATE": ["2023-01-03"] * 5,
+        "TIME_M": times,
+        "SYM_ROOT": ["AAPL", "MSFT", "AAPL", "AAPL", "MSFT"],
+        "PRICE": [150.0, 300.0, 150.5, 151.0, 301.25],
+        "EX": ["N", "Q", "N", "N", "Q"],
+    }
+    pd.DataFrame(data).to_csv(mock_input_folder / "test.csv", index=False)
+
+    results = {}
+    for engine in ['pandas', 'pyarrow']:
+        output = tmp_path / f"output_{engine}"
+        export_taq_to_parquet(
+            input_folder=mock_input_folder,
+            output_folder=output,
+            engine=engine
+        )
+        results[engine] = (
+            pd.read_parquet(output)
+            .sort_values(['SYM_ROOT', 'timestamp'])
+            .reset_index(drop=True)
+        )
+
+    pd.testing.assert_frame_equal(results['pandas'], results['pyarrow'])
+
+def test_export_taq_to_parquet_unknown_engine(mock_input_folder, mock_output_folder, mock_csv_file):
+    with pytest.raises(ValueError, match="Unknown engine"):
+        export_taq_to_parquet(
+            input_folder=mock_input_folder,
+            output_folder=mock_output_folder,
+            engine='polars'
+        )
+
+def write_day(folder, day, prices):
+    data = {
+        "DATE": [day] * len(prices),
+        "TIME_M": [f"09:{30 + i}:00" for i in range(len(prices))],
+        "SYM_ROOT": ["AAPL"] * len(prices),
+        "PRICE": prices,
+    }
+    pd.DataFrame(data).to_csv(folder / f"{day}.csv", index=False)
+
+def test_export_taq_to_parquet_rerun_is_noop(mock_input_folder, mock_output_folder, mock_csv_file):
+    export_taq_to_parquet(mock_input_folder, mock_output_folder)
+
+    with patch("export_taq_to_parquet.iter_partial_buckets") as mock_iter:
+        export_taq_to_parquet(mock_input_folder, mock_output_folder)
+        mock_iter.assert_not_called()
+
+def test_export_taq_to_parquet_processes_only_new_files(mock_input_folder, mock_output_folder):
+    write_day(mock_input_folder, "2023-01-02", [1.0, 2.0])
+    export_taq_to_parquet(mock_input_folder, mock_output_folder)
+
+    write_day(mock_input_folder, "2023-01-03", [3.0])
+    with patch("export_taq_to_parquet.read_taq_chunks",
+               wraps=read_taq_chunks) as mock_read:
+        export_taq_to_parquet(mock_input_folder, mock_output_folder)
+        assert mock_read.call_count == 1
+        assert mock_read.call_args[0][0].endswith("2023-01-03.csv")
+
+    result = pd.read_parquet(mock_output_folder).sort_values('timestamp')
+    assert list(result['avg_price']) == [1.0, 2.0, 3.0]
+
+def test_export_taq_to_parquet_replaces_changed_and_removed_files(mock_input_folder, mock_output_folder):
+    write_day(mock_input_folder, "2023-01-02", [1.0, 2.0])
+    write_day(mock_input_folder, "2023-01-03", [3.0])
+    export_taq_to_parquet(mock_input_folder, mock_output_folder)
+
+    write_day(mock_input_folder, "2023-01-02", [10.0])
+    os.remove(mock_input_folder / "2023-01-03.csv")
+    export_taq_to_parquet(mock_input_folder, mock_output_folder)
+
+    result = pd.read_parquet(mock_output_folder)
+    assert list(result['avg_price']) == [10.0]
+    assert len(os.listdir(mock_output_folder / "SYM_ROOT=AAPL" / "year=2023")) == 1
+
+def fail_second_swap(real_replace):
+    swaps = []
+    def replace(source, target):
+        if ".rewritten" in str(source):
+            swaps.append(source)
+            if len(swaps) == 2:
+                raise OSError("disk gone")
+        return real_replace(source, target)
+    return replace
+
+def dataset_rows(output_folder):
+    return sorted(pd.read_parquet(output_folder)["avg_price"])
+
+@pytest.mark.parametrize("killed", [False, True])
+def test_export_taq_to_parquet_reverts_interrupted_rewrite(mock_input_folder, mock_output_folder, killed):
+    write_day(mock_input_folder, "2022-12-30", [1.0])
+    write_day(mock_input_folder, "2023-01-03", [2.0])
+    export_taq_to_parquet(mock_input_folder, mock_output_folder)
+    manifest = load_manifest(mock_output_folder)
+
+    # Both year partitions are rewritten; the swap fails after the first one.
+    write_day(mock_input_folder, "2022-12-30", [10.0])
+    write_day(mock_input_folder, "2023-01-03", [20.0])
+    with patch("export_taq_to_parquet.os.replace", side_effect=fail_second_swap(os.replace)), \
+            patch("export_taq_to_parquet.close_staging") if killed else nullcontext():
+        with pytest.raises(OSError, match="disk gone"):
+            export_taq_to_parquet(mock_input_folder, mock_output_folder)
+
+    if killed:
+        # A killed run leaves its staging folder and a half-swapped dataset;
+        # the next run reverts the swap first.
+        assert dataset_rows(mock_output_folder) == [10.0]
+        with patch("export_taq_to_parquet.plan_changes", side_effect=RuntimeError):
+            with pytest.raises(RuntimeError):
+                export_taq_to_parquet(mock_input_folder, mock_output_folder)
+
+    assert load_manifest(mock_output_folder) == manifest
+    assert dataset_rows(mock_output_folder) == [1.0, 2.0]
+    assert [name for name in os.listdir(mock_output_folder) if name.startswith(".")] == []
+
+    export_taq_to_parquet(mock_input_folder, mock_output_folder)
+    assert dataset_rows(mock_output_folder) == [10.0, 20.0]
+
+def test_export_taq_to_parquet_append_adds_fragments(mock_input_folder, mock_output_folder):
+    write_day(mock_input_folder, "2023-01-02", [1.0])
+    export_taq_to_parquet(mock_input_folder, mock_output_folder, append=True)
+    write_day(mock_input_folder, "2023-01-03", [2.0])
+    export_taq_to_parquet(mock_input_folder, mock_output_folder, append=True)
+
+    assert len(os.listdir(mock_output_folder / "SYM_ROOT=AAPL" / "year=2023")) == 2
+    assert sorted(pd.read_parquet(mock_output_folder)['avg_price']) == [1.0, 2.0]
+
+    write_day(mock_input_folder, "2023-01-03", [5.0])
+    with pytest.raises(ValueError, match="Append mode"):
+        export_taq_to_parquet(mock_input_folder, mock_output_folder, append=True)
+
+def test_export_taq_to_parquet_bar_fields(mock_input_folder, mock_output_folder):
+    data = {
+        "DATE": ["2023-01-03"] * 3,
+        "TIME_M": ["09:30:00", "09:30:20", "09:30:40"],
+        "SYM_ROOT": ["AAPL"] * 3,
+        "SIZE": [100, 100, 200],
+        "PRICE": [10.0, 13.0, 11.0],
+    }
+    pd.DataFrame(data).to_csv(mock_input_folder / "test.csv", index=False)
+
+    export_taq_to_parquet(
+        mock_input_folder, mock_output_folder, chunksize=1, engine='pyarrow',
+        bar_width='5min', fields=['open', 'high', 'close', 'vwap', 'trade_count'])
+
+    result = pd.read_parquet(mock_output_folder)
+    assert list(result.columns[:6]) == ['timestamp', 'open', 'high', 'close', 'vwap', 'trade_count']
+    assert result.iloc[0][['open', 'high', 'close', 'vwap', 'trade_count']].tolist() == [
+        10.0, 13.0, 11.0, 11.25, 3]
+
+    write_day(mock_input_folder, "2023-01-04", [1.0])
+    with pytest.raises(ValueError, match="different layout"):
+        export_taq_to_parquet(mock_input_folder, mock_output_folder)
+
+@pytest.mark.parametrize("engine", ["pandas", "pyarrow"])
+def test_export_taq_to_parquet_filters_trades(mock_input_folder, mock_output_folder, engine):
+    data = {
+        "DATE": ["2023-01-03"] * 4,
+        "TIME_M": ["09:30:00", "09:30:10", "09:30:20", "09:30:30"],
+        "EX": ["N", "N", "D", "N"],
+        "SYM_ROOT": ["AAPL", "AAPL", "AAPL", "MSFT"],
+        "TR_SCOND": ["@", "@ Z", "@", "@"],
+        "PRICE": [10.0, 99.0, 98.0, 300.0],
+    }
+    pd.DataFrame(data).to_csv(mock_input_folder / "test.csv", index=False)
+    filters = TradeFilters(
+        exclude_conditions=["Z"], exclude_exchanges=["D"], include_symbols=["AAPL"])
+
+    export_taq_to_parquet(mock_input_folder, mock_output_folder, engine=engine, filters=filters)
+
+    result = pd.read_parquet(mock_output_folder)
+    assert result["avg_price"].tolist() == [10.0]
+    assert result["SYM_ROOT"].astype(str).tolist() == ["AAPL"]
+
+    write_day(mock_input_folder, "2023-01-04", [1.0])
+    with pytest.raises(ValueError, match="different layout"):
+        export_taq_to_parquet(mock_input_folder, mock_output_folder, engine=engine)
+
+def test_export_taq_to_parquet_row_groups_and_compaction(mock_input_folder, mock_output_folder):
+    write_day(mock_input_folder, "2023-01-03", [3.0, 4.0, 5.0])
+    export_taq_to_parquet(mock_input_folder, mock_output_folder, append=True, row_group_size=2)
+    write_day(mock_input_folder, "2023-01-02", [1.0, 2.0])
+    export_taq_to_parquet(
+        mock_input_folder, mock_output_folder, append=True, row_group_size=2, compact=True)
+
+    partition = mock_output_folder / "SYM_ROOT=AAPL" / "year=2023"
+    assert os.listdir(partition) == ["part-00000-0.parquet"]
+
+    parquet_file = pq.ParquetFile(partition / "part-00000-0.parquet")
+    assert parquet_file.metadata.num_row_groups == 3
+    assert parquet_file.metadata.row_group(0).column(0).has_column_index
+
+    window = pd.read_parquet(
+        mock_output_folder,
+        filters=[("timestamp", ">=", pd.Timestamp("2023-01-03 09:31"))])
+    assert list(window["avg_price"]) == [4.0, 5.0]
@@ -0,0 +1,64 @@
+import pandas as pd
+from finbert_sentiment import score_sentiment
+from inference_cache import InferenceCache
+from scoring_output import ResultWriter, read_table
+
+class WordScorer:
+    """Stand-in for FinbertScorer: one token per word, labels by length."""
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts):
+        return [[1] * len(text.split()) for text in texts]
+
+    def predict(self, input_ids):
+        self.batches.append([len(ids) for ids in input_ids])
+        labels = ["Positive" if len(ids) % 2 else "Neutral" for ids in input_ids]
+        return labels, [len(ids) / 10 for ids in input_ids]
+
+def make_tweets(texts):
+    return pd.DataFrame({"id": range(1, len(texts) + 1), "clean_text": texts})
+
+def test_score_sentiment_writes_every_tweet(tmp_path):
+    tweets = make_tweets(["a b c", "a", "a b c d e", None, "a b"])
+    scorer = WordScorer()
+    output_path = str(tmp_path / "tweets_with_sentiment.csv")
+
+    assert score_sentiment(tweets, scorer, ResultWriter(output_path), batch_size=2,
+                           flush_rows=2) == 5
+
+    assert scorer.batches == [[0, 1], [2, 3], [5]]
+    scored = read_table(output_path).sort_values("id")
+    assert scored["sentiment_label"].tolist() == [
+        "Positive", "Positive", "Positive", "Neutral", "Neutral"]
+    assert scored["sentiment_score"].tolist() == [0.3, 0.1, 0.5, 0.0, 0.2]
+
+def test_score_sentiment_resumes_by_id(tmp_path):
+    tweets = make_tweets(["a b c", "a", "a b c d e", "a b"])
+    output_path = str(tmp_path / "tweets_with_sentiment.parquet")
+    score_sentiment(tweets.iloc[:2], WordScorer(), ResultWriter(output_path))
+
+    scorer = WordScorer()
+    assert score_sentiment(tweets, scorer, ResultWriter(output_path)) == 2
+    assert scorer.batches == [[2, 5]]
+    assert sorted(read_table(output_path)["id"]) == [1, 2, 3, 4]
+
+def test_score_sentiment_scores_each_text_once(tmp_path):
+    tweets = make_tweets(["RT @a: up", "a b", "RT @a:  up", "a b c"])
+    cache = InferenceCache(str(tmp_path / "cache.sqlite"), "finbert", "abc123")
+    scorer = WordScorer()
+    output_path = str(tmp_path / "first.csv")
+
+    score_sentiment(tweets.iloc[:3], scorer, ResultWriter(output_path), cache)
+    assert scorer.batches == [[2, 3]]
+    assert read_table(output_path).sort_values("id")["sentiment_label"].tolist() == [
+        "Positive", "Neutral", "Positive"]
+
+    # A refresh only runs the new text through the model.
+    scorer = WordScorer()
+    output_path = str(tmp_path / "second.csv")
+    score_sentiment(tweets, scorer, ResultWriter(output_path), cache)
+    assert scorer.batches == [[3]]
+    scored = read_table(output_path).sort_values("id")
+    assert scored["sentiment_score"].tolist() == [0.3, 0.2, 0.3, 0.3]
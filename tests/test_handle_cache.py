@@ -0,0 +1,21 @@
+import os
+from handle_cache import HandleCache
+
+def test_handle_cache_expiration(tmp_path):
+    cache = HandleCache(tmp_path / "cache.json", ttl=100, negative_ttl=10)
+    cache.put('ElonMusk', '44196397', now=1000)
+    cache.put('nobody', None, now=1000)
+
+    assert cache.get('elonmusk', now=1050) == (True, '44196397')
+    assert cache.get('nobody', now=1005) == (True, None)
+    assert cache.get('nobody', now=1011) == (False, None)
+    assert cache.get('elonmusk', now=1101) == (False, None)
+    assert cache.get('unknown', now=1000) == (False, None)
+
+def test_handle_cache_persists(tmp_path):
+    cache = HandleCache(tmp_path / "cache.json")
+    cache.put('elonmusk', '44196397')
+    cache.save()
+
+    assert HandleCache(tmp_path / "cache.json").get('elonmusk') == (True, '44196397')
+    assert os.listdir(tmp_path) == ['cache.json']
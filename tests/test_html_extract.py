@@ -0,0 +1,73 @@
+import os
+import pytest
+from benchmark_html_extract import benchmark_page
+from html_extract import (
+    FIGURE_CARD,
+    TWEET_CARD,
+    available_backends,
+    extract_links
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r', encoding='UTF-8') as page_file:
+        return page_file.read()
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_extract_links_tweets_page(backend):
+    links = extract_links(read_fixture('polititweet_tweets.html'), TWEET_CARD, backend)
+
+    assert links.has_grid
+    assert len(links.cards) == 50
+    assert links.cards[0][0].startswith('/tweet?account=44196397&tweet=')
+    assert links.next_href == '?account=44196397&page=3'
+    assert not links.next_disabled
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_extract_links_figures_page(backend):
+    links = extract_links(read_fixture('polititweet_figures.html'), FIGURE_CARD, backend)
+
+    assert len(links.cards) == 48
+    assert links.cards[1][1] == '/figures/realDonaldTrump'
+    assert links.next_href == '/figures?search=e&page=3'
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_extract_links_edge_cases(backend):
+    html = '''
+    <a class="box tweet-card" href="/outside"></a>
+    <div class="columns grid">
+        <div><a class="box tweet-card" href="/tweet/1"></a></div>
+        <a class="box tweet-card is-deleted" href="/tweet/2"></a>
+        <a class="box  tweet-card" href="/tweet/3"><span>no link</span></a>
+    </div>
+    <div class="grid"><a class="box tweet-card" href="/second-grid"></a></div>
+    <a class="pagination-next" href="?page=1">Previous</a>
+    <a class="pagination-next" disabled href="?page=2">Next</a>
+    '''
+    links = extract_links(html, TWEET_CARD, backend)
+
+    assert links.cards == [('/tweet/1', None), ('/tweet/3', None)]
+    assert links.next_href == '?page=2'
+    assert links.next_disabled
+
+    links = extract_links('<div class="no-grid"></div>', TWEET_CARD, backend)
+    assert links == (False, [], None, False)
+
+def test_extract_links_selectolax_matches_stream():
+    pytest.importorskip('selectolax.lexbor')
+    assert 'selectolax' in available_backends()
+
+    for name, card_class in [('polititweet_tweets.html', TWEET_CARD),
+                             ('polititweet_figures.html', FIGURE_CARD)]:
+        html = read_fixture(name)
+        assert extract_links(html, card_class, 'selectolax') == \
+            extract_links(html, card_class, 'stream')
+
+def test_extract_links_unknown_backend():
+    with pytest.raises(ValueError, match='not available'):
+        extract_links('', TWEET_CARD, backend='regex')
+
+def test_benchmark_page():
+    timings = benchmark_page(read_fixture('polititweet_figures.html'), FIGURE_CARD, repeat=1)
+    assert set(timings) == set(available_backends())
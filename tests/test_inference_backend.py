@@ -0,0 +1,16 @@
+import pytest
+from inference_backend import backend_revision, load_model, onnx_model_path
+
+def test_backend_revision_tags_other_backends():
+    assert backend_revision("abc123", "fp32") == "abc123"
+    assert backend_revision("abc123", "int8") == "abc123+int8"
+    assert backend_revision("abc123", "onnx") == "abc123+onnx"
+
+def test_onnx_model_path_is_safe_for_a_file_name(tmp_path):
+    path = onnx_model_path(str(tmp_path), "yiyanghkust/finbert-tone", "4921590d3c0c3832c0efea24c8381ce0bda7844b")
+    assert path == str(tmp_path / "yiyanghkust_finbert-tone-4921590d3c0c.onnx")
+    assert onnx_model_path("models", "./local model", "").endswith("local_model-local.onnx")
+
+def test_load_model_rejects_unknown_backends():
+    with pytest.raises((ValueError, ImportError)):
+        load_model(object, "yiyanghkust/finbert-tone", backend="fp16")
@@ -0,0 +1,37 @@
+import numpy as np
+from inference_cache import CacheEntry, InferenceCache, text_hash
+
+def test_text_hash_ignores_whitespace():
+    assert text_hash("RT @a: to  the\tmoon ") == text_hash("RT @a: to the moon")
+    assert text_hash("RT @a: to the moon") != text_hash("rt @a: to the moon")
+    assert len(text_hash("")) == 16
+
+def test_inference_cache_round_trip(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = InferenceCache(path, "finbert", "abc123")
+    cache.put_many({
+        text_hash("up"): CacheEntry("Positive", 0.9, None),
+        text_hash("tech"): CacheEntry("Technology", 0.8, [0.8, 0.1]),
+    })
+    cache.close()
+
+    cache = InferenceCache(path, "finbert", "abc123")
+    entries = cache.get_many([text_hash("up"), text_hash("tech"), text_hash("new")])
+    assert set(entries) == {text_hash("up"), text_hash("tech")}
+    assert entries[text_hash("up")] == CacheEntry("Positive", 0.9, None)
+    assert entries[text_hash("tech")].label == "Technology"
+    np.testing.assert_allclose(entries[text_hash("tech")].vector, [0.8, 0.1], rtol=1e-6)
+
+def test_inference_cache_is_keyed_by_model_and_revision(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    InferenceCache(path, "finbert", "abc123").put_many({text_hash("up"): CacheEntry("Positive", 0.9, None)})
+
+    assert not InferenceCache(path, "finbert", "def456").get_many([text_hash("up")])
+    assert not InferenceCache(path, "bart", "abc123").get_many([text_hash("up")])
+
+def test_inference_cache_looks_up_many_texts(tmp_path):
+    cache = InferenceCache(str(tmp_path / "cache.sqlite"), "finbert", None)
+    hashes = [text_hash(str(i)) for i in range(1200)]
+    cache.put_many({key: CacheEntry("Neutral", 0.5, None) for key in hashes[::2]})
+
+    assert set(cache.get_many(hashes)) == set(hashes[::2])
@@ -0,0 +1,83 @@
+import ast
+import pandas as pd
+import pytest
+from normalize_tweets import (
+    NORMALIZED_COLUMNS,
+    normalize_timestamps,
+    normalize_tweets,
+    parse_user_payloads,
+    read_raw_tweets,
+    write_tweets
+)
+
+USERS = [
+    "{'id': 44196397, 'id_str': '44196397', 'name': \"Elon's\", 'screen_name': 'elonmusk'}",
+    '{"id": 12, "name": "jack", "screen_name": "jack"}',
+    None,
+    "not a dictionary",
+]
+
+@pytest.fixture
+def raw_tweets():
+    return pd.DataFrame({
+        "id": [1, 2, 3, 2, 4, 5],
+        "user": [USERS[0], USERS[1], USERS[0], USERS[1], USERS[1], USERS[0]],
+        "text": ["hello\nworld\r", "RT @a: Same  text", "no time", "RT @a: Same  text",
+                 "RT @a: same text ", None],
+        "lang": ["en", "en", "en", "en", "en", "en"],
+        "timestamp_ms": [1671128869597, None, None, None, None, 1671128869000],
+        "created_at": ["Wed Oct 10 20:19:24 +0000 2018", "Wed Oct 10 21:19:24 +0200 2018",
+                       None, "Wed Oct 10 21:19:24 +0200 2018",
+                       "2018-10-11T20:19:24Z", None],
+    })
+
+def test_parse_user_payloads_matches_literal_eval():
+    users = parse_user_payloads(pd.Series(USERS))
+    for payload, (user_id, handle) in zip(USERS[:2], users.itertuples(index=False)):
+        expected = ast.literal_eval(payload)
+        assert user_id == expected["id"]
+        assert handle == expected["screen_name"]
+    assert users.iloc[2:].isna().all().all()
+
+def test_normalize_timestamps_prefers_timestamp_ms(raw_tweets):
+    timestamps = normalize_timestamps(raw_tweets)
+    assert timestamps[0] == pd.Timestamp("2022-12-15 18:27:49.597", tz="UTC")
+    assert timestamps[1] == pd.Timestamp("2018-10-10 19:19:24", tz="UTC")
+    assert pd.isna(timestamps[2])
+    assert timestamps[4] == pd.Timestamp("2018-10-11 20:19:24", tz="UTC")
+
+def test_normalize_tweets_cleans_and_dedupes(raw_tweets):
+    tweets = normalize_tweets(raw_tweets)
+    assert tweets.columns.tolist() == NORMALIZED_COLUMNS
+    # 3 has no time, the second 2 is a copy and 4 repeats the retweet of 2.
+    assert tweets["id"].tolist() == [1, 2, 5]
+    assert tweets["user_id"].tolist() == [44196397, 12, 44196397]
+    assert tweets["handle"].tolist() == ["elonmusk", "jack", "elonmusk"]
+    assert tweets["clean_text"].tolist() == ["hello world", "RT @a: Same  text", ""]
+    assert tweets["is_retweet"].tolist() == [False, True, False]
+
+def test_normalize_tweets_reads_flattened_records(tmp_path):
+    raw = pd.DataFrame({
+        "id": [7],
+        "user_id": [12],
+        "user_screen_name": ["jack"],
+        "text": ["just setting up my twttr"],
+        "lang": ["en"],
+        "created_at": pd.to_datetime(["2006-03-21 20:50:14"], utc=True),
+        "retweeted_status_id": [None],
+    })
+    raw.to_parquet(tmp_path / "12.parquet", index=False)
+
+    tweets = normalize_tweets(read_raw_tweets(str(tmp_path / "12.parquet")))
+    assert tweets[["id", "user_id", "handle"]].values.tolist() == [[7, 12, "jack"]]
+    assert tweets["timestamp"][0] == pd.Timestamp("2006-03-21 20:50:14", tz="UTC")
+
+def test_write_tweets_round_trip(tmp_path, raw_tweets):
+    raw_tweets.to_csv(tmp_path / "raw.csv", index=False)
+    tweets = normalize_tweets(read_raw_tweets(str(tmp_path / "raw.csv")))
+
+    write_tweets(tweets, str(tmp_path / "tweets.parquet"))
+    pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / "tweets.parquet"), tweets)
+
+    write_tweets(tweets, str(tmp_path / "tweets.csv"))
+    assert pd.read_csv(tmp_path / "tweets.csv")["id"].tolist() == [1, 2, 5]
@@ -1,8 +1,18 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import tempfile
+import threading
 import unittest
 from unittest.mock import patch, mock_open, MagicMock
 from bs4 import BeautifulSoup
 
+import pandas as pd
+
+from async_http import AsyncHttpClient
+from crawl_state import load_crawl_state
 from read_tweets import (
+    crawl_account_async,
     extract_tweet_data,
     scrape_page,
     scrape_polititweet,
@@ -10,6 +20,35 @@ from read_tweets import (
     BASE_URL
 )
 
+PAGES = {
+    '/tweets?account=1': (['/tweet/4?id=4', '/tweet/3?id=3'], '?account=1&page=2'),
+    '/tweets?account=1&page=2': (['/tweet/2?id=2', '/tweet/404?id=404', '/tweet/1?id=1'], None)
+}
+
+
+class PolititweetHandler(BaseHTTPRequestHandler):
+    """Stand-in for the Polititweet pages and tweet JSON."""
+
+    def do_GET(self):
+        if self.path in PAGES:
+            hrefs, next_href = PAGES[self.path]
+            cards = ''.join(f'<a class="box tweet-card" href="{href}"></a>' for href in hrefs)
+            body = f'<div class="grid">{cards}</div>'
+            if next_href:
+                body += f'<a class="pagination-next" href="{next_href}">Next</a>'
+        elif self.path.startswith('/tweet/') and not self.path.startswith('/tweet/404'):
+            body = json.dumps({'id': int(self.path.split('/')[2].split('?')[0])})
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(body.encode('UTF-8'))
+
+    def log_message(self, *args):
+        pass
+
 
 class TestReadTweets(unittest.TestCase):
 
@@ -63,29 +102,28 @@ class TestReadTweets(unittest.TestCase):
         self.assertEqual(tweets[0]['id'], "12345")
         self.assertEqual(tweets[1]['id'], "67890")
 
-    @patch('read_tweets.scrape_polititweet')
+    @patch('read_tweets.time.sleep')
+    @patch('read_tweets.crawl_account')
+    @patch('read_tweets.load_crawl_state')
     @patch('builtins.open', new_callable=mock_open)
-    @patch('pandas.DataFrame.to_csv')
-    def test_scrape_all_tweets(self, mock_to_csv, mock_open_file, mock_scrape_polititweet):
+    def test_scrape_all_tweets(self, mock_open_file, mock_load_state, mock_crawl_account, _):
         # Mock CSV file content
         mock_open_file.return_value.__enter__.return_value = iter([
             "account_id\n",
             "test_account_1\n",
             "test_account_2\n"
         ])
-
-        # Mock scrape_polititweet behavior
-        mock_scrape_polititweet.side_effect = [
-            [{"id": "12345", "text": "Tweet 1"}],
-            [{"id": "67890", "text": "Tweet 2"}]
-        ]
+        state = {'accounts': {}}
+        mock_load_state.return_value = state
 
         scrape_all_tweets("test_accounts.csv", "output_folder", max_pages=1)
 
-        # Check if DataFrame.to_csv was called twice
-        self.assertEqual(mock_to_csv.call_count, 2)
-        mock_to_csv.assert_any_call('output_folder/test_account_1.csv', index=False)
-        mock_to_csv.assert_any_call('output_folder/test_account_2.csv', index=False)
+        # Check that every account was crawled into the output folder
+        self.assertEqual(mock_crawl_account.call_count, 2)
+        mock_crawl_account.assert_any_call(
+            'test_account_1', 'output_folder', state, max_pages=1, sink_format='csv')
+        mock_crawl_account.assert_any_call(
+            'test_account_2', 'output_folder', state, max_pages=1, sink_format='csv')
 
     @patch('read_tweets.requests.get')
     def test_scrape_page_failure(self, mock_get):
@@ -114,6 +152,55 @@ class TestReadTweets(unittest.TestCase):
         tweets = extract_tweet_data(soup)
         self.assertIsNone(tweets)
 
+    def run_against_server(self, coroutine_function):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), PolititweetHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        async def run():
+            async with AsyncHttpClient(concurrency=4, per_host=4, rate=100) as client:
+                return await coroutine_function(client)
+
+        try:
+            with patch('read_tweets.BASE_URL', f'http://127.0.0.1:{server.server_address[1]}'):
+                return asyncio.run(run())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_crawl_account_async(self):
+        with tempfile.TemporaryDirectory() as output_folder:
+            state = load_crawl_state(output_folder)
+            self.run_against_server(
+                lambda client: crawl_account_async(client, '1', output_folder, state))
+
+            # Tweets keep the page order and failed fetches are skipped.
+            self.assertEqual(pd.read_csv(f'{output_folder}/1.csv')['id'].tolist(), [4, 3, 2, 1])
+            self.assertEqual(load_crawl_state(output_folder)['accounts']['1']['newest_id'], 4)
+
+    def test_crawl_account_async_resumes_and_refreshes(self):
+        with tempfile.TemporaryDirectory() as output_folder:
+            def crawl(max_pages=None):
+                state = load_crawl_state(output_folder)
+                self.run_against_server(lambda client: crawl_account_async(
+                    client, '1', output_folder, state, max_pages))
+                return pd.read_csv(f'{output_folder}/1.csv')['id'].tolist()
+
+            # An interrupted crawl resumes from the page where it stopped.
+            self.assertEqual(crawl(max_pages=1), [4, 3])
+            self.assertEqual(
+                load_crawl_state(output_folder)['accounts']['1']['cursor'], '?account=1&page=2')
+            self.assertEqual(crawl(), [4, 3, 2, 1])
+            self.assertEqual(load_crawl_state(output_folder)['accounts']['1']['newest_id'], 4)
+
+            # A refresh only appends the tweets newer than the high-water mark.
+            new_page = (['/tweet/5?id=5', '/tweet/4?id=4'], '?account=1&page=2')
+            with patch.dict(PAGES, {'/tweets?account=1': new_page}):
+                self.assertEqual(crawl(), [4, 3, 2, 1, 5])
+
+            state = load_crawl_state(output_folder)['accounts']['1']
+            self.assertEqual(state['newest_id'], 5)
+            self.assertIsNone(state['cursor'])
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,63 @@
+import json
+import os
+import pandas as pd
+import pytest
+from scoring_output import CHECKPOINT_SUFFIX, ResultWriter, length_batches, read_table
+
+def results(ids):
+    return pd.DataFrame({"id": ids, "score": [i / 10 for i in ids]})
+
+@pytest.mark.parametrize("name", ["scored.csv", "scored.parquet"])
+def test_result_writer_appends_and_resumes(tmp_path, name):
+    output_path = str(tmp_path / name)
+    writer = ResultWriter(output_path)
+    assert writer.scored_ids().empty
+
+    writer.write(results([1, 2]))
+    writer.write(results([]))
+    writer.write(results([3]))
+
+    resumed = ResultWriter(output_path)
+    assert resumed.scored_ids().tolist() == [1, 2, 3]
+    pd.testing.assert_frame_equal(read_table(output_path), results([1, 2, 3]))
+
+@pytest.mark.parametrize("name", ["scored.csv", "scored.parquet"])
+def test_result_writer_drops_uncommitted_output(tmp_path, name):
+    output_path = str(tmp_path / name)
+    writer = ResultWriter(output_path)
+    writer.write(results([1, 2]))
+    committed = writer.committed
+
+    # A crash after writing, before the checkpoint is saved.
+    writer.write(results([3]))
+    with open(output_path + CHECKPOINT_SUFFIX, "w", encoding="UTF-8") as checkpoint_file:
+        json.dump({"committed": committed}, checkpoint_file)
+
+    assert ResultWriter(output_path).scored_ids().tolist() == [1, 2]
+
+@pytest.mark.parametrize("name", ["scored.csv", "scored.parquet"])
+def test_result_writer_refuses_output_without_checkpoint(tmp_path, name):
+    output_path = str(tmp_path / name)
+    ResultWriter(output_path).write(results([1, 2]))
+    os.remove(output_path + CHECKPOINT_SUFFIX)
+
+    with pytest.raises(FileExistsError, match="--overwrite"):
+        ResultWriter(output_path)
+    pd.testing.assert_frame_equal(read_table(output_path), results([1, 2]))
+
+    writer = ResultWriter(output_path, overwrite=True)
+    assert writer.scored_ids().empty and not writer.has_output()
+
+def test_result_writer_only_touches_its_part_files(tmp_path):
+    output_path = str(tmp_path / "scored.parquet")
+    ResultWriter(output_path).write(results([1, 2]))
+    for name in ["data.parquet", "notes.txt", "part-00001.parquet", "part-00000.parquet.tmp"]:
+        (tmp_path / "scored.parquet" / name).write_bytes(b"x")
+
+    ResultWriter(output_path)
+
+    assert sorted(os.listdir(output_path)) == ["data.parquet", "notes.txt", "part-00000.parquet"]
+
+def test_length_batches_groups_similar_lengths():
+    batches = length_batches([[1] * 5, [1], [1] * 3, [1] * 2, [1] * 4], batch_size=2)
+    assert [batch.tolist() for batch in batches] == [[1, 3], [2, 4], [0]]
@@ -1,7 +1,7 @@
 import pandas as pd
 import pytest
 from unittest.mock import patch
-from split_large_files import split_large_files, estimate_bytes_per_row
+from split_large_files import first_record_end, last_record_end, plan_chunks, split_file, split_large_files
 
 @pytest.fixture
 def setup_test_environment(tmp_path):
@@ -21,11 +21,35 @@ def setup_test_environment(tmp_path):
 
     return test_dir, large_csv_path, small_csv_path
 
-def test_estimate_bytes_per_row():
-    # Test the estimate_bytes_per_row function
-    sample_df = pd.DataFrame({"col1": [1, 2, 3], "col2": ["a", "b", "c"]})
-    bytes_per_row = estimate_bytes_per_row(sample_df)
-    assert bytes_per_row > 0
+def test_last_record_end_skips_quoted_newlines():
+    data = b'1,"a\nb"\n2,"c\n\n""d"""\n3,e\n'
+    assert last_record_end(data, 0, len(data)) == len(data)
+    assert last_record_end(data, 0, len(data) - 1) == data.index(b"3,e")
+    assert last_record_end(data, 0, data.index(b"2,") + 6) == data.index(b"2,")
+    assert last_record_end(data, 0, 5) is None
+
+def test_plan_chunks_fills_the_maximum_size():
+    data = b"id,text\n" + b"".join(f'{i},"line\n{"x" * (i % 7)}"\n'.encode() for i in range(200))
+    header, chunks = plan_chunks(data, 100)
+    assert header == b"id,text\n"
+    assert b"".join(data[start:end] for start, end in chunks) == data[len(header):]
+    for (start, end), (next_start, _) in zip(chunks, chunks[1:]):
+        # Every chunk fits, and would not fit with the next record.
+        assert len(header) + end - start <= 100
+        assert len(header) + first_record_end(data, next_start) - start > 100
+
+def test_split_file_keeps_bytes_and_long_records(tmp_path):
+    rows = [b'1,1.10,"a ""quoted"" value"\r\n', b'2,2.00,"' + b"y" * 300 + b'"\r\n', b"3,3.0,z"]
+    path = tmp_path / "tweets.csv"
+    path.write_bytes(b"id,score,text\r\n" + b"".join(rows))
+
+    chunk_paths = split_file(str(path), max_file_size=64)
+
+    assert not path.exists()
+    assert [open(chunk, "rb").read() for chunk in chunk_paths] == [
+        b"id,score,text\r\n" + row for row in rows]
+    assert not list(tmp_path.glob("*.tmp"))
+    assert pd.concat(pd.read_csv(chunk) for chunk in chunk_paths)["score"].tolist() == [1.1, 2.0, 3.0]
 
 def test_split_large_files_splits_large_file(setup_test_environment):
     test_dir, large_csv_path, _ = setup_test_environment
@@ -40,6 +64,11 @@ def test_split_large_files_splits_large_file(setup_test_environment):
     # Check that the original file was removed
     assert not large_csv_path.exists()
 
+    # Check that the chunks hold every row once, under the maximum size
+    assert all(chunk.stat().st_size <= 1024 * 1024 for chunk in chunk_files)
+    chunks = pd.concat(pd.read_csv(chunk) for chunk in sorted(chunk_files))
+    assert sorted(chunks["col1"].tolist()) == list(range(100000))
+
 def test_split_large_files_skips_small_file(setup_test_environment):
     test_dir, _, small_csv_path = setup_test_environment
 
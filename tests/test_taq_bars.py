@@ -0,0 +1,66 @@
+import pandas as pd
+import pyarrow as pa
+import pytest
+from taq_bars import (
+    BAR_FIELDS,
+    aggregate_trades,
+    aggregate_trades_arrow,
+    buckets_to_frame,
+    check_bar_options,
+    merge_buckets
+)
+
+@pytest.fixture
+def trades():
+    return pd.DataFrame({
+        "timestamp": pd.to_datetime([
+            "2023-01-03 09:30:01", "2023-01-03 09:30:03", "2023-01-03 09:30:02",
+            "2023-01-03 09:30:59", "2023-01-03 09:31:04", "2023-01-03 09:30:30",
+        ]),
+        "SYM_ROOT": ["AAPL", "AAPL", "AAPL", "AAPL", "AAPL", "MSFT"],
+        "PRICE": [10.0, 12.0, 9.0, 11.0, 20.0, 300.0],
+        "SIZE": [100.0, 300.0, 100.0, 500.0, 10.0, 1.0],
+    })
+
+def test_aggregate_trades_builds_ohlcv(trades):
+    bars = buckets_to_frame(aggregate_trades(trades, '1min'), BAR_FIELDS)
+    first = bars.iloc[0]
+
+    assert len(bars) == 3
+    assert (first['open'], first['high'], first['low'], first['close']) == (10.0, 12.0, 9.0, 11.0)
+    assert first['avg_price'] == 10.5
+    assert first['vwap'] == (1000 + 3600 + 900 + 5500) / 1000
+    assert first['volume'] == 1000
+    assert first['trade_count'] == 4
+
+def test_aggregate_trades_bar_width(trades):
+    bars = buckets_to_frame(aggregate_trades(trades, '5s'), ['open', 'close'])
+    aapl = bars[bars['SYM_ROOT'] == 'AAPL']
+
+    assert list(aapl['timestamp'].dt.second) == [0, 55, 0]
+    assert (aapl.iloc[0]['open'], aapl.iloc[0]['close']) == (10.0, 12.0)
+
+def test_merge_buckets_matches_single_pass(trades):
+    whole = aggregate_trades(trades)
+    merged = merge_buckets(aggregate_trades(trades.iloc[:2]), aggregate_trades(trades.iloc[2:]))
+
+    pd.testing.assert_frame_equal(merged, whole)
+
+def test_aggregate_trades_arrow_matches_pandas(trades):
+    batch = pa.Table.from_pandas(trades, preserve_index=False)
+
+    pd.testing.assert_frame_equal(
+        aggregate_trades_arrow(batch, '5min'), aggregate_trades(trades, '5min'))
+
+def test_vwap_without_sizes(trades):
+    bars = buckets_to_frame(aggregate_trades(trades.assign(SIZE=float('nan'))), ['vwap', 'volume'])
+
+    assert bars['vwap'].isna().all()
+    assert (bars['volume'] == 0).all()
+
+def test_check_bar_options():
+    check_bar_options('5s', ['open', 'vwap'])
+    with pytest.raises(ValueError, match="bar width"):
+        check_bar_options('2min', ['open'])
+    with pytest.raises(ValueError, match="bar fields"):
+        check_bar_options('1min', ['median'])
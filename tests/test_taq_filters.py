@@ -0,0 +1,34 @@
+import pandas as pd
+import pyarrow as pa
+import pytest
+from taq_filters import TradeFilters, active_filters, filter_columns, filter_trades, filter_trades_arrow
+
+@pytest.fixture
+def raw_trades():
+    return pd.DataFrame({
+        "SYM_ROOT": ["AAPL", "AAPL", "AAPL", "MSFT", "AAPL", None],
+        "EX": ["N", "Q", "D", "N", "N", "N"],
+        "TR_SCOND": ["@", "@ T", "Z", None, "@F I", "@"],
+        "PRICE": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+    })
+
+def test_active_filters_skips_empty_filters():
+    filters = TradeFilters(exclude_conditions=["Z", "T", "Z"], include_symbols=[])
+
+    assert active_filters(filters) == {"exclude_conditions": ["T", "Z"]}
+    assert active_filters(None) == {}
+    assert filter_columns(TradeFilters(include_exchanges=["N"], exclude_symbols=["X"])) == [
+        "EX", "SYM_ROOT"]
+
+@pytest.mark.parametrize("filters, prices", [
+    (None, [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]),
+    (TradeFilters(exclude_conditions=["T", "Z"]), [1.0, 4.0, 5.0]),
+    (TradeFilters(include_conditions=["@", "F"]), [1.0, 4.0]),
+    (TradeFilters(include_exchanges=["N", "Q"], exclude_symbols=["MSFT"]), [1.0, 2.0, 5.0]),
+    (TradeFilters(include_symbols=["MSFT"]), [4.0]),
+])
+def test_filter_trades_pandas_and_arrow_agree(raw_trades, filters, prices):
+    arrow = filter_trades_arrow(pa.Table.from_pandas(raw_trades, preserve_index=False), filters)
+
+    assert filter_trades(raw_trades, filters)["PRICE"].tolist() == prices
+    assert arrow.column("PRICE").to_pylist() == prices
@@ -0,0 +1,63 @@
+import os
+import pandas as pd
+import pytest
+from taq_manifest import (
+    hash_file,
+    load_manifest,
+    plan_changes,
+    record_contributions,
+    save_manifest,
+    serialize_contributions
+)
+
+@pytest.fixture
+def input_folder(tmp_path):
+    folder = tmp_path / "input"
+    folder.mkdir()
+    (folder / "a.csv").write_text("DATE,TIME_M,SYM_ROOT,PRICE\n")
+    (folder / "b.csv").write_text("DATE,TIME_M,SYM_ROOT,PRICE\n2023-01-01,12:00:00,AAPL,1\n")
+    return folder
+
+def test_load_manifest_missing(tmp_path):
+    assert load_manifest(tmp_path) == {'files': {}}
+
+def test_save_and_load_manifest(tmp_path):
+    manifest = {'files': {'a.csv': {'size': 1, 'mtime': 2, 'sha256': 'x', 'partitions': {}}}}
+    save_manifest(tmp_path, manifest)
+    assert load_manifest(tmp_path) == manifest
+    assert os.listdir(tmp_path) == ['_manifest.json']
+
+def test_plan_changes_new_files(input_folder):
+    plan = plan_changes(input_folder, ['a.csv', 'b.csv'], {'files': {}})
+    assert plan.dirty == ['a.csv', 'b.csv']
+    assert plan.stale == []
+    assert plan.entries['b.csv']['sha256'] == hash_file(input_folder / "b.csv")
+
+def test_plan_changes_unchanged_touched_changed_and_removed(input_folder):
+    manifest = {'files': plan_changes(input_folder, ['a.csv', 'b.csv'], {'files': {}}).entries}
+    manifest['files']['gone.csv'] = {'size': 1, 'mtime': 1, 'sha256': 'x', 'partitions': {}}
+
+    os.utime(input_folder / "a.csv", ns=(1, 1))
+    (input_folder / "b.csv").write_text("DATE,TIME_M,SYM_ROOT,PRICE\n2023-01-01,12:00:00,AAPL,2\n")
+
+    plan = plan_changes(input_folder, ['a.csv', 'b.csv'], manifest)
+    assert plan.dirty == ['b.csv']
+    assert plan.stale == ['b.csv', 'gone.csv']
+    assert plan.entries['a.csv']['mtime'] == 1
+
+def test_record_contributions():
+    partial = pd.DataFrame(
+        {'price_sum': [1.0, 2.0, 3.0], 'price_count': [1, 1, 1]},
+        index=pd.MultiIndex.from_tuples([
+            ('AAPL', pd.Timestamp('2023-01-03 09:31')),
+            ('AAPL', pd.Timestamp('2023-01-03 09:30')),
+            ('MSFT', pd.Timestamp('2022-12-30 15:59')),
+        ], names=['SYM_ROOT', 'timestamp']))
+
+    contributions = {}
+    record_contributions(contributions, partial)
+
+    assert serialize_contributions(contributions) == {
+        'SYM_ROOT=AAPL/year=2023': ['2023-01-03T09:30:00', '2023-01-03T09:31:00'],
+        'SYM_ROOT=MSFT/year=2022': ['2022-12-30T15:59:00', '2022-12-30T15:59:00'],
+    }
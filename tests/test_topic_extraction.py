@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from inference_cache import InferenceCache
+from scoring_output import ResultWriter, read_table
+from topic_extraction import TOPIC_LABELS, score_topics, settings_digest, topic_outputs
+
+class KeywordScorer:
+    """Stand-in for the topic scorers: a topic scores 0.9 if its first word is in the tweet."""
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.batches = []
+
+    def encode(self, texts):
+        return [text.lower().split() for text in texts]
+
+    def predict(self, input_ids):
+        self.batches.append(len(input_ids))
+        return np.array([
+            [0.9 if label.split()[0].lower() in words else 0.1 for label in self.labels]
+            for words in input_ids
+        ], dtype=np.float32)
+
+def test_settings_digest_depends_on_every_setting():
+    digest = settings_digest("nli", TOPIC_LABELS, "This example is {}.")
+    assert digest == settings_digest("nli", list(TOPIC_LABELS), "This example is {}.")
+    assert digest != settings_digest("embedding", TOPIC_LABELS, "This example is {}.")
+    assert digest != settings_digest("nli", TOPIC_LABELS[:-1], "This example is {}.")
+    assert digest != settings_digest("nli", TOPIC_LABELS, "This tweet is about {}.")
+
+def test_topic_outputs_batches_tweets():
+    scorer = KeywordScorer(["Energy", "Technology"])
+    outputs = list(topic_outputs(scorer, ["energy prices", "new technology", "hi"], batch_size=2))
+
+    assert scorer.batches == [2, 1]
+    entries = {i: entry for batch in outputs for i, entry in batch.items()}
+    assert [entries[i].label for i in range(3)] == ["Energy", "Technology", "Energy"]
+    np.testing.assert_allclose(entries[1].vector, [0.1, 0.9])
+
+def test_score_topics_writes_one_column_per_topic(tmp_path):
+    labels = ["Energy", "Technology", "Automotive"]
+    tweets = pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "clean_text": ["Energy stocks", "RT @a: automotive news", "technology", "RT @a: automotive news"],
+    })
+    cache = InferenceCache(str(tmp_path / "cache.sqlite"), "bart", "abc:123")
+    scorer = KeywordScorer(labels)
+    output_path = str(tmp_path / "tweets_with_topic.csv")
+
+    assert score_topics(tweets, scorer, ResultWriter(output_path), cache) == 4
+    assert scorer.batches == [3]
+
+    scored = read_table(output_path).sort_values("id")
+    assert scored.columns.tolist() == ["id", "clean_text", "top_topic", *labels]
+    assert scored["top_topic"].tolist() == ["Energy", "Automotive", "Technology", "Automotive"]
+    np.testing.assert_allclose(scored["Automotive"], [0.1, 0.9, 0.1, 0.9], rtol=1e-6)
+
+    # Cached scores are reused by a new run.
+    scorer = KeywordScorer(labels)
+    output_path = str(tmp_path / "refresh.parquet")
+    score_topics(tweets, scorer, ResultWriter(output_path), cache)
+    assert scorer.batches == []
+    assert read_table(output_path).sort_values("id")["top_topic"].tolist() == [
+        "Energy", "Automotive", "Technology", "Automotive"]
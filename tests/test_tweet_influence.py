@@ -0,0 +1,119 @@
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+from tweet_influence import (
+    RESULT_COLUMNS,
+    event_regressions,
+    fit_baseline_garch,
+    relevant_tweets,
+    run_event_study,
+    tweet_weights
+)
+
+@pytest.fixture
+def stock_folder(tmp_path):
+    rng = np.random.default_rng(0)
+    for ticker in ["AAPL", "TSLA"]:
+        timestamps = pd.DatetimeIndex(np.concatenate([
+            pd.date_range(f"2023-01-0{day} 09:30", f"2023-01-0{day} 16:00", freq="1min")
+            for day in [3, 4, 5]
+        ]))
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, len(timestamps))))
+        folder = tmp_path / f"SYM_ROOT={ticker}" / "year=2023"
+        folder.mkdir(parents=True)
+        pd.DataFrame({"timestamp": timestamps, "avg_price": prices}).to_parquet(
+            folder / "part-00000-0.parquet", index=False)
+    return tmp_path
+
+@pytest.fixture
+def tweets():
+    return pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "handle": ["a", "b", "c", "d"],
+        "timestamp": [
+            "2023-01-03 16:00:00+00:00", "2023-01-04 15:30:00+00:00",
+            "2023-01-05 22:00:00+00:00", "2023-01-04 18:00:00+00:00",
+        ],
+        "sentiment_label": ["Positive", "negative", "neutral", "positive"],
+        "sentiment_score": [0.9, 0.8, 0.7, 0.6],
+        "Technology": [0.9, 0.95, 0.9, 0.1],
+        "Automotive": [0.1, 0.1, 0.1, 0.85],
+    })
+
+@pytest.fixture
+def tickers_topics():
+    return pd.DataFrame({
+        "topic": ["Technology", "Technology", "Automotive"],
+        "ticker": ["AAPL", "TSLA", "TSLA"],
+    })
+
+def test_relevant_tweets_and_weights(tweets, tickers_topics):
+    topic_to_tickers = tickers_topics.groupby("topic")["ticker"].apply(list).to_dict()
+
+    assert relevant_tweets(tweets, "AAPL", topic_to_tickers)["id"].tolist() == [1, 2, 3]
+    assert relevant_tweets(tweets, "TSLA", topic_to_tickers)["id"].tolist() == [1, 2, 3, 4]
+    assert relevant_tweets(tweets, "MSFT", topic_to_tickers).empty
+    assert tweet_weights(tweets).tolist() == [0.9, -0.8, 0.0, 0.6]
+    assert tweet_weights(tweets, use_finbert=False).tolist() == [1.0] * 4
+
+@pytest.mark.parametrize("kernel", [np.array([1.0]), np.array([1.0, 0.5, 0.25])])
+def test_event_regressions_match_statsmodels(kernel):
+    rng = np.random.default_rng(1)
+    std_resid2 = pd.Series(rng.chisquare(1, 500))
+    events = np.array([0, 17, 250, 498, 499, 120])
+    weights = np.array([1.0, -0.8, 0.3, 2.0, 1.0, 0.0])
+
+    result = event_regressions(std_resid2, events, weights, kernel)
+
+    for event, weight, (_, row) in zip(events, weights, result.iterrows()):
+        impulse = np.zeros(len(std_resid2))
+        window = impulse[event:event + len(kernel)]
+        window[:] = weight * kernel[:len(window)]
+        ols = sm.OLS(std_resid2.to_numpy(), sm.add_constant(impulse, has_constant="add")).fit()
+
+        np.testing.assert_allclose(row["gamma"], ols.params[1], rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(row["stderr"], ols.bse[1], rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(row["pvalue"], ols.pvalues[1], rtol=1e-7, equal_nan=True)
+
+def test_run_event_study_workers_match_serial(tmp_path, stock_folder, tweets, tickers_topics):
+    output_file = tmp_path / "influence.csv"
+
+    serial = run_event_study(tweets, stock_folder, tickers_topics, use_finbert=False)
+    pooled = run_event_study(
+        tweets, stock_folder, tickers_topics, use_finbert=False, workers=2,
+        output_file=output_file, max_pvalue=1.1)
+
+    # Tweet 3 is after the last trading minute, so only 2 + 3 pairs are tested.
+    assert list(serial.columns) == RESULT_COLUMNS
+    assert serial[["ticker", "tweet_id"]].values.tolist() == [
+        ["AAPL", 1], ["AAPL", 2], ["TSLA", 1], ["TSLA", 2], ["TSLA", 4]]
+    pd.testing.assert_frame_equal(
+        pooled.sort_values(["ticker", "tweet_id"], ignore_index=True), serial)
+
+    written = pd.read_csv(output_file)
+    assert list(written.columns) == RESULT_COLUMNS
+    assert len(written) == len(serial)
+
+def test_run_event_study_writes_only_significant_results(tmp_path, stock_folder, tweets, tickers_topics):
+    output_file = tmp_path / "influence.csv"
+
+    result = run_event_study(
+        tweets, stock_folder, tickers_topics, output_file=output_file, max_pvalue=0.05)
+
+    written = pd.read_csv(output_file)
+    assert len(written) == (result["pvalue"] < 0.05).sum()
+
+def test_run_event_study_reuses_cached_baselines(tmp_path, stock_folder, tweets, tickers_topics):
+    cache_dir = tmp_path / "cache"
+    expected = run_event_study(tweets, stock_folder, tickers_topics)
+
+    first = run_event_study(tweets, stock_folder, tickers_topics, cache_dir=cache_dir)
+    with patch("tweet_influence.fit_baseline_garch", wraps=fit_baseline_garch) as mock_fit:
+        second = run_event_study(tweets.iloc[:2], stock_folder, tickers_topics, cache_dir=cache_dir)
+        mock_fit.assert_not_called()
+
+    pd.testing.assert_frame_equal(first, expected)
+    pd.testing.assert_frame_equal(
+        second, expected[expected["tweet_id"].isin([1, 2])].reset_index(drop=True))
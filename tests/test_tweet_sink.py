@@ -0,0 +1,120 @@
+import gzip
+import json
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from tweet_sink import (
+    TWEET_SCHEMA,
+    CsvSink,
+    NdjsonSink,
+    ParquetSink,
+    flatten_tweet,
+    open_sink
+)
+
+TWEET = {
+    'id': 1318218345032028160,
+    'id_str': '1318218345032028160',
+    'created_at': 'Mon Oct 19 15:21:22 +0000 2020',
+    'full_text': 'Tesla stock is too high imo',
+    'lang': 'en',
+    'retweet_count': '10',
+    'user': {'id': 44196397, 'screen_name': 'elonmusk', 'name': 'Elon Musk', 'verified': True},
+    'entities': {'hashtags': [{'text': 'TSLA'}], 'user_mentions': []},
+    'place': None
+}
+
+def test_flatten_tweet():
+    record = flatten_tweet(TWEET)
+
+    assert list(record) == TWEET_SCHEMA.names
+    assert record['id'] == 1318218345032028160
+    assert record['created_at'] == pd.Timestamp('2020-10-19 15:21:22', tz='UTC')
+    assert record['text'] == 'Tesla stock is too high imo'
+    assert record['retweet_count'] == 10
+    assert record['user_id'] == 44196397
+    assert record['user_screen_name'] == 'elonmusk'
+    assert record['user_verified'] is True
+    assert record['hashtags'] == ['TSLA']
+    assert record['user_mentions'] == []
+    assert record['quoted_status_id'] is None
+    assert json.loads(record['extra']) == {
+        'entities': TWEET['entities'], 'place': None, 'user': TWEET['user']}
+
+def test_csv_sink_drops_interrupted_append(tmp_path):
+    sink = CsvSink(tmp_path, '1')
+    committed = sink.write([{'id': 2, 'text': 'b'}])
+    with open(tmp_path / "1.csv", 'a', encoding='UTF-8') as csv_file:
+        csv_file.write('1,half a ro')
+
+    sink = CsvSink(tmp_path, '1', committed)
+    committed = sink.write([{'id': 1, 'text': 'a'}])
+
+    assert committed == os.path.getsize(tmp_path / "1.csv")
+    assert pd.read_csv(tmp_path / "1.csv").to_dict('records') == [
+        {'id': 2, 'text': 'b'}, {'id': 1, 'text': 'a'}]
+
+def test_csv_sink_unifies_new_fields(tmp_path):
+    sink = CsvSink(tmp_path, '1')
+    sink.write([{'id': 2, 'text': 'b'}])
+    committed = sink.write([{'id': 1, 'lang': 'en'}])
+
+    df = pd.read_csv(tmp_path / "1.csv")
+    assert df.columns.tolist() == ['id', 'text', 'lang']
+    assert df['id'].tolist() == [2, 1]
+    assert committed == os.path.getsize(tmp_path / "1.csv")
+
+def test_csv_sink_rewrites_file_of_a_new_crawl(tmp_path):
+    (tmp_path / "1.csv").write_text('id,text\n9,old\n')
+    CsvSink(tmp_path, '1').write([{'id': 1, 'text': 'a'}])
+    assert pd.read_csv(tmp_path / "1.csv")['id'].tolist() == [1]
+
+def test_csv_sink_starts_over_when_file_is_missing(tmp_path):
+    committed = CsvSink(tmp_path, '1').write([{'id': 2, 'text': 'b'}])
+    os.remove(tmp_path / "1.csv")
+
+    sink = CsvSink(tmp_path, '1', committed)
+    assert sink.committed == 0
+    sink.write([{'id': 3, 'text': 'c'}])
+    assert pd.read_csv(tmp_path / "1.csv").to_dict('records') == [{'id': 3, 'text': 'c'}]
+
+def test_ndjson_sink_appends_gzip_members(tmp_path):
+    sink = NdjsonSink(tmp_path, '1')
+    committed = sink.write([TWEET])
+    sink.write([dict(TWEET, id=2)])
+
+    # A new run drops what was written past the committed mark.
+    sink = NdjsonSink(tmp_path, '1', committed)
+    assert sink.close() == committed
+    sink.write([dict(TWEET, id=3)])
+
+    with gzip.open(tmp_path / "1.ndjson.gz", 'rt', encoding='UTF-8') as ndjson_file:
+        records = [json.loads(line) for line in ndjson_file]
+
+    assert [record['id'] for record in records] == [1318218345032028160, 3]
+    assert records[0]['created_at'] == '2020-10-19T15:21:22+00:00'
+    assert records[0]['user_screen_name'] == 'elonmusk'
+
+def test_parquet_sink_writes_row_group_per_page(tmp_path):
+    sink = ParquetSink(tmp_path, '1', flush_rows=3)
+    assert sink.write([TWEET, dict(TWEET, id=2)]) is None
+    assert sink.write([dict(TWEET, id=3)]) == 1
+    assert sink.write([dict(TWEET, id=4)]) is None
+    assert sink.close() == 2
+
+    df = pd.read_parquet(tmp_path / "1.parquet")
+    assert df['id'].tolist() == [1318218345032028160, 2, 3, 4]
+    assert str(df['created_at'].dtype) == 'datetime64[ms, UTC]'
+    assert df['user_id'].dtype == 'int64'
+    assert sorted(os.listdir(tmp_path / "1.parquet")) == ['part-00000.parquet', 'part-00001.parquet']
+
+    assert pq.ParquetFile(tmp_path / "1.parquet" / "part-00000.parquet").num_row_groups == 2
+
+    # A new run drops the files past the committed mark.
+    ParquetSink(tmp_path, '1', committed=1)
+    assert os.listdir(tmp_path / "1.parquet") == ['part-00000.parquet']
+
+def test_open_sink_unknown_format(tmp_path):
+    with pytest.raises(ValueError, match='Unknown output format'):
+        open_sink('xml', tmp_path, '1')
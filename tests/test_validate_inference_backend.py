@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+from inference_cache import CacheEntry
+from topic_extraction import TOPIC_LABELS
+from validate_inference_backend import compare_outputs, file_baseline, validate_backend
+
+class LengthScorer:
+    """Stand-in for FinbertScorer: labels by word count, the int8 backend shifts the scores."""
+
+    def __init__(self, backend):
+        self.shift = 0.05 if backend == "int8" else 0.0
+
+    def encode(self, texts):
+        return [text.split() for text in texts]
+
+    def predict(self, input_ids):
+        labels = ["Positive" if len(words) > 2 else "Neutral" for words in input_ids]
+        # The int8 backend flips the label of single-word tweets.
+        if self.shift:
+            labels = ["Negative" if len(words) == 1 else label for words, label in zip(input_ids, labels)]
+        return labels, [0.5 + self.shift for _ in input_ids]
+
+def test_compare_outputs():
+    baseline = [CacheEntry("a", 0.9, None), CacheEntry("b", 0.8, [0.8, 0.2]), CacheEntry(None, None, None)]
+    candidate = [CacheEntry("a", 0.7, None), CacheEntry("c", 0.5, [0.6, 0.4]), CacheEntry("a", 0.5, None)]
+
+    report = compare_outputs(baseline, candidate)
+    assert report["label_agreement"] == pytest.approx(1 / 3)
+    assert report["mean_score_drift"] == pytest.approx(0.2)
+    assert report["max_score_drift"] == pytest.approx(0.2)
+
+def test_file_baseline_reads_saved_scores():
+    tweets = pd.DataFrame({
+        "sentiment_label": ["Positive", "ERROR", None],
+        "sentiment_score": [0.9, np.nan, np.nan],
+        "top_topic": ["Energy", None, None],
+        **{label: [0.9 if label == "Energy" else 0.1, np.nan, np.nan] for label in TOPIC_LABELS},
+    })
+
+    sentiment = file_baseline(tweets, "sentiment")
+    assert sentiment[0] == CacheEntry("Positive", 0.9, None)
+    assert sentiment[2].label is None
+
+    topics = file_baseline(tweets, "topic")
+    assert topics[0].label == "Energy"
+    assert topics[0].score == pytest.approx(0.9)
+    assert len(topics[0].vector) == len(TOPIC_LABELS)
+    assert topics[1] == CacheEntry(None, None, None)
+
+def test_validate_backend_against_fp32():
+    tweets = pd.DataFrame({"clean_text": ["up", "markets are up", "down", "flat day"]})
+
+    report = validate_backend(tweets, "sentiment", LengthScorer, "int8", batch_size=2)
+    assert report["label_agreement"] == pytest.approx(0.5)
+    assert report["mean_score_drift"] == pytest.approx(0.05)
+    assert report["tweets_per_sec"] > 0
+    assert report["fp32_tweets_per_sec"] > 0
+
+def test_validate_backend_against_file():
+    tweets = pd.DataFrame({
+        "clean_text": ["markets are up", "flat day"],
+        "sentiment_label": ["Positive", "Neutral"],
+        "sentiment_score": [0.55, 0.45],
+    })
+
+    report = validate_backend(tweets, "sentiment", LengthScorer, "int8", baseline="file")
+    assert report["label_agreement"] == 1.0
+    assert report["mean_score_drift"] == pytest.approx(0.05)
+    assert report["fp32_tweets_per_sec"] is None